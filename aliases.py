@@ -0,0 +1,190 @@
+import json
+import os
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from pathlib import Path
+import pandas as pd
+
+# --- RICONCILIAZIONE NOMI SQUADRE ---
+# Prematch e risultati arrivano da fornitori diversi che scrivono le squadre in modo
+# diverso ("Inter" / "FC Internazionale"). I nomi vengono normalizzati, passati per
+# l'indice degli alias imparati e, se ancora non coincidono, abbinati per similarità
+# di trigrammi solo tra squadre della stessa lega e data (niente confronto a coppie
+# su tutto il file).
+
+ALIAS_FILE = Path(os.environ.get('CECCHINO_ALIAS_FILE', Path.home() / '.local' / 'share' / 'cecchino' / 'team_aliases.json'))
+
+# Abbinamenti per similarità salvati da soli come alias solo sopra questa soglia e se unici
+# nel loro gruppo data/lega; gli altri valgono per la verifica corrente e sono solo proposti
+LEARN_SCORE = 0.8
+
+# Parole che non aiutano a distinguere le squadre
+STOP_WORDS = {'fc', 'cf', 'ac', 'as', 'sc', 'ss', 'us', 'afc', 'cd', 'sd', 'ud', 'fk', 'sk', 'sv', 'bk', 'if',
+              'calcio', 'club', 'de', 'the'}
+
+
+def norm_team(name):
+    # minuscolo, senza accenti né punteggiatura, senza sigle societarie
+    s = unicodedata.normalize('NFKD', str(name)).encode('ascii', 'ignore').decode().lower()
+    tokens = [t for t in re.split(r'[^a-z0-9]+', s) if t]
+    kept = [t for t in tokens if t not in STOP_WORDS]
+    return ' '.join(kept or tokens)
+
+
+def trigrams(s):
+    s = f"  {s} "
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+def norm_date(s):
+    # Date in formati diversi (01/11/2025, 2025-11-01 20:45...) -> AAAA-MM-GG
+    # (ogni data distinta è letta una volta sola: format='mixed' va valore per valore)
+    s = s.astype(str)
+    u = pd.Series(pd.unique(s))
+    d = pd.to_datetime(u, dayfirst=True, errors='coerce', format='mixed')
+    return s.map(dict(zip(u, d.dt.strftime('%Y-%m-%d').where(d.notna(), u))))
+
+
+class AliasIndex:
+    # Alias imparati: nome normalizzato (risultati) -> nome normalizzato (prematch)
+
+    def __init__(self, path=ALIAS_FILE):
+        self.path = Path(path)
+        self.aliases = {}
+        if self.path.exists():
+            try:
+                self.aliases = json.loads(self.path.read_text(encoding='utf-8'))
+            except ValueError:
+                self.aliases = {}
+
+    def canon(self, name):
+        n = norm_team(name)
+        return self.aliases.get(n, n)
+
+    def learn(self, alias, canonical):
+        # True se l'alias è nuovo (o cambia destinazione)
+        if alias == canonical or self.aliases.get(alias) == canonical:
+            return False
+        self.aliases[alias] = canonical
+        return True
+
+    def save(self):
+        # False se il file non è scrivibile (gli alias restano validi per questa esecuzione)
+        tmp = self.path.with_suffix('.tmp')
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_text(json.dumps(self.aliases, ensure_ascii=False, indent=1, sort_keys=True), encoding='utf-8')
+            os.replace(tmp, self.path)
+            return True
+        except OSError:
+            try:
+                tmp.unlink(missing_ok=True)
+            except OSError:
+                pass
+            return False
+
+
+def name_sim(a, b):
+    # Similarità tra nomi: media tra Jaccard e sovrapposizione dei trigrammi
+    # (la sovrapposizione premia "inter" ~ "internazionale")
+    if a == b: return 1.0
+    ga, gb = trigrams(a), trigrams(b)
+    k = len(ga & gb)
+    return (k / len(ga | gb) + k / min(len(ga), len(gb))) / 2
+
+
+def match_rows(p_rows, r_rows, min_score):
+    # Abbinamento uno-a-uno partita per partita (casa e ospite insieme) -> [(j, i, punteggio, unico)].
+    # I candidati arrivano da un indice invertito sui trigrammi: si confrontano
+    # solo le partite che condividono almeno un trigramma, non tutte le coppie.
+    # unico = nessun altro candidato sopra soglia per la stessa giocata o lo stesso risultato
+    inverted = defaultdict(set)
+    for i, h, a in zip(r_rows.index, r_rows['h'], r_rows['a']):
+        for t in trigrams(h) | trigrams(a): inverted[t].add(i)
+
+    pairs = []
+    for j, h, a in zip(p_rows.index, p_rows['h'], p_rows['a']):
+        cands = set()
+        for t in trigrams(h) | trigrams(a): cands |= inverted.get(t, set())
+        for i in cands:
+            sh, sa = name_sim(h, r_rows.at[i, 'h']), name_sim(a, r_rows.at[i, 'a'])
+            score = (sh + sa) / 2
+            if score >= min_score and min(sh, sa) >= min_score / 2:
+                pairs.append((score, j, i))
+
+    n_p = Counter(j for _, j, _ in pairs)
+    n_r = Counter(i for _, _, i in pairs)
+    out, used = [], set()
+    for score, j, i in sorted(pairs, reverse=True):
+        if j in used or i in used: continue
+        out.append((j, i, score, n_p[j] == 1 and n_r[i] == 1))
+        used.update((j, i))
+    return out
+
+
+def _scope(picks, results):
+    # Data sempre (se presente); lega solo se i due fornitori usano gli stessi nomi
+    scope = []
+    if 'datameci' in picks.columns and 'datameci' in results.columns:
+        scope.append('datameci')
+    if 'league' in picks.columns and 'league' in results.columns:
+        pl = set(picks['league'].dropna())
+        if pl and len(pl & set(results['league'].dropna())) >= 0.5 * len(pl):
+            scope.append('league')
+    return scope
+
+
+def reconcile(picks, results, index, min_score=0.45, learn_score=LEARN_SCORE):
+    # Allinea MatchID/datameci del file risultati a quelli delle giocate.
+    # Ritorna (risultati allineati, giocate senza risultato, numero di alias nuovi imparati,
+    # alias proposti da confermare: Alias / Squadra / Punteggio)
+    scope = _scope(picks, results)
+    names = {}
+
+    def canon(s):
+        u = s.dropna().unique()
+        names.update({n: index.canon(n) for n in u if n not in names})
+        return s.map(names)
+
+    p = pd.DataFrame({c: norm_date(picks[c]) if c == 'datameci' else picks[c] for c in scope}, index=picks.index)
+    p['h'], p['a'], p['MatchID'] = canon(picks['txtechipa1']), canon(picks['txtechipa2']), picks['MatchID']
+    r = pd.DataFrame({c: norm_date(results[c]) if c == 'datameci' else results[c] for c in scope}, index=results.index)
+    r['h'], r['a'] = canon(results['txtechipa1']), canon(results['txtechipa2'])
+    key = scope + ['h', 'a']
+
+    # Partite ancora senza corrispondenza, abbinate scope per scope
+    p_miss = p[~pd.MultiIndex.from_frame(p[key]).isin(pd.MultiIndex.from_frame(r[key]))].dropna(subset=['h', 'a'])
+    r_miss = r[~pd.MultiIndex.from_frame(r[key]).isin(pd.MultiIndex.from_frame(p[key]))].dropna(subset=['h', 'a'])
+    learned, proposed = 0, {}
+    if len(p_miss) and len(r_miss):
+        r_groups = dict(iter(r_miss.groupby(scope, dropna=False))) if scope else {(): r_miss}
+        p_groups = p_miss.groupby(scope, dropna=False) if scope else [((), p_miss)]
+        for k, g in p_groups:
+            rg = r_groups.get(k)
+            if rg is None: continue
+            for j, i, score, unique in match_rows(g, rg, min_score):
+                for side in ('h', 'a'):
+                    alias, name = r.at[i, side], p.at[j, side]
+                    if score >= learn_score and unique:
+                        learned += index.learn(alias, name)
+                    elif alias != name and index.aliases.get(alias) != name:
+                        proposed.setdefault(alias, (name, score))
+                r.loc[i, ['h', 'a']] = p.loc[j, ['h', 'a']].to_numpy()
+
+    # Join finale sulla chiave completa
+    first = p.drop_duplicates(key)
+    ids = pd.DataFrame({'MatchID': first['MatchID'].to_numpy()}, index=pd.MultiIndex.from_frame(first[key]))
+    if 'datameci' in scope:
+        ids['datameci_pick'] = picks.loc[first.index, 'datameci'].to_numpy()
+    aligned = r[key].join(ids, on=key)
+    out = results.copy()
+    hit = aligned['MatchID'].notna()
+    out.loc[hit, 'MatchID'] = aligned.loc[hit, 'MatchID']
+    if 'datameci' in scope:
+        out.loc[hit, 'datameci'] = aligned.loc[hit, 'datameci_pick']
+
+    found = pd.MultiIndex.from_frame(r.loc[hit, key])
+    unmatched = picks[~pd.MultiIndex.from_frame(p[key]).isin(found)]
+    proposed = pd.DataFrame([(a, n, sc) for a, (n, sc) in proposed.items()], columns=['Alias', 'Squadra', 'Punteggio'])
+    return out, unmatched, learned, proposed
@@ -1,135 +1,159 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+import altair as alt
+from loader import DATA_DIR, load_standard, server_file
+from schema import REQUIRED
+from compact import compact_frame, memory_caption
+from engine import MARGINS, calc_metrics, calc_sweep, match_labels
+from margins import compare_margins
+from heatmap import cell_rows, surface_frame
+from optimizer import hfa_curve
+from leagues import optimize_leagues
+from pnl_index import make_grid
+from perf import StageLog, show_panel
+from standings import MODES as STANDINGS_MODES, coverage, standings_book, with_standings
+from stream import aggregate, stream_backtest
+from tables import show_table
+from strategies import evaluate, load_strategies, save_strategy
+from elo import EloBook, compare_elo, with_own_elo
 
 # --- CONFIGURAZIONE ---
 st.set_page_config(page_title="Optimizer V67", page_icon="🧮", layout="wide")
 st.title("🧮 Strategy Optimizer (V67 - Fix Formattazione)")
 st.markdown("---")
+log = StageLog('V67')
 
-# --- FUNZIONI DI CALCOLO ---
-def get_probs(elo_h, elo_a, hfa):
+# --- CARICAMENTO FILE ---
+@st.cache_data(ttl=0)
+def load_data(file, compact=False, standings='file'):
     try:
-        diff = elo_a - (elo_h + hfa)
-        exp = diff / 400
-        p_h = 1 / (1 + 10**exp)
-        return p_h, 1 - p_h
-    except: return 0, 0
+        # Lettura, nomi standard e Real_Res (con cache su disco)
+        df = load_standard(file, REQUIRED['backtest'])
+        df = df.dropna(subset=['cotaa', 'cotad', 'Real_Res'])
+        book = standings_book(standings)
+        if book is not None:
+            # Posizioni alla data di ogni partita dalla classifica interna
+            df = with_standings(df, book)
+        return (compact_frame(df) if compact else df), None
+    except Exception as e: return None, str(e)
 
-def no_margin(o1, ox, o2):
+@st.cache_data(ttl=0)
+def stream_data(file, base_hfa, use_dyn, margin='proportional', standings='file', elo_k=None, elo_mov=True, stamp=None):
+    # Archivi enormi: lettura a blocchi, in memoria solo gli aggregati.
+    # elo_k None = Elo del fornitore; classifica ed Elo interni aggiornati blocco per blocco.
+    # stamp: (mtime, dimensione) del file sul server, solo per invalidare la cache
     try:
-        if o1<=0 or ox<=0 or o2<=0: return 0,0,0
-        i1 = 1/o1; ix = 1/ox; i2 = 1/o2
-        s = i1 + ix + i2
-        return i1/s, ix/s, i2/s
-    except: return 0,0,0
+        book = EloBook(elo_k, elo_mov) if elo_k is not None else None
+        return stream_backtest(file, base_hfa, use_dyn, margin=margin, elo=book, standings=standings_book(standings)), None
+    except Exception as e: return None, str(e)
 
-# --- CARICAMENTO FILE ---
 @st.cache_data(ttl=0)
-def load_data(file):
+def own_elo(df, k, mov):
+    # Rating interni pre-partita (lo stato su disco applica solo i risultati nuovi)
     try:
-        df = pd.read_csv(file, sep=';', encoding='latin1', on_bad_lines='skip', engine='python')
-        df.columns = df.columns.str.strip()
-        
-        # Standardizza nomi
-        ren = {
-            '1': 'cotaa', '2': 'cotad', 'x': 'cotae', 'X': 'cotae', 
-            'eloc': 'elohomeo', 'eloo': 'eloawayo',
-            'gfinc': 'scor1', 'gfino': 'scor2'
-        }
-        new = {}
-        for c in df.columns:
-            if c.lower() in ren: new[c] = ren[c.lower()]
-        df = df.rename(columns=new)
-        
-        # Pulisce dati numerici
-        cols_num = ['cotaa', 'cotae', 'cotad', 'elohomeo', 'eloawayo', 'scor1', 'scor2']
-        for c in cols_num:
-            if c in df.columns:
-                df[c] = df[c].astype(str).str.replace(',', '.', regex=False)
-                df[c] = pd.to_numeric(df[c], errors='coerce')
-
-        # Determina Risultato Reale (1, X, 2)
-        df['Real_Res'] = '-'
-        if 'scor1' in df.columns and 'scor2' in df.columns:
-            mask = df['scor1'].notna() & df['scor2'].notna()
-            df.loc[mask & (df['scor1'] > df['scor2']), 'Real_Res'] = '1'
-            df.loc[mask & (df['scor1'] == df['scor2']), 'Real_Res'] = 'X'
-            df.loc[mask & (df['scor1'] < df['scor2']), 'Real_Res'] = '2'
-            
-        return df.dropna(subset=['cotaa', 'cotad', 'Real_Res']), None
-    except Exception as e: return None, str(e)
+        book = EloBook(k, mov)
+        return with_own_elo(df, book), book.applied, None
+    except Exception as e: return None, 0, str(e)
 
-# --- MOTORE DI SIMULAZIONE ---
-def run_optimization(df, base_hfa, use_dyn):
-    results = []
-    
-    for idx, row in df.iterrows():
-        if row['Real_Res'] == '-': continue
-        
-        # 1. Calcola HFA
-        curr_hfa = base_hfa
-        if use_dyn:
-            r1 = row.get('place1a') if pd.notna(row.get('place1a')) else row.get('Place 1a')
-            r2 = row.get('place2d') if pd.notna(row.get('place2d')) else row.get('Place 2d')
-            if pd.notna(r1) and pd.notna(r2):
-                try:
-                    curr_hfa += (float(r2) - float(r1)) * 3
-                    curr_hfa = max(0, min(curr_hfa, 200))
-                except: pass
-        
-        # 2. Calcola EV
-        f1, fx, f2 = no_margin(row['cotaa'], row['cotae'], row['cotad'])
-        ph, pa = get_probs(row['elohomeo'], row['eloawayo'], curr_hfa)
-        rem = 1 - fx
-        fin1 = rem * ph
-        fin2 = rem * pa
-        
-        ev1 = (row['cotaa'] * fin1) - 1
-        ev2 = (row['cotad'] * fin2) - 1
-        
-        # 3. PNL
-        pnl_1 = (row['cotaa'] - 1) if row['Real_Res'] == '1' else -1
-        pnl_2 = (row['cotad'] - 1) if row['Real_Res'] == '2' else -1
-        
-        results.append({
-            'Odds_1': row['cotaa'],
-            'Odds_2': row['cotad'],
-            'EV_1': ev1 * 100,
-            'EV_2': ev2 * 100,
-            'PNL_1': pnl_1,
-            'PNL_2': pnl_2,
-            'HFA_Used': curr_hfa,
-            'League': row.get('league', 'Unknown')
-        })
-        
-    return pd.DataFrame(results)
+@st.cache_data(ttl=0)
+def run_leagues(df, hfa_values, use_dyn, min_bets, test_frac, margin='proportional'):
+    # Griglia per lega: EV 0-20% passo 1, quote 1.50-4.00 passo 0.10
+    return optimize_leagues(df, hfa_values, use_dyn, make_grid(0.0, 20.0, 1.0), make_grid(1.50, 4.00, 0.10),
+                            min_bets=min_bets, test_frac=test_frac, margin=margin)
+
+@st.cache_data(ttl=0)
+def run_strategies(df, strategies, base_hfa, use_dyn, margin='proportional'):
+    return evaluate(df, strategies, base_hfa, use_dyn, margin=margin)
+
+@st.cache_data(ttl=0)
+def run_margins(df, base_hfa, use_dyn):
+    return compare_margins(df, base_hfa, use_dyn)
+
+# Esempio per il box di inserimento strategie
+STRATEGY_EXAMPLE = """{
+ "name": "Ospite EV 5-15",
+ "hfa": 90,
+ "tiers": [
+  {"signal": "💎 AWAY", "side": "2", "ev_min": 5, "ev_max": 15, "odds_min": 1.8, "odds_max": 3.2},
+  {"signal": "✅ HOME", "side": "1", "ev_min": 6, "odds_min": 1.5, "odds_max": 2.2}
+ ]
+}"""
 
 # --- UI ---
 st.sidebar.header("⚙️ Parametri Base")
 base_hfa = st.sidebar.number_input("HFA Base", 90, step=10)
 use_dyn = st.sidebar.checkbox("Usa HFA Dinamico", True)
+margin = st.sidebar.selectbox("Rimozione margine", list(MARGINS), format_func=MARGINS.get,
+                              help="Come togliere l'aggio dalle quote 1X2: la probabilità del pareggio cambia tutti gli EV.")
+standings_mode = st.sidebar.selectbox("Classifica (HFA dinamico)", list(STANDINGS_MODES), format_func=STANDINGS_MODES.get,
+                                      help="Interna = posizioni ricostruite dai risultati già caricati, alla data di ogni partita.")
+
+st.sidebar.header("🧠 Elo")
+elo_source = st.sidebar.radio("Fonte Elo", ['Fornitore', 'Interno'], horizontal=True,
+                              help="Interno = rating per lega ricostruiti dai risultati (scor1/scor2 in ordine di data, serve datameci), senza usare elohomeo/eloawayo.")
+elo_k = st.sidebar.slider("Fattore K (Elo interno)", 5, 60, 20, 5)
+elo_mov = st.sidebar.checkbox("Scarto gol nel K", True, help="Vittorie larghe spostano di più i rating (1 gol 1x, 2 gol 1.5x, poi (11+N)/8).")
+
+st.sidebar.header("📦 File Molto Grandi")
+stream_mode = st.sidebar.checkbox("Modalità Streaming (a blocchi)", False,
+                                  help="Legge il file a blocchi e tiene in memoria solo i totali. Fonte Elo e classifica valgono anche qui; "
+                                       "'Memoria compatta' e i Tab che richiedono l'intero file non sono disponibili.")
+compact_mem = st.sidebar.checkbox("Memoria compatta", False, disabled=stream_mode,
+                                  help="Squadre, leghe e risultati come categorie, quote in float32, classifica in interi piccoli: molta meno RAM sui file di stagione. "
+                                       "Non serve in Modalità Streaming (in memoria c'è un solo blocco).")
+server_path = st.sidebar.text_input("Oppure percorso file sul server", "",
+                                    help=f"Relativo alla cartella dati {DATA_DIR} (CECCHINO_DATA_DIR).") if stream_mode else ""
 
 uploaded = st.file_uploader("Carica File Risultati Novembre (CSV)", type=["csv"])
+source = server_path.strip() or uploaded
 
-if uploaded:
-    df, err = load_data(uploaded)
+if source:
+    df = metrics = None
+    if stream_mode:
+        with log.stage('Streaming a blocchi') as s:
+            try:
+                path, stamp = server_file(source) if isinstance(source, str) else (source, None)
+                agg, err = stream_data(path, base_hfa, use_dyn, margin, standings_mode,
+                                       elo_k if elo_source == 'Interno' else None, elo_mov, stamp)
+            except ValueError as e:
+                agg, err = None, str(e)
+            s['rows'] = agg['Matches'] if agg is not None else 0
+    else:
+        with log.stage('Caricamento') as s:
+            df, err = load_data(source, compact_mem, standings_mode)
+            s['rows'] = len(df) if df is not None else 0
+        df_prov = df
+        if df is not None and not df.empty and elo_source == 'Interno':
+            with log.stage('Elo interno', len(df)):
+                df, elo_new, err = own_elo(df, elo_k, elo_mov)
+        with log.stage('Calcolo metriche + aggregati', s['rows']):
+            metrics = calc_metrics(df, base_hfa, use_dyn, margin) if df is not None and not df.empty else None
+            agg = aggregate(metrics) if metrics is not None else None
     
-    if df is not None and not df.empty:
-        st.success(f"Caricate {len(df)} partite con risultati.")
-        
-        sim_data = run_optimization(df, base_hfa, use_dyn)
-        
-        tab1, tab2, tab3 = st.tabs(["📉 Perché perdiamo?", "🔍 HEATMAP (Diagnostica)", "🏆 Top Campionati"])
+    if agg is not None and agg['Matches'] > 0:
+        st.success(f"Caricate {agg['Matches']} partite con risultati.")
+        if df is not None and compact_mem:
+            st.caption(memory_caption(df))
+        if df is not None and standings_mode != 'file':
+            st.caption(f"📊 Classifica disponibile per il {coverage(df):.0%} delle partite.")
+
+        if df is not None and elo_source == 'Interno':
+            st.caption(f"🧠 Elo interno (K {elo_k}, scarto gol {'sì' if elo_mov else 'no'}): tutte le analisi usano i rating "
+                       f"ricostruiti dai risultati ({elo_new} risultati nuovi applicati allo stato salvato).")
+        elif stream_mode and elo_source == 'Interno':
+            st.caption(f"🧠 Elo interno (K {elo_k}, scarto gol {'sì' if elo_mov else 'no'}) aggiornato blocco per blocco: "
+                       "il file va letto in ordine di data.")
+
+        tab1, tab2, tab3, tab4, tab5, tab6, tab7, tab8 = st.tabs(["📉 Perché perdiamo?", "🔍 HEATMAP (Diagnostica)", "🏆 Top Campionati",
+                                                                  "📈 Curva HFA", "🗺️ Config per Campionato", "🧪 Confronto Strategie",
+                                                                  "🧠 Elo Interno vs Fornitore", "⚖️ Metodi Margine"])
         
         with tab1:
             st.subheader("Performance Attuale")
             # Simulazione Strategia Cecchino Standard
-            mask_away = (sim_data['EV_2'] > 4.0) & (sim_data['Odds_2'].between(1.70, 3.50))
-            mask_home = (sim_data['EV_1'] > 4.0) & (sim_data['Odds_1'].between(1.50, 2.50))
-            
-            profit_away = sim_data[mask_away]['PNL_2'].sum()
-            profit_home = sim_data[mask_home]['PNL_1'].sum()
+            profit_away = agg['Strategies'].loc['AWAY (2)', 'PNL']
+            profit_home = agg['Strategies'].loc['HOME (1)', 'PNL']
             
             c1, c2 = st.columns(2)
             c1.metric("Strategia AWAY (2)", f"{profit_away:.2f} u")
@@ -140,26 +164,60 @@ if uploaded:
 
         with tab2:
             st.subheader("Analisi: Quali quote evitare?")
-            st.info("Le barre ROSSE verso il basso indicano dove stiamo perdendo soldi. Le VERDI dove vinciamo.")
-            
-            bins = [1.0, 1.5, 2.0, 2.5, 3.0, 4.0, 10.0]
-            labels = ['1.0-1.5', '1.5-2.0', '2.0-2.5', '2.5-3.0', '3.0-4.0', '4.0+']
-            
-            sim_data['Odds_Bin_1'] = pd.cut(sim_data['Odds_1'], bins=bins, labels=labels)
-            sim_data['Odds_Bin_2'] = pd.cut(sim_data['Odds_2'], bins=bins, labels=labels)
-            
-            st.write("#### 🏠 Rendimento Puntate CASA (1) (EV > 2%)")
-            df_h = sim_data[sim_data['EV_1'] > 2.0].groupby('Odds_Bin_1', observed=False)['PNL_1'].sum().reset_index()
-            st.bar_chart(df_h.set_index('Odds_Bin_1'))
-            
-            st.write("#### ✈️ Rendimento Puntate OSPITE (2) (EV > 2%)")
-            df_a = sim_data[sim_data['EV_2'] > 2.0].groupby('Odds_Bin_2', observed=False)['PNL_2'].sum().reset_index()
-            st.bar_chart(df_a.set_index('Odds_Bin_2'))
+            if metrics is None:
+                # Streaming: solo gli aggregati a fasce fisse (EV > 2%)
+                st.info("Le barre ROSSE verso il basso indicano dove stiamo perdendo soldi. Le VERDI dove vinciamo.")
+
+                st.write("#### 🏠 Rendimento Puntate CASA (1) (EV > 2%)")
+                st.bar_chart(agg['Bins_1'].rename_axis('Odds_Bin_1'))
+
+                st.write("#### ✈️ Rendimento Puntate OSPITE (2) (EV > 2%)")
+                st.bar_chart(agg['Bins_2'].rename_axis('Odds_Bin_2'))
+            else:
+                st.info("Ogni cella = fascia di quota x fascia di EV. ROSSO = perdiamo, VERDE = vinciamo. "
+                        "Passa sopra una cella per i numeri, cliccala per vedere le partite.")
+                h1, h2, h3 = st.columns(3)
+                hm_side = h1.radio("Lato", ['2', '1'], format_func=lambda x: "✈️ OSPITE (2)" if x == '2' else "🏠 CASA (1)", horizontal=True)
+                hm_value = h2.radio("Colore", ['PNL', 'ROI', 'Bets'], horizontal=True)
+                hm_odds_step = h3.select_slider("Passo quota", [0.05, 0.1, 0.25, 0.5], 0.1)
+                h4, h5, h6 = st.columns(3)
+                hm_odds = h4.slider("Range quote", 1.0, 10.0, (1.2, 5.0), 0.05)
+                hm_ev = h5.slider("Range EV (%)", -30.0, 60.0, (0.0, 30.0), 0.5)
+                hm_ev_step = h6.select_slider("Passo EV (%)", [0.5, 1.0, 2.0, 5.0], 1.0)
+
+                with log.stage('Heatmap 2D', len(metrics)):
+                    cells = surface_frame(metrics, hm_side, hm_odds, hm_odds_step, hm_ev, hm_ev_step)
+                if cells.empty:
+                    st.warning("Nessuna scommessa nel range scelto.")
+                else:
+                    pick = alt.selection_point(name='cella', fields=['Quota', 'EV'])
+                    color = (alt.Color('Bets:Q', scale=alt.Scale(scheme='blues')) if hm_value == 'Bets'
+                             else alt.Color(f'{hm_value}:Q', scale=alt.Scale(scheme='redyellowgreen', domainMid=0)))
+                    chart = alt.Chart(cells).mark_rect().encode(
+                        x=alt.X('Quota:Q', title='Quota'), x2='Quota_Max:Q',
+                        y=alt.Y('EV:Q', title='EV %'), y2='EV_Max:Q',
+                        color=color,
+                        tooltip=[alt.Tooltip('Quota:Q', format='.2f'), alt.Tooltip('Quota_Max:Q', format='.2f'),
+                                 alt.Tooltip('EV:Q', format='.1f'), alt.Tooltip('EV_Max:Q', format='.1f'),
+                                 'Bets:Q', alt.Tooltip('PNL:Q', format='.2f'), alt.Tooltip('ROI:Q', format='.1f')],
+                    ).add_params(pick)
+                    event = st.altair_chart(chart, use_container_width=True, on_select='rerun', key='heatmap')
+
+                    chosen = (event or {}).get('selection', {}).get('cella') or []
+                    if chosen:
+                        q_lo, ev_lo = chosen[0]['Quota'], chosen[0]['EV']
+                        rows = cell_rows(metrics, hm_side, q_lo, hm_odds_step, ev_lo, hm_ev_step)
+                        sel = metrics.iloc[rows][[f'Odds_{hm_side}', f'EV_{hm_side}', f'PNL_{hm_side}']]
+                        st.write(f"#### Quota {q_lo:.2f}–{q_lo + hm_odds_step:.2f} · EV {ev_lo:.1f}%–{ev_lo + hm_ev_step:.1f}%: "
+                                 f"{len(sel)} partite, {sel[f'PNL_{hm_side}'].sum():.2f} u")
+                        show_table(sel, 'cell', style=lambda page: page.assign(
+                            Match=match_labels(df, page.index), League=metrics['League'].iloc[page.index].to_numpy()
+                        )[['Match', 'League'] + list(sel.columns)].style.format('{:.2f}', subset=list(sel.columns)))
 
         with tab3:
             st.subheader("Quali campionati portano profitto?")
-            if not sim_data.empty:
-                league_perf = sim_data.groupby('League')[['PNL_1', 'PNL_2']].sum().reset_index()
+            if not agg['Leagues'].empty:
+                league_perf = agg['Leagues'].reset_index()
                 league_perf['Total'] = league_perf['PNL_1'] + league_perf['PNL_2']
                 league_perf = league_perf.sort_values('Total', ascending=False).head(20)
                 
@@ -175,5 +233,126 @@ if uploaded:
             else:
                 st.warning("Nessun dato disponibile.")
 
+        with tab4:
+            st.subheader("Quale HFA Base rende di più?")
+            if df is None:
+                st.info("Non disponibile in Modalità Streaming: serve l'intero file in memoria.")
+            else:
+                st.info("Tutti i valori HFA sono calcolati in un solo passaggio (stesse strategie del Tab 1).")
+                hfa_lo, hfa_hi = st.slider("Range HFA da esplorare", 0, 200, (0, 200), 5)
+                with log.stage('Sweep HFA', len(df)):
+                    sweep = calc_sweep(df, np.arange(hfa_lo, hfa_hi + 1, 5), use_dyn, margin)
+
+                curve_away = hfa_curve(sweep, '2', 4.0, np.inf, 1.70, 3.50)
+                curve_home = hfa_curve(sweep, '1', 4.0, np.inf, 1.50, 2.50)
+                st.line_chart(pd.DataFrame({'AWAY (2)': curve_away['PNL'], 'HOME (1)': curve_home['PNL']}))
+
+                c1, c2 = st.columns(2)
+                c1.metric("Miglior HFA per AWAY", f"{curve_away['PNL'].idxmax():.0f}", delta=f"{curve_away['PNL'].max():.2f} u")
+                c2.metric("Miglior HFA per HOME", f"{curve_home['PNL'].idxmax():.0f}", delta=f"{curve_home['PNL'].max():.2f} u")
+
+
+        with tab5:
+            st.subheader("Miglior configurazione per ogni campionato")
+            if df is None or 'league' not in df.columns:
+                st.info("Non disponibile in Modalità Streaming o senza colonna 'league'.")
+            else:
+                st.info("Ogni lega è ottimizzata sulle sue prime partite e verificata sulle ultime (fuori campione). Le leghe girano in parallelo su più processi.")
+                l1, l2, l3 = st.columns(3)
+                lg_hfa_txt = l1.text_input("Valori HFA da provare", "60, 90, 120")
+                lg_min_bets = l2.number_input("Scommesse minime (training)", 1, 500, 10, 1)
+                lg_test = l3.slider("Quota partite di test (%)", 10, 50, 30, 5)
+                try:
+                    lg_hfa = [float(v) for v in lg_hfa_txt.replace(';', ',').split(',') if v.strip()]
+                except ValueError:
+                    lg_hfa = [base_hfa]
+                    st.error("Valori HFA non validi: uso solo l'HFA Base.")
+
+                if st.button("Avvia ottimizzazione per campionato"):
+                    with log.stage('Ottimizzazione per campionato', len(df)):
+                        per_league = run_leagues(df, lg_hfa, use_dyn, lg_min_bets, lg_test / 100, margin)
+                    if per_league.empty:
+                        st.warning("Nessun campionato con dati sufficienti.")
+                    else:
+                        c1, c2 = st.columns(2)
+                        c1.metric("Profitto Training (somma leghe)", f"{per_league['Train_PNL'].sum():.2f} u")
+                        c2.metric("Profitto Fuori Campione", f"{per_league['Test_PNL'].sum():.2f} u",
+                                  delta=f"{per_league['Test_Bets'].sum()} bets")
+                        st.dataframe(
+                            per_league.style.format({
+                                'HFA': '{:.0f}', 'EV_Min': '{:.1f}%', 'EV_Max': '{:.1f}%', 'Odds_Min': '{:.2f}', 'Odds_Max': '{:.2f}',
+                                'Train_PNL': '{:.2f}', 'Train_ROI': '{:.2f}%', 'Test_PNL': '{:.2f}', 'Test_ROI': '{:.2f}%'
+                            }),
+                            use_container_width=True
+                        )
+
+        with tab6:
+            st.subheader("Tutte le strategie salvate sullo stesso storico")
+            if df is None:
+                st.info("Non disponibile in Modalità Streaming: serve l'intero file in memoria.")
+            else:
+                with st.expander("➕ Aggiungi o modifica una strategia (JSON)"):
+                    st.caption("Livelli in ordine di priorità; 'hfa'/'dyn' assenti = parametri della sidebar. "
+                               "Una strategia con lo stesso nome viene sostituita.")
+                    new_def = st.text_area("Definizione", STRATEGY_EXAMPLE, height=220)
+                    if st.button("Salva strategia"):
+                        try:
+                            saved = save_strategy(new_def)
+                            st.success(f"Strategia '{saved['name']}' salvata.")
+                        except ValueError as e:
+                            st.error(str(e))
+
+                strategies = load_strategies()
+                names = [s['name'] for s in strategies]
+                chosen = st.multiselect("Strategie da confrontare", names, default=names)
+                selected = [s for s in strategies if s['name'] in chosen]
+                if selected:
+                    with log.stage(f'Confronto {len(selected)} strategie', len(df)):
+                        summary, per_tier = run_strategies(df, selected, base_hfa, use_dyn, margin)
+                    st.bar_chart(summary.set_index('Strategia')['PNL'])
+                    fmt = {'HFA': '{:.0f}', 'Vinte %': '{:.1f}%', 'PNL': '{:.2f}', 'ROI': '{:.2f}%'}
+                    st.dataframe(summary.style.format(fmt), use_container_width=True)
+                    with st.expander("Dettaglio per livello"):
+                        st.dataframe(per_tier.style.format({'HFA': '{:.0f}', 'PNL': '{:.2f}', 'ROI': '{:.2f}%'}),
+                                     use_container_width=True)
+
+        with tab7:
+            st.subheader("Le probabilità di get_probs sono migliori con i nostri rating?")
+            if df is None:
+                st.info("Non disponibile in Modalità Streaming: serve l'intero file in memoria.")
+            else:
+                st.info("Stesso backtest con Elo del fornitore e con Elo interno (K e scarto gol dalla sidebar). "
+                        "Brier e log-loss 1X2: più bassi = probabilità più affidabili.")
+                warmup = st.slider("Escludi le prime partite (riscaldamento rating, %)", 0, 50, 20, 5)
+                own, _, elo_err = own_elo(df_prov, elo_k, elo_mov)
+                if own is None:
+                    st.error(f"Elo interno non disponibile: {elo_err}")
+                else:
+                    with log.stage('Confronto Elo', len(df_prov)):
+                        report = compare_elo(df_prov, own, base_hfa, use_dyn, warmup / 100, margin)
+                    c1, c2 = st.columns(2)
+                    c1.metric("Brier 1X2 (interno)", f"{report.loc['Interno', 'Brier 1X2']:.4f}",
+                              delta=f"{report.loc['Interno', 'Brier 1X2'] - report.loc['Fornitore', 'Brier 1X2']:+.4f}", delta_color='inverse')
+                    c2.metric("Log-loss 1X2 (interno)", f"{report.loc['Interno', 'Log-loss 1X2']:.4f}",
+                              delta=f"{report.loc['Interno', 'Log-loss 1X2'] - report.loc['Fornitore', 'Log-loss 1X2']:+.4f}", delta_color='inverse')
+                    fmt = {c: '{:.2f}' for c in report.columns if c.endswith('PNL')}
+                    fmt.update({'Brier 1X2': '{:.4f}', 'Log-loss 1X2': '{:.4f}'})
+                    st.dataframe(report.style.format(fmt), use_container_width=True)
+
+        with tab8:
+            st.subheader("Come cambiano segnali e PNL togliendo il margine in modo diverso?")
+            if df is None:
+                st.info("Non disponibile in Modalità Streaming: serve l'intero file in memoria.")
+            else:
+                st.info("Stesso storico con ogni metodo (HFA e classifica dalla sidebar). 'Cambiati' = partite con "
+                        "segnale V64 diverso dal metodo proporzionale.")
+                with log.stage('Confronto metodi margine', len(df)):
+                    by_margin = run_margins(df, base_hfa, use_dyn)
+                st.bar_chart(by_margin.set_index('Metodo')[['PNL V64', 'AWAY (2) PNL', 'HOME (1) PNL']])
+                fmt = {'P(X) media': '{:.4f}', 'PNL V64': '{:.2f}', 'ROI V64': '{:.2f}%', 'AWAY (2) PNL': '{:.2f}', 'HOME (1) PNL': '{:.2f}'}
+                st.dataframe(by_margin.style.format(fmt), use_container_width=True)
+
     else:
         st.error(f"Errore: {err}")
+
+show_panel(log)
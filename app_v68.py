@@ -1,6 +1,17 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+from loader import load_standard
+from schema import REQUIRED
+from compact import compact_frame, memory_caption
+from engine import MARGINS, calc_metrics, match_labels
+from pnl_index import PnlIndex, make_grid
+from resample import bootstrap
+from staking import picks_table, simulate
+from perf import StageLog, show_panel
+from standings import MODES as STANDINGS_MODES, coverage, standings_book, with_standings
+from tables import show_table
+from walkforward import match_dates
 
 # --- CONFIGURAZIONE ---
 st.set_page_config(page_title="Optimizer V68 - The Fixer", page_icon="🔧", layout="wide")
@@ -10,108 +21,55 @@ Questa dashboard ti permette di **filtrare** lo storico di Novembre per trovare
 Muovi gli slider a sinistra finché il **Profitto Ottimizzato** non diventa verde.
 """)
 st.markdown("---")
-
-# --- FUNZIONI DI CALCOLO ---
-def get_probs(elo_h, elo_a, hfa):
-    try:
-        diff = elo_a - (elo_h + hfa)
-        exp = diff / 400
-        p_h = 1 / (1 + 10**exp)
-        return p_h, 1 - p_h
-    except: return 0, 0
-
-def no_margin(o1, ox, o2):
-    try:
-        if o1<=0 or ox<=0 or o2<=0: return 0,0,0
-        i1 = 1/o1; ix = 1/ox; i2 = 1/o2
-        s = i1 + ix + i2
-        return i1/s, ix/s, i2/s
-    except: return 0,0,0
+log = StageLog('V68')
 
 @st.cache_data(ttl=0)
-def load_data(file):
+def load_data(file, compact=False, standings='file'):
     try:
-        df = pd.read_csv(file, sep=';', encoding='latin1', on_bad_lines='skip', engine='python')
-        df.columns = df.columns.str.strip()
-        ren = {
-            '1': 'cotaa', '2': 'cotad', 'x': 'cotae', 'X': 'cotae', 
-            'eloc': 'elohomeo', 'eloo': 'eloawayo',
-            'gfinc': 'scor1', 'gfino': 'scor2'
-        }
-        new = {}
-        for c in df.columns:
-            if c.lower() in ren: new[c] = ren[c.lower()]
-        df = df.rename(columns=new)
-        
-        cols_num = ['cotaa', 'cotae', 'cotad', 'elohomeo', 'eloawayo', 'scor1', 'scor2']
-        for c in cols_num:
-            if c in df.columns:
-                df[c] = df[c].astype(str).str.replace(',', '.', regex=False)
-                df[c] = pd.to_numeric(df[c], errors='coerce')
-
-        df['Real_Res'] = '-'
-        if 'scor1' in df.columns and 'scor2' in df.columns:
-            mask = df['scor1'].notna() & df['scor2'].notna()
-            df.loc[mask & (df['scor1'] > df['scor2']), 'Real_Res'] = '1'
-            df.loc[mask & (df['scor1'] == df['scor2']), 'Real_Res'] = 'X'
-            df.loc[mask & (df['scor1'] < df['scor2']), 'Real_Res'] = '2'
-            
-        return df.dropna(subset=['cotaa', 'cotad', 'Real_Res']), None
+        # Lettura, nomi standard e Real_Res (con cache su disco)
+        df = load_standard(file, REQUIRED['backtest'])
+        df = df.dropna(subset=['cotaa', 'cotad', 'Real_Res'])
+        book = standings_book(standings)
+        if book is not None:
+            # Posizioni alla data di ogni partita dalla classifica interna
+            df = with_standings(df, book)
+        return (compact_frame(df) if compact else df), None
     except Exception as e: return None, str(e)
 
-# --- CALCOLO MASIVO ---
-def calculate_all_metrics(df, base_hfa, use_dyn):
-    data = []
-    for idx, row in df.iterrows():
-        if row['Real_Res'] == '-': continue
-        
-        curr_hfa = base_hfa
-        if use_dyn:
-            r1 = row.get('place1a') if pd.notna(row.get('place1a')) else row.get('Place 1a')
-            r2 = row.get('place2d') if pd.notna(row.get('place2d')) else row.get('Place 2d')
-            if pd.notna(r1) and pd.notna(r2):
-                try:
-                    curr_hfa += (float(r2) - float(r1)) * 3
-                    curr_hfa = max(0, min(curr_hfa, 200))
-                except: pass
-        
-        f1, fx, f2 = no_margin(row['cotaa'], row['cotae'], row['cotad'])
-        ph, pa = get_probs(row['elohomeo'], row['eloawayo'], curr_hfa)
-        rem = 1 - fx
-        fin1 = rem * ph
-        fin2 = rem * pa
-        
-        ev1 = (row['cotaa'] * fin1) - 1
-        ev2 = (row['cotad'] * fin2) - 1
-        
-        pnl_1 = (row['cotaa'] - 1) if row['Real_Res'] == '1' else -1
-        pnl_2 = (row['cotad'] - 1) if row['Real_Res'] == '2' else -1
-        
-        data.append({
-            'Odds_1': row['cotaa'],
-            'Odds_2': row['cotad'],
-            'EV_1': ev1 * 100,
-            'EV_2': ev2 * 100,
-            'PNL_1': pnl_1,
-            'PNL_2': pnl_2,
-            'League': row.get('league', 'Unknown'),
-            'Match': f"{row.get('txtechipa1')} vs {row.get('txtechipa2')}"
-        })
-    return pd.DataFrame(data)
+# Risorsa condivisa tra le sessioni: solo le ultime combinazioni file/HFA/margine restano in RAM
+@st.cache_resource(max_entries=4)
+def build_index(df, base_hfa, use_dyn, margin='proportional'):
+    # Metriche + indice cumulativo sulla stessa griglia degli slider
+    full_data = calc_metrics(df, base_hfa, use_dyn, margin)
+    index = PnlIndex(full_data, make_grid(0.0, 10.0, 0.5), make_grid(1.20, 10.0, 0.01))
+    return full_data, index
 
 # --- UI ---
 st.sidebar.header("1. Parametri Modello")
 base_hfa = st.sidebar.number_input("HFA Base", 90, step=10)
 use_dyn = st.sidebar.checkbox("Usa HFA Dinamico", True)
+margin = st.sidebar.selectbox("Rimozione margine", list(MARGINS), format_func=MARGINS.get,
+                              help="Come togliere l'aggio dalle quote 1X2: la probabilità del pareggio cambia tutti gli EV.")
+standings_mode = st.sidebar.selectbox("Classifica (HFA dinamico)", list(STANDINGS_MODES), format_func=STANDINGS_MODES.get,
+                                      help="Interna = posizioni ricostruite dai risultati già caricati, alla data di ogni partita.")
+compact_mem = st.sidebar.checkbox("Memoria compatta", False,
+                                  help="Squadre, leghe e risultati come categorie, quote in float32, classifica in interi piccoli: molta meno RAM sui file di stagione.")
 
 uploaded = st.sidebar.file_uploader("Carica File Risultati (CSV)", type=["csv"])
 
 if uploaded:
-    raw_df, err = load_data(uploaded)
+    with log.stage('Caricamento') as s:
+        raw_df, err = load_data(uploaded, compact_mem, standings_mode)
+        s['rows'] = len(raw_df) if raw_df is not None else 0
     
     if raw_df is not None and not raw_df.empty:
+        if compact_mem:
+            st.caption(memory_caption(raw_df))
+        if standings_mode != 'file':
+            st.caption(f"📊 Classifica disponibile per il {coverage(raw_df):.0%} delle partite.")
         # Calcola tutto una volta sola
-        full_data = calculate_all_metrics(raw_df, base_hfa, use_dyn)
+        with log.stage('Metriche + indice', len(raw_df)):
+            full_data, index = build_index(raw_df, base_hfa, use_dyn, margin)
         
         st.sidebar.header("2. FILTRI DI CORREZIONE")
         st.sidebar.info("Modifica qui sotto per eliminare le perdite!")
@@ -120,34 +78,22 @@ if uploaded:
         min_ev = st.sidebar.slider("EV Minimo (%)", 0.0, 10.0, 4.0, 0.5)
         min_odds, max_odds = st.sidebar.slider("Range Quote Accettate", 1.20, 10.0, (1.50, 3.50))
         
-        # Filtra il dataset
-        # Strategia AWAY
-        mask_away = (
-            (full_data['EV_2'] >= min_ev) & 
-            (full_data['Odds_2'] >= min_odds) & 
-            (full_data['Odds_2'] <= max_odds)
-        )
-        
-        # Strategia HOME
-        mask_home = (
-            (full_data['EV_1'] >= min_ev) & 
-            (full_data['Odds_1'] >= min_odds) & 
-            (full_data['Odds_1'] <= max_odds)
-        )
-        
-        df_away = full_data[mask_away]
-        df_home = full_data[mask_home]
-        
-        # CALCOLO PROFITTI
-        pnl_away = df_away['PNL_2'].sum()
-        pnl_home = df_home['PNL_1'].sum()
+        # CALCOLO PROFITTI (dall'indice, senza filtrare le righe)
+        with log.stage('Query filtri'):
+            pnl_away, n_away, _ = index.query('2', min_ev, np.inf, min_odds, max_odds)
+            pnl_home, n_home, _ = index.query('1', min_ev, np.inf, min_odds, max_odds)
         total_pnl = pnl_away + pnl_home
         
-        bets_count = len(df_away) + len(df_home)
+        bets_count = n_away + n_home
         roi = 0
         if bets_count > 0:
             roi = (total_pnl / bets_count) * 100
             
+        # Righe selezionate (per dettaglio e bootstrap)
+        with log.stage('Righe selezionate'):
+            df_away = full_data.iloc[index.rows('2', min_ev, np.inf, min_odds, max_odds)]
+            df_home = full_data.iloc[index.rows('1', min_ev, np.inf, min_odds, max_odds)]
+
         # --- DISPLAY RISULTATI ---
         st.subheader("💡 Risultati Simulazione con Filtri Attivi")
         
@@ -165,22 +111,76 @@ if uploaded:
         else:
             st.warning("⚠️ Ancora in perdita. Prova ad abbassare la 'Quota Massima' (es. a 2.50) o alzare 'EV Minimo'.")
 
+        # Affidabilità del ROI (bootstrap sulle scommesse selezionate, in ordine di file)
+        with log.stage('Bootstrap ROI', bets_count):
+            boot = bootstrap(pd.concat([df_home['PNL_1'], df_away['PNL_2']]).sort_index(kind='stable').to_numpy())
+        if boot is not None:
+            st.caption(f"📏 ROI 95%: da {boot['CI_Low']:.2f}% a {boot['CI_High']:.2f}% · "
+                       f"P(ROI > 0): {boot['P_Positive'] * 100:.1f}% · "
+                       f"Max drawdown: {boot['DD_Actual']:.2f} u (tipico {boot['DD_Median']:.2f} u, 95° perc. {boot['DD_95']:.2f} u)")
+            with st.expander("Distribuzione Max Drawdown (bootstrap)"):
+                counts, edges = np.histogram(boot['DD'], bins=30)
+                st.bar_chart(pd.Series(counts, index=np.round(edges[:-1], 1), name='Ricampionamenti'))
+
         st.markdown("---")
         
         # DETTAGLIO PER STRATEGIA
         c1, c2 = st.columns(2)
         
-        with c1:
-            st.write(f"### 🏠 Strategia CASA (1) - {len(df_home)} bets")
-            st.metric("Profitto Casa", f"{pnl_home:.2f} u")
-            if not df_home.empty:
-                st.dataframe(df_home[['Match', 'Odds_1', 'EV_1', 'PNL_1']].style.format({'Odds_1': '{:.2f}', 'EV_1': '{:.2f}%', 'PNL_1': '{:.2f}'}), height=300)
-        
-        with c2:
-            st.write(f"### ✈️ Strategia OSPITE (2) - {len(df_away)} bets")
-            st.metric("Profitto Ospite", f"{pnl_away:.2f} u")
-            if not df_away.empty:
-                st.dataframe(df_away[['Match', 'Odds_2', 'EV_2', 'PNL_2']].style.format({'Odds_2': '{:.2f}', 'EV_2': '{:.2f}%', 'PNL_2': '{:.2f}'}), height=300)
+        with log.stage('Tabelle dettaglio (pagina)', len(df_home) + len(df_away)):
+            with c1:
+                st.write(f"### 🏠 Strategia CASA (1) - {len(df_home)} bets")
+                st.metric("Profitto Casa", f"{pnl_home:.2f} u")
+                if not df_home.empty:
+                    show_table(df_home[['Odds_1', 'EV_1', 'PNL_1']], 'home', height=300, style=lambda page: page.assign(
+                        Match=match_labels(raw_df, page.index))[['Match', 'Odds_1', 'EV_1', 'PNL_1']].style.format({
+                            'Odds_1': '{:.2f}', 'EV_1': '{:.2f}%', 'PNL_1': '{:.2f}'
+                        }))
+        
+            with c2:
+                st.write(f"### ✈️ Strategia OSPITE (2) - {len(df_away)} bets")
+                st.metric("Profitto Ospite", f"{pnl_away:.2f} u")
+                if not df_away.empty:
+                    show_table(df_away[['Odds_2', 'EV_2', 'PNL_2']], 'away', height=300, style=lambda page: page.assign(
+                        Match=match_labels(raw_df, page.index))[['Match', 'Odds_2', 'EV_2', 'PNL_2']].style.format({
+                            'Odds_2': '{:.2f}', 'EV_2': '{:.2f}%', 'PNL_2': '{:.2f}'
+                        }))
+
+        # --- GESTIONE BANKROLL ---
+        st.sidebar.header("3. GESTIONE BANKROLL")
+        if st.sidebar.checkbox("Simula staking", False):
+            start_bank = st.sidebar.number_input("Bankroll iniziale (€)", 10.0, 1_000_000.0, 100.0, 10.0)
+            flat_pct = st.sidebar.number_input("Stake fisso (% bankroll iniziale)", 0.1, 20.0, 1.0, 0.1)
+            cur_pct = st.sidebar.number_input("Stake % bankroll attuale", 0.1, 20.0, 2.0, 0.1)
+            kelly_frac = st.sidebar.number_input("Frazione di Kelly", 0.05, 1.0, 0.25, 0.05)
+            ruin_pct = st.sidebar.number_input("Soglia rovina (% bankroll iniziale)", 1, 99, 50, 1)
+            schemes = {
+                f"Flat {flat_pct:g}%": ('flat', flat_pct / 100),
+                f"Fisso {cur_pct:g}%": ('pct', cur_pct / 100),
+                f"Kelly x{kelly_frac:g}": ('kelly', kelly_frac),
+            }
+
+            # Giocate in ordine di data (datameci), altrimenti in ordine di file
+            dates = match_dates(raw_df[raw_df['Real_Res'] != '-']) if 'datameci' in raw_df.columns else None
+            picks = picks_table(full_data, df_home.index, df_away.index, dates)
+            with log.stage('Simulazione bankroll', len(picks)):
+                summary, paths = simulate(picks, schemes, start_bank, ruin_pct / 100)
+
+            st.markdown("---")
+            st.subheader("💰 Simulazione Bankroll (giocate in ordine cronologico)")
+            if summary.empty:
+                st.warning("Nessuna giocata con i filtri attuali.")
+            else:
+                st.line_chart(paths)
+                st.dataframe(
+                    summary.style.format({
+                        'Finale': '{:.2f}€', 'Profitto %': '{:.2f}%', 'Max DD %': '{:.2f}%',
+                        'Minimo': '{:.2f}€', 'Rischio Rovina %': '{:.1f}%'
+                    }),
+                    use_container_width=True
+                )
 
     else:
         st.error(f"Errore: {err}")
+
+show_panel(log)
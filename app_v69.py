@@ -1,6 +1,18 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+from loader import load_standard
+from schema import REQUIRED
+from compact import compact_frame, memory_caption
+from engine import MARGINS, calc_metrics, match_labels, calc_sweep
+from optimizer import grid_search, hfa_curve
+from pnl_index import PnlIndex, make_grid
+from resample import bootstrap
+from staking import picks_table, simulate
+from perf import StageLog, show_panel
+from standings import MODES as STANDINGS_MODES, coverage, standings_book, with_standings
+from tables import show_table
+from walkforward import match_dates, walk_forward
 
 # --- CONFIGURAZIONE ---
 st.set_page_config(page_title="Optimizer V69 - EV Range", page_icon="🎚️", layout="wide")
@@ -10,108 +22,69 @@ Usa il nuovo slider **Range EV** per selezionare un intervallo specifico (es. da
 Spesso eliminare gli EV estremi (>15%) riduce la varianza e migliora il profitto.
 """)
 st.markdown("---")
+log = StageLog('V69')
 
-# --- FUNZIONI DI CALCOLO ---
-def get_probs(elo_h, elo_a, hfa):
+@st.cache_data(ttl=0)
+def load_data(file, compact=False, standings='file'):
     try:
-        diff = elo_a - (elo_h + hfa)
-        exp = diff / 400
-        p_h = 1 / (1 + 10**exp)
-        return p_h, 1 - p_h
-    except: return 0, 0
+        # Lettura, nomi standard e Real_Res (con cache su disco)
+        df = load_standard(file, REQUIRED['backtest'])
+        df = df.dropna(subset=['cotaa', 'cotad', 'Real_Res'])
+        book = standings_book(standings)
+        if book is not None:
+            # Posizioni alla data di ogni partita dalla classifica interna
+            df = with_standings(df, book)
+        return (compact_frame(df) if compact else df), None
+    except Exception as e: return None, str(e)
 
-def no_margin(o1, ox, o2):
-    try:
-        if o1<=0 or ox<=0 or o2<=0: return 0,0,0
-        i1 = 1/o1; ix = 1/ox; i2 = 1/o2
-        s = i1 + ix + i2
-        return i1/s, ix/s, i2/s
-    except: return 0,0,0
+# Risorsa condivisa tra le sessioni: solo le ultime combinazioni file/HFA/margine restano in RAM
+@st.cache_resource(max_entries=4)
+def build_index(df, base_hfa, use_dyn, margin='proportional'):
+    # Metriche + indice cumulativo sulla stessa griglia degli slider
+    full_data = calc_metrics(df, base_hfa, use_dyn, margin)
+    index = PnlIndex(full_data, make_grid(-5.0, 30.0, 0.5), make_grid(1.20, 10.0, 0.01))
+    return full_data, index
 
 @st.cache_data(ttl=0)
-def load_data(file):
-    try:
-        df = pd.read_csv(file, sep=';', encoding='latin1', on_bad_lines='skip', engine='python')
-        df.columns = df.columns.str.strip()
-        ren = {
-            '1': 'cotaa', '2': 'cotad', 'x': 'cotae', 'X': 'cotae', 
-            'eloc': 'elohomeo', 'eloo': 'eloawayo',
-            'gfinc': 'scor1', 'gfino': 'scor2'
-        }
-        new = {}
-        for c in df.columns:
-            if c.lower() in ren: new[c] = ren[c.lower()]
-        df = df.rename(columns=new)
-        
-        cols_num = ['cotaa', 'cotae', 'cotad', 'elohomeo', 'eloawayo', 'scor1', 'scor2']
-        for c in cols_num:
-            if c in df.columns:
-                df[c] = df[c].astype(str).str.replace(',', '.', regex=False)
-                df[c] = pd.to_numeric(df[c], errors='coerce')
-
-        df['Real_Res'] = '-'
-        if 'scor1' in df.columns and 'scor2' in df.columns:
-            mask = df['scor1'].notna() & df['scor2'].notna()
-            df.loc[mask & (df['scor1'] > df['scor2']), 'Real_Res'] = '1'
-            df.loc[mask & (df['scor1'] == df['scor2']), 'Real_Res'] = 'X'
-            df.loc[mask & (df['scor1'] < df['scor2']), 'Real_Res'] = '2'
-            
-        return df.dropna(subset=['cotaa', 'cotad', 'Real_Res']), None
-    except Exception as e: return None, str(e)
+def run_grid(df, hfa_values, use_dyn, ev_range, ev_step, odds_range, odds_step, min_bets, sort_by, margin='proportional'):
+    ev_grid = make_grid(ev_range[0], ev_range[1], ev_step)
+    odds_grid = make_grid(odds_range[0], odds_range[1], odds_step)
+    return grid_search(df, hfa_values, use_dyn, ev_grid, odds_grid, min_bets=min_bets, sort_by=sort_by, margin=margin)
 
-# --- CALCOLO MASSIVO ---
-def calculate_all_metrics(df, base_hfa, use_dyn):
-    data = []
-    for idx, row in df.iterrows():
-        if row['Real_Res'] == '-': continue
-        
-        curr_hfa = base_hfa
-        if use_dyn:
-            r1 = row.get('place1a') if pd.notna(row.get('place1a')) else row.get('Place 1a')
-            r2 = row.get('place2d') if pd.notna(row.get('place2d')) else row.get('Place 2d')
-            if pd.notna(r1) and pd.notna(r2):
-                try:
-                    curr_hfa += (float(r2) - float(r1)) * 3
-                    curr_hfa = max(0, min(curr_hfa, 200))
-                except: pass
-        
-        f1, fx, f2 = no_margin(row['cotaa'], row['cotae'], row['cotad'])
-        ph, pa = get_probs(row['elohomeo'], row['eloawayo'], curr_hfa)
-        rem = 1 - fx
-        fin1 = rem * ph
-        fin2 = rem * pa
-        
-        ev1 = (row['cotaa'] * fin1) - 1
-        ev2 = (row['cotad'] * fin2) - 1
-        
-        pnl_1 = (row['cotaa'] - 1) if row['Real_Res'] == '1' else -1
-        pnl_2 = (row['cotad'] - 1) if row['Real_Res'] == '2' else -1
-        
-        data.append({
-            'Odds_1': row['cotaa'],
-            'Odds_2': row['cotad'],
-            'EV_1': ev1 * 100,
-            'EV_2': ev2 * 100,
-            'PNL_1': pnl_1,
-            'PNL_2': pnl_2,
-            'League': row.get('league', 'Unknown'),
-            'Match': f"{row.get('txtechipa1')} vs {row.get('txtechipa2')}"
-        })
-    return pd.DataFrame(data)
+@st.cache_data(ttl=0)
+def run_walk_forward(df, hfa_values, use_dyn, ev_range, ev_step, odds_range, odds_step, train_days, test_days, anchored, min_bets, sort_by,
+                     margin='proportional'):
+    ev_grid = make_grid(ev_range[0], ev_range[1], ev_step)
+    odds_grid = make_grid(odds_range[0], odds_range[1], odds_step)
+    return walk_forward(df, hfa_values, use_dyn, ev_grid, odds_grid, train_days, test_days,
+                        anchored, min_bets=min_bets, sort_by=sort_by, margin=margin)
 
 # --- UI ---
 st.sidebar.header("1. Parametri Modello")
 base_hfa = st.sidebar.number_input("HFA Base", 90, step=10)
 use_dyn = st.sidebar.checkbox("Usa HFA Dinamico", True)
+margin = st.sidebar.selectbox("Rimozione margine", list(MARGINS), format_func=MARGINS.get,
+                              help="Come togliere l'aggio dalle quote 1X2: la probabilità del pareggio cambia tutti gli EV.")
+standings_mode = st.sidebar.selectbox("Classifica (HFA dinamico)", list(STANDINGS_MODES), format_func=STANDINGS_MODES.get,
+                                      help="Interna = posizioni ricostruite dai risultati già caricati, alla data di ogni partita.")
+compact_mem = st.sidebar.checkbox("Memoria compatta", False,
+                                  help="Squadre, leghe e risultati come categorie, quote in float32, classifica in interi piccoli: molta meno RAM sui file di stagione.")
 
 uploaded = st.sidebar.file_uploader("Carica File Risultati (CSV)", type=["csv"])
 
 if uploaded:
-    raw_df, err = load_data(uploaded)
+    with log.stage('Caricamento') as s:
+        raw_df, err = load_data(uploaded, compact_mem, standings_mode)
+        s['rows'] = len(raw_df) if raw_df is not None else 0
     
     if raw_df is not None and not raw_df.empty:
+        if compact_mem:
+            st.caption(memory_caption(raw_df))
+        if standings_mode != 'file':
+            st.caption(f"📊 Classifica disponibile per il {coverage(raw_df):.0%} delle partite.")
         # Calcola tutto
-        full_data = calculate_all_metrics(raw_df, base_hfa, use_dyn)
+        with log.stage('Metriche + indice', len(raw_df)):
+            full_data, index = build_index(raw_df, base_hfa, use_dyn, margin)
         
         st.sidebar.header("2. FILTRI DI CORREZIONE")
         
@@ -127,32 +100,22 @@ if uploaded:
         
         min_odds, max_odds = st.sidebar.slider("Range Quote Accettate", 1.20, 10.0, (1.50, 3.50))
         
-        # Filtra il dataset
-        # Strategia AWAY
-        mask_away = (
-            (full_data['EV_2'] >= min_ev) & (full_data['EV_2'] <= max_ev) &
-            (full_data['Odds_2'] >= min_odds) & (full_data['Odds_2'] <= max_odds)
-        )
-        
-        # Strategia HOME
-        mask_home = (
-            (full_data['EV_1'] >= min_ev) & (full_data['EV_1'] <= max_ev) &
-            (full_data['Odds_1'] >= min_odds) & (full_data['Odds_1'] <= max_odds)
-        )
-        
-        df_away = full_data[mask_away]
-        df_home = full_data[mask_home]
-        
-        # CALCOLO PROFITTI
-        pnl_away = df_away['PNL_2'].sum()
-        pnl_home = df_home['PNL_1'].sum()
+        # CALCOLO PROFITTI (dall'indice, senza filtrare le righe)
+        with log.stage('Query filtri'):
+            pnl_away, n_away, _ = index.query('2', min_ev, max_ev, min_odds, max_odds)
+            pnl_home, n_home, _ = index.query('1', min_ev, max_ev, min_odds, max_odds)
         total_pnl = pnl_away + pnl_home
         
-        bets_count = len(df_away) + len(df_home)
+        bets_count = n_away + n_home
         roi = 0
         if bets_count > 0:
             roi = (total_pnl / bets_count) * 100
             
+        # Righe selezionate (per dettaglio e bootstrap)
+        with log.stage('Righe selezionate'):
+            df_away = full_data.iloc[index.rows('2', min_ev, max_ev, min_odds, max_odds)]
+            df_home = full_data.iloc[index.rows('1', min_ev, max_ev, min_odds, max_odds)]
+
         # --- DISPLAY RISULTATI ---
         st.subheader("💡 Risultati Simulazione con Filtri Attivi")
         
@@ -172,30 +135,179 @@ if uploaded:
         else:
             st.warning("⚠️ Ancora in perdita. Prova a stringere il range EV (es. 4-10%) o abbassare la Quota Max.")
 
+        # Affidabilità del ROI (bootstrap sulle scommesse selezionate, in ordine di file)
+        with log.stage('Bootstrap ROI', bets_count):
+            boot = bootstrap(pd.concat([df_home['PNL_1'], df_away['PNL_2']]).sort_index(kind='stable').to_numpy())
+        if boot is not None:
+            st.caption(f"📏 ROI 95%: da {boot['CI_Low']:.2f}% a {boot['CI_High']:.2f}% · "
+                       f"P(ROI > 0): {boot['P_Positive'] * 100:.1f}% · "
+                       f"Max drawdown: {boot['DD_Actual']:.2f} u (tipico {boot['DD_Median']:.2f} u, 95° perc. {boot['DD_95']:.2f} u)")
+            with st.expander("Distribuzione Max Drawdown (bootstrap)"):
+                counts, edges = np.histogram(boot['DD'], bins=30)
+                st.bar_chart(pd.Series(counts, index=np.round(edges[:-1], 1), name='Ricampionamenti'))
+
         st.markdown("---")
         
         # DETTAGLIO
         c1, c2 = st.columns(2)
         
-        with c1:
-            st.write(f"### 🏠 Strategia CASA (1) - {len(df_home)} bets")
-            if not df_home.empty:
+        with log.stage('Tabelle dettaglio (pagina)', len(df_home) + len(df_away)):
+            with c1:
+                st.write(f"### 🏠 Strategia CASA (1) - {len(df_home)} bets")
+                if not df_home.empty:
+                    show_table(df_home[['Odds_1', 'EV_1', 'PNL_1']], 'home', height=300, style=lambda page: page.assign(
+                        Match=match_labels(raw_df, page.index))[['Match', 'Odds_1', 'EV_1', 'PNL_1']].style.format({
+                            'Odds_1': '{:.2f}', 'EV_1': '{:.2f}%', 'PNL_1': '{:.2f}'
+                        }))
+        
+            with c2:
+                st.write(f"### ✈️ Strategia OSPITE (2) - {len(df_away)} bets")
+                if not df_away.empty:
+                    show_table(df_away[['Odds_2', 'EV_2', 'PNL_2']], 'away', height=300, style=lambda page: page.assign(
+                        Match=match_labels(raw_df, page.index))[['Match', 'Odds_2', 'EV_2', 'PNL_2']].style.format({
+                            'Odds_2': '{:.2f}', 'EV_2': '{:.2f}%', 'PNL_2': '{:.2f}'
+                        }))
+
+        # --- CURVA PROFITTO vs HFA (filtri attuali) ---
+        if st.sidebar.checkbox("Mostra Profitto vs HFA", False):
+            with log.stage('Sweep HFA', len(raw_df)):
+                sweep = calc_sweep(raw_df, np.arange(0, 201, 10), use_dyn, margin)
+            curve_home = hfa_curve(sweep, '1', min_ev, max_ev, min_odds, max_odds)
+            curve_away = hfa_curve(sweep, '2', min_ev, max_ev, min_odds, max_odds)
+
+            st.markdown("---")
+            st.subheader("📈 Profitto vs HFA Base (con i filtri attuali)")
+            st.line_chart(pd.DataFrame({'CASA (1)': curve_home['PNL'], 'OSPITE (2)': curve_away['PNL']}))
+
+        # --- OTTIMIZZATORE AUTOMATICO ---
+        st.sidebar.header("3. OTTIMIZZATORE")
+        use_grid = st.sidebar.checkbox("Cerca la configurazione migliore", False)
+
+        if use_grid:
+            hfa_txt = st.sidebar.text_input("Valori HFA da provare", "60, 75, 90, 105, 120")
+            grid_ev = st.sidebar.slider("Griglia EV (%)", -5.0, 30.0, (0.0, 25.0), 0.5)
+            grid_ev_step = st.sidebar.number_input("Passo EV", 0.5, 5.0, 0.5, 0.5)
+            grid_odds = st.sidebar.slider("Griglia Quote", 1.20, 10.0, (1.50, 4.00))
+            grid_odds_step = st.sidebar.number_input("Passo Quote", 0.01, 1.0, 0.05, 0.01)
+            min_bets = st.sidebar.number_input("Scommesse Minime", 1, 1000, 20, 5)
+            sort_by = st.sidebar.selectbox("Ordina per", ['PNL', 'ROI', 'Bets'])
+
+            try:
+                hfa_values = [float(v) for v in hfa_txt.replace(';', ',').split(',') if v.strip()]
+            except ValueError:
+                hfa_values = [base_hfa]
+                st.sidebar.error("Valori HFA non validi: uso solo l'HFA Base.")
+
+            st.markdown("---")
+            st.subheader("🧪 Ottimizzatore: Migliori Configurazioni")
+            with log.stage('Ottimizzatore a griglia', len(raw_df)):
+                best = run_grid(raw_df, hfa_values, use_dyn, grid_ev, grid_ev_step,
+                                grid_odds, grid_odds_step, min_bets, sort_by, margin)
+
+            if best.empty:
+                st.warning("Nessuna combinazione raggiunge il numero minimo di scommesse.")
+            else:
+                top = best.iloc[0]
+                lato = "CASA (1)" if top['Side'] == '1' else "OSPITE (2)"
+                st.success(f"🏆 {lato} | HFA {top['HFA']:.0f} | EV {top['EV_Min']:.1f}-{top['EV_Max']:.1f}% | "
+                           f"Quote {top['Odds_Min']:.2f}-{top['Odds_Max']:.2f} → {top['PNL']:.2f} u su {top['Bets']} bets")
                 st.dataframe(
-                    df_home[['Match', 'Odds_1', 'EV_1', 'PNL_1']].style.format({
-                        'Odds_1': '{:.2f}', 'EV_1': '{:.2f}%', 'PNL_1': '{:.2f}'
-                    }), 
-                    height=300
+                    best.style.format({
+                        'HFA': '{:.0f}', 'EV_Min': '{:.1f}%', 'EV_Max': '{:.1f}%',
+                        'Odds_Min': '{:.2f}', 'Odds_Max': '{:.2f}', 'PNL': '{:.2f}', 'ROI': '{:.2f}%'
+                    }),
+                    use_container_width=True,
+                    height=400
                 )
-        
-        with c2:
-            st.write(f"### ✈️ Strategia OSPITE (2) - {len(df_away)} bets")
-            if not df_away.empty:
+                st.caption("⚠️ Configurazioni scelte sugli stessi dati: il profitto reale sarà più basso (overfitting).")
+
+        # --- WALK-FORWARD (fuori campione) ---
+        st.sidebar.header("4. WALK-FORWARD")
+        use_wf = st.sidebar.checkbox("Verifica fuori campione", False,
+                                     help="Sceglie il filtro migliore sui giorni passati e lo gioca sui giorni successivi.")
+
+        if use_wf:
+            if 'datameci' not in raw_df.columns:
+                st.warning("Walk-forward non disponibile: manca la colonna 'datameci'.")
+            else:
+                wf_hfa_txt = st.sidebar.text_input("Valori HFA (walk-forward)", str(base_hfa))
+                train_days = st.sidebar.number_input("Giorni di training", 7, 730, 56, 7)
+                test_days = st.sidebar.number_input("Giorni di test", 1, 90, 7, 1)
+                anchored = st.sidebar.checkbox("Training dall'inizio (finestra crescente)", False)
+                wf_ev = st.sidebar.slider("Griglia EV walk-forward (%)", -5.0, 30.0, (0.0, 20.0), 0.5)
+                wf_ev_step = st.sidebar.number_input("Passo EV (walk-forward)", 0.5, 5.0, 1.0, 0.5)
+                wf_odds = st.sidebar.slider("Griglia Quote walk-forward", 1.20, 10.0, (1.50, 4.00))
+                wf_odds_step = st.sidebar.number_input("Passo Quote (walk-forward)", 0.01, 1.0, 0.10, 0.01)
+                wf_min_bets = st.sidebar.number_input("Scommesse Minime in training", 1, 1000, 20, 5)
+                wf_sort = st.sidebar.selectbox("Criterio di scelta", ['PNL', 'ROI'])
+
+                try:
+                    wf_hfa = [float(v) for v in wf_hfa_txt.replace(';', ',').split(',') if v.strip()]
+                except ValueError:
+                    wf_hfa = [base_hfa]
+                    st.sidebar.error("Valori HFA non validi: uso solo l'HFA Base.")
+
+                st.markdown("---")
+                st.subheader("🚶 Walk-Forward: Profitto Fuori Campione")
+                with log.stage('Walk-forward', len(raw_df)):
+                    windows, oos = run_walk_forward(raw_df, wf_hfa, use_dyn, wf_ev, wf_ev_step, wf_odds, wf_odds_step,
+                                                    train_days, test_days, anchored, wf_min_bets, wf_sort, margin)
+
+                if windows.empty:
+                    st.warning("Periodo troppo corto per almeno una finestra di training + test.")
+                else:
+                    oos_pnl = oos['PNL'].sum()
+                    w1, w2, w3 = st.columns(3)
+                    w1.metric("Finestre", len(windows))
+                    w2.metric("Scommesse Fuori Campione", len(oos))
+                    w3.metric("Profitto Fuori Campione", f"{oos_pnl:.2f} u",
+                              delta=f"{(oos_pnl / len(oos) * 100) if len(oos) else 0:.2f}% ROI")
+                    if len(oos):
+                        st.line_chart(oos.set_index('Date')['Equity'])
+                    st.dataframe(
+                        windows.style.format({
+                            'HFA': '{:.0f}', 'EV_Min': '{:.1f}%', 'EV_Max': '{:.1f}%', 'Odds_Min': '{:.2f}',
+                            'Odds_Max': '{:.2f}', 'Train_PNL': '{:.2f}', 'Test_PNL': '{:.2f}'
+                        }, na_rep='-'),
+                        use_container_width=True,
+                        height=300
+                    )
+
+        # --- GESTIONE BANKROLL ---
+        st.sidebar.header("5. GESTIONE BANKROLL")
+        if st.sidebar.checkbox("Simula staking", False):
+            start_bank = st.sidebar.number_input("Bankroll iniziale (€)", 10.0, 1_000_000.0, 100.0, 10.0)
+            flat_pct = st.sidebar.number_input("Stake fisso (% bankroll iniziale)", 0.1, 20.0, 1.0, 0.1)
+            cur_pct = st.sidebar.number_input("Stake % bankroll attuale", 0.1, 20.0, 2.0, 0.1)
+            kelly_frac = st.sidebar.number_input("Frazione di Kelly", 0.05, 1.0, 0.25, 0.05)
+            ruin_pct = st.sidebar.number_input("Soglia rovina (% bankroll iniziale)", 1, 99, 50, 1)
+            schemes = {
+                f"Flat {flat_pct:g}%": ('flat', flat_pct / 100),
+                f"Fisso {cur_pct:g}%": ('pct', cur_pct / 100),
+                f"Kelly x{kelly_frac:g}": ('kelly', kelly_frac),
+            }
+
+            # Giocate in ordine di data (datameci), altrimenti in ordine di file
+            dates = match_dates(raw_df[raw_df['Real_Res'] != '-']) if 'datameci' in raw_df.columns else None
+            picks = picks_table(full_data, df_home.index, df_away.index, dates)
+            with log.stage('Simulazione bankroll', len(picks)):
+                summary, paths = simulate(picks, schemes, start_bank, ruin_pct / 100)
+
+            st.markdown("---")
+            st.subheader("💰 Simulazione Bankroll (giocate in ordine cronologico)")
+            if summary.empty:
+                st.warning("Nessuna giocata con i filtri attuali.")
+            else:
+                st.line_chart(paths)
                 st.dataframe(
-                    df_away[['Match', 'Odds_2', 'EV_2', 'PNL_2']].style.format({
-                        'Odds_2': '{:.2f}', 'EV_2': '{:.2f}%', 'PNL_2': '{:.2f}'
-                    }), 
-                    height=300
+                    summary.style.format({
+                        'Finale': '{:.2f}€', 'Profitto %': '{:.2f}%', 'Max DD %': '{:.2f}%',
+                        'Minimo': '{:.2f}€', 'Rischio Rovina %': '{:.1f}%'
+                    }),
+                    use_container_width=True
                 )
 
     else:
         st.error(f"Errore: {err}")
+
+show_panel(log)
@@ -1,6 +1,13 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+from compact import memory_caption
+from incremental import SignalState
+from engine import MARGINS
+from perf import StageLog, show_panel
+from standings import MODES as STANDINGS_MODES, coverage, standings_book
+from signals import GOLDEN_COLS, golden_picks, load_golden
+from tables import show_table
 
 # --- CONFIGURAZIONE ---
 st.set_page_config(page_title="Sniper V70 - Golden Strategy", page_icon="🏆", layout="wide")
@@ -13,98 +20,36 @@ Stiamo cercando solo le situazioni che hanno generato **+11.52u** a Novembre:
 - **Valore (EV):** 11% - 19.5%
 """)
 st.markdown("---")
+log = StageLog('V70')
 
-# --- CORE LOGIC ---
-def get_probs(elo_h, elo_a, hfa):
-    try:
-        diff = elo_a - (elo_h + hfa)
-        exp = diff / 400
-        p_h = 1 / (1 + 10**exp)
-        return p_h, 1 - p_h
-    except: return 0, 0
-
-def no_margin(o1, ox, o2):
-    try:
-        if o1<=0 or ox<=0 or o2<=0: return 0,0,0
-        i1 = 1/o1; ix = 1/ox; i2 = 1/o2
-        s = i1 + ix + i2
-        return i1/s, ix/s, i2/s
-    except: return 0,0,0
-
-def calc_sniper(row, base_hfa, dyn):
-    res = {'Signal': 'SKIP', 'EV': 0, 'Pick': '-', 'HFA': base_hfa}
+@st.cache_data(ttl=0)
+def load_data(file, hfa, dyn, compact=False, standings='file', margin='proportional'):
     try:
-        def to_f(v):
-            try: return float(str(v).replace(',', '.'))
-            except: return 0.0
-
-        elo_h = to_f(row.get('elohomeo', 1500))
-        elo_a = to_f(row.get('eloawayo', 1500))
-        o1 = to_f(row.get('cotaa', 0))
-        ox = to_f(row.get('cotae', 0))
-        o2 = to_f(row.get('cotad', 0))
-        
-        # HFA Dinamico
-        curr_hfa = base_hfa
-        if dyn:
-            r1 = row.get('place1a') or row.get('Place 1a') or row.get('place 1a')
-            r2 = row.get('place2d') or row.get('Place 2d') or row.get('place 2d')
-            
-            if pd.notna(r1) and pd.notna(r2):
-                try:
-                    curr_hfa += (float(r2) - float(r1)) * 3
-                    curr_hfa = max(0, min(curr_hfa, 200))
-                except: pass
-        
-        res['HFA'] = int(curr_hfa)
-        
-        # Calcoli
-        f1, fx, f2 = no_margin(o1, ox, o2)
-        ph, pa = get_probs(elo_h, elo_a, curr_hfa)
-        rem = 1 - fx
-        fin2 = rem * pa # Ci interessa solo l'ospite per ora
-        
-        ev2 = (o2 * fin2) - 1
-        ev2_perc = ev2 * 100
-        res['EV'] = round(ev2_perc, 2)
-        
-        # --- FILTRO VINCENTE (I tuoi parametri) ---
-        # Range Quote: 2.06 - 2.80
-        # Range EV: 11% - 19.5%
-        if (11.0 <= ev2_perc <= 19.5) and (2.06 <= o2 <= 2.80):
-            res['Signal'] = '💎 GOLDEN PICK'
-            res['Pick'] = '2 (Ospite)'
-
-    except: pass
-    return pd.Series(res)
+        return load_golden(file, hfa, dyn, compact=compact, standings=standings_book(standings), margin=margin), None
+    except Exception as e: return None, str(e)
 
 @st.cache_data(ttl=0)
-def load_data(file, hfa, dyn):
+def load_incremental(file, hfa, dyn, compact=False, standings='file', margin='proportional'):
+    # Solo le partite nuove o cambiate dall'ultima esecuzione vengono ricalcolate
     try:
-        df = pd.read_csv(file, sep=';', encoding='latin1', on_bad_lines='skip', engine='python')
-        df.columns = df.columns.str.strip()
-        ren = {
-            '1': 'cotaa', '2': 'cotad', 'x': 'cotae', 'X': 'cotae', 
-            'eloc': 'elohomeo', 'eloo': 'eloawayo',
-            'home': 'txtechipa1', 'away': 'txtechipa2', 'casa': 'txtechipa1', 'ospite': 'txtechipa2'
-        }
-        new = {}
-        for c in df.columns:
-            if c.lower() in ren: new[c] = ren[c.lower()]
-        df = df.rename(columns=new)
-        df = df.dropna(subset=['cotaa'])
-        
-        if not df.empty:
-            calc = df.apply(lambda r: calc_sniper(r, hfa, dyn), axis=1)
-            df = pd.concat([df, calc], axis=1)
-        return df, None
-    except Exception as e: return None, str(e)
+        state = SignalState('golden')
+        df = load_golden(file, hfa, dyn, state, compact, standings=standings_book(standings), margin=margin)
+        return df, state.diff, state.recomputed, None
+    except Exception as e: return None, None, 0, str(e)
 
 # --- UI ---
 st.sidebar.header("⚙️ Parametri Vincenti")
 # Ho impostato i default sui tuoi valori vincenti
 base_hfa = st.sidebar.number_input("HFA Base", 90, step=10)
 use_dyn = st.sidebar.checkbox("Usa HFA Dinamico", True)
+margin = st.sidebar.selectbox("Rimozione margine", list(MARGINS), format_func=MARGINS.get,
+                              help="Come togliere l'aggio dalle quote 1X2: la probabilità del pareggio cambia tutti gli EV.")
+standings_mode = st.sidebar.selectbox("Classifica (HFA dinamico)", list(STANDINGS_MODES), format_func=STANDINGS_MODES.get,
+                                      help="Interna = posizioni ricostruite dai risultati già caricati, alla data di ogni partita.")
+incremental = st.sidebar.checkbox("Modalità incrementale", False,
+                                  help="Ricalcola solo le partite nuove o con quote/Elo/classifica cambiate e mostra le variazioni dall'ultima esecuzione.")
+compact_mem = st.sidebar.checkbox("Memoria compatta", False,
+                                  help="Squadre, leghe e segnali come categorie, quote in float32, classifica in interi piccoli: molta meno RAM sui file di stagione.")
 
 st.sidebar.markdown("---")
 st.sidebar.info("I filtri sono automatici sulla strategia 2.06-2.80 / EV 11-19.5%")
@@ -112,28 +57,42 @@ st.sidebar.info("I filtri sono automatici sulla strategia 2.06-2.80 / EV 11-19.5
 uploaded = st.file_uploader("Carica File Partite (CSV)", type=["csv"])
 
 if uploaded:
-    df, err = load_data(uploaded, base_hfa, use_dyn)
+    diff = None
+    with log.stage('Caricamento + segnali') as s:
+        if incremental:
+            df, diff, recomputed, err = load_incremental(uploaded, base_hfa, use_dyn, compact_mem, standings_mode, margin)
+        else:
+            df, err = load_data(uploaded, base_hfa, use_dyn, compact_mem, standings_mode, margin)
+        s['rows'] = len(df) if df is not None else 0
     
     if df is not None:
+        if compact_mem and memory_caption(df):
+            st.caption(memory_caption(df))
+        if standings_mode != 'file':
+            st.caption(f"📊 Classifica disponibile per il {coverage(df):.0%} delle partite.")
+        if diff is not None:
+            st.caption(f"🔄 Ricalcolate {recomputed} partite su {len(df)} (le altre dallo stato precedente).")
+            if not diff.empty:
+                with st.expander(f"🔄 {len(diff)} segnali variati dall'ultima esecuzione", expanded=True):
+                    st.dataframe(diff, use_container_width=True)
+
         # Filtra solo i Diamanti
-        gold_df = df[df['Signal'] == '💎 GOLDEN PICK'].copy()
+        with log.stage('Filtro Golden', len(df)):
+            gold_df = golden_picks(df)
         
         if not gold_df.empty:
             st.success(f"🎉 TROVATE {len(gold_df)} PARTITE D'ORO!")
             st.balloons()
             
             # Tabella Operativa
-            cols_show = ['datameci', 'league', 'txtechipa1', 'txtechipa2', 'cotad', 'EV', 'HFA']
-            final_cols = [c for c in cols_show if c in gold_df.columns]
+            final_cols = [c for c in GOLDEN_COLS if c in gold_df.columns]
             
-            st.dataframe(
-                gold_df[final_cols].style.applymap(
-                    lambda x: 'background-color: #d4edda; color: #155724; font-weight: bold', 
+            # Paginata: ordinamento/ricerca lato server, colori solo sulla pagina visibile
+            with log.stage('Tabella Golden (pagina)', len(gold_df)):
+                show_table(gold_df[final_cols], 'golden', style=lambda page: page.style.applymap(
+                    lambda x: 'background-color: #d4edda; color: #155724; font-weight: bold',
                     subset=['cotad', 'EV']
-                ),
-                use_container_width=True,
-                height=500
-            )
+                ), height=500)
             
             st.markdown("### 📝 Consigli Operativi")
             st.info("""
@@ -145,8 +104,13 @@ if uploaded:
         else:
             st.warning("Nessuna partita rientra nei parametri 'Golden' oggi. Meglio non forzare la giocata.")
             
-        with st.expander("Vedi tutte le partite analizzate"):
-            st.dataframe(df)
+        with st.expander("Vedi tutte le partite analizzate"), log.stage('Tabella completa (pagina)', len(df)):
+            show_table(df, 'all', style=lambda page: page.style.applymap(
+                lambda x: 'background-color: #d4edda; color: #155724; font-weight: bold' if '💎' in str(x) else '',
+                subset=['Signal']
+            ))
             
     else:
         st.error(f"Errore: {err}")
+
+show_panel(log)
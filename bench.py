@@ -0,0 +1,201 @@
+import argparse
+import io
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+# --- BENCHMARK ---
+# Genera file sintetici nello stesso formato degli export reali (';', virgola decimale,
+# latin1) e misura ogni fase: lettura, standardizzazione, calcolo, memoria compatta,
+# filtri, verifica.
+#   python bench.py --sizes 1000,100000,1000000 --save      -> salva bench_baseline.json
+#   python bench.py --sizes 1000,100000                     -> confronta con il baseline
+# Esce con codice 1 se un risultato cambia o una fase rallenta oltre la tolleranza.
+
+BASELINE = Path(__file__).with_name('bench_baseline.json')
+
+LEAGUES = ['ITA1', 'ITA2', 'ENG1', 'ENG2', 'ESP1', 'GER1', 'FRA1', 'POR1', 'NED1', 'BEL1']
+TEAMS = ['Atlético', 'Málaga', 'Köln', 'Inter', 'Juventus', 'Milan', 'Roma', 'Lazio', 'Napoli', 'Torino',
+         'Real Betis', 'Sevilla', 'Celta Vigo', 'Bayern', 'Dortmund', 'Lyon', 'Nîmes', 'Benfica', 'Porto', 'Ajax']
+
+
+def synth_matches(n, seed=0, results=True):
+    # Partite plausibili: quote coerenti con l'Elo (+ margine), classifica, qualche cella vuota
+    rng = np.random.default_rng(seed)
+    league = rng.integers(0, len(LEAGUES), n)
+    h = rng.integers(0, len(TEAMS), n)
+    a = (h + rng.integers(1, len(TEAMS), n)) % len(TEAMS)
+    # Elo con decimali come nei file reali (la memoria compatta non deve arrotondarli)
+    elo_h = rng.normal(1550, 120, n).round(3)
+    elo_a = rng.normal(1550, 120, n).round(3)
+    # Il bookmaker non vede esattamente l'Elo: da qui nascono gli EV positivi
+    view = rng.normal(0, 70, n)
+    p_h = 1 / (1 + 10 ** ((elo_a - elo_h - 60 + view) / 400))
+    p_x = 0.27 - 0.1 * np.abs(p_h - 0.5)
+    p1, p2 = p_h * (1 - p_x), (1 - p_h) * (1 - p_x)
+    noise = rng.normal(1, 0.06, (3, n))
+    margin = 1.06
+    df = pd.DataFrame({
+        'datameci': (pd.Timestamp('2024-08-01') + pd.to_timedelta(rng.integers(0, 365, n), 'D')).strftime('%d/%m/%Y'),
+        'league': np.array(LEAGUES)[league],
+        'txtechipa1': np.char.add(np.array(TEAMS)[h], np.char.add(' ', league.astype(str))),
+        'txtechipa2': np.char.add(np.array(TEAMS)[a], np.char.add(' ', league.astype(str))),
+        'cotaa': np.clip(1 / (p1 * margin) * noise[0], 1.01, 50).round(2),
+        'cotae': np.clip(1 / (p_x * margin) * noise[1], 1.01, 50).round(2),
+        'cotad': np.clip(1 / (p2 * margin) * noise[2], 1.01, 50).round(2),
+        'elohomeo': elo_h,
+        'eloawayo': elo_a,
+        'place1a': rng.integers(1, 21, n).astype(float),
+        'place2d': rng.integers(1, 21, n).astype(float),
+    })
+    df.loc[rng.random(n) < 0.05, 'place1a'] = np.nan
+    if results:
+        u = rng.random(n)
+        res = np.where(u < p1, 1, np.where(u < p1 + p_x, 0, 2))
+        goals = rng.integers(0, 3, n)
+        df['gfinc'] = np.where(res == 1, goals + 1, goals).astype(float)
+        df['gfino'] = np.where(res == 2, goals + 1, goals).astype(float)
+        df.loc[rng.random(n) < 0.02, ['gfinc', 'gfino']] = np.nan
+    return df
+
+
+def synth_csv(n, seed=0, results=True):
+    # Bytes del CSV come li esporta il fornitore
+    df = synth_matches(n, seed, results)
+    return df.to_csv(sep=';', decimal=',', index=False, float_format='%.10g').encode('latin1')
+
+
+def _stages(data):
+    # Fasi in ordine: ognuna riceve lo stato delle precedenti e ritorna un risultato di controllo
+    from compact import compact_frame
+    from engine import calc_golden, calc_metrics, calc_tiers
+    from loader import read_matches, standardize
+    from optimizer import grid_search
+    from pnl_index import PnlIndex, make_grid
+    from settle import settle
+
+    st = {}
+
+    def parse():
+        st['raw'] = read_matches(io.BytesIO(data))
+        return {'rows': len(st['raw'])}
+
+    def std():
+        st['df'] = standardize(st['raw'].copy())
+        return {'with_result': int((st['df']['Real_Res'] != '-').sum())}
+
+    def compute():
+        st['tiers'] = calc_tiers(st['df'], 90, True)
+        st['metrics'] = calc_metrics(st['df'], 90, True)
+        gold = calc_golden(st['df'], 90, True)
+        return {'signals': int((st['tiers']['Signal'] != 'SKIP').sum()),
+                'golden': int((gold['Signal'] != 'SKIP').sum()),
+                'ev2_sum': round(float(np.nansum(st['metrics']['EV_2'])), 4)}
+
+    def compact():
+        # Memoria compatta: stessi segnali con una frazione della RAM
+        small = compact_frame(st['df'])
+        before, after = small.attrs['footprint_mb']
+        same = (calc_tiers(small, 90, True).equals(st['tiers'])
+                and calc_metrics(small, 90, True).equals(st['metrics']))
+        return {'mb_before': round(before, 1), 'mb_after': round(after, 1), 'same_signals': bool(same)}
+
+    def filter_():
+        index = PnlIndex(st['metrics'], make_grid(0.0, 10.0, 0.5), make_grid(1.20, 10.0, 0.01))
+        pnl, bets, _ = index.query('2', 4.0, np.inf, 1.70, 3.50)
+        best = grid_search(st['df'], [90], True, make_grid(0.0, 20.0, 2.0), make_grid(1.5, 4.0, 0.25), min_bets=20)
+        return {'away_bets': int(bets), 'away_pnl': round(float(pnl), 4),
+                'grid_best': round(float(best['PNL'].iloc[0]), 4) if len(best) else None}
+
+    def settle_():
+        df = pd.concat([st['df'], st['tiers'][['Pick', 'Odds_Play']]], axis=1)
+        df['Signal'] = st['tiers']['Signal']
+        picks = df[df['Signal'] != 'SKIP']
+        history, _ = settle(picks, st['df'], stake=10, dup='date')
+        return {'settled': len(history), 'profit': round(float(history['Profitto'].sum()), 4)}
+
+    return [('parse', parse), ('standardize', std), ('compute', compute), ('compact', compact), ('filter', filter_), ('settle', settle_)]
+
+
+def run(n, seed=0, memory=True):
+    # Tempo, velocità (righe/s), picco di memoria e risultato di controllo per ogni fase
+    data = synth_csv(n, seed)
+    out = {}
+    for name, fn in _stages(data):
+        t = time.perf_counter()
+        check = fn()
+        out[name] = {'seconds': time.perf_counter() - t, 'check': check}
+        out[name]['rows_per_s'] = n / out[name]['seconds'] if out[name]['seconds'] > 0 else None
+    if memory:
+        # Secondo passaggio con tracemalloc (rallenta, quindi separato dai tempi)
+        for name, fn in _stages(data):
+            tracemalloc.start()
+            fn()
+            out[name]['peak_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            tracemalloc.stop()
+    return out
+
+
+def compare(results, baseline, tolerance):
+    # Elenco dei problemi rispetto al baseline (vuoto = tutto ok)
+    problems = []
+    for size, stages in results.items():
+        base = baseline.get(size)
+        if base is None: continue
+        for name, r in stages.items():
+            b = base.get(name)
+            if b is None: continue
+            if r['check'] != b['check']:
+                problems.append(f"{size} {name}: risultato cambiato {b['check']} -> {r['check']}")
+            if r['seconds'] > b['seconds'] * (1 + tolerance) and r['seconds'] - b['seconds'] > 0.05:
+                problems.append(f"{size} {name}: {b['seconds']:.3f}s -> {r['seconds']:.3f}s")
+    return problems
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Benchmark delle fasi Cecchino su dati sintetici.")
+    p.add_argument('--sizes', default='1000,10000,100000', help="Righe per file, separate da virgola")
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--no-memory', action='store_true', help="Salta la misura del picco di memoria")
+    p.add_argument('--baseline', default=str(BASELINE))
+    p.add_argument('--save', action='store_true', help="Salva i risultati come nuovo baseline")
+    p.add_argument('--tolerance', type=float, default=0.5, help="Rallentamento ammesso (0.5 = +50%%)")
+    p.add_argument('--write', metavar='CSV', help="Scrive solo il file sintetico (prima dimensione) ed esce")
+    args = p.parse_args(argv)
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+
+    if args.write:
+        Path(args.write).write_bytes(synth_csv(sizes[0], args.seed))
+        return 0
+
+    # Il baseline dipende dalla macchina e non è nel repository: senza, il confronto non
+    # avrebbe senso, quindi si esce subito invece di misurare tutto per niente
+    path = Path(args.baseline)
+    if not args.save and not path.exists():
+        print(f"Nessun baseline in {path}: esegui prima 'python bench.py --save' "
+              f"(stesse --sizes) su questa macchina, poi rilancia per il confronto.", file=sys.stderr)
+        return 2
+
+    results = {}
+    for n in sizes:
+        results[str(n)] = r = run(n, args.seed, not args.no_memory)
+        for name, s in r.items():
+            mem = f"{s['peak_mb']:8.1f} MB" if 'peak_mb' in s else ''
+            print(f"{n:>9} {name:<12} {s['seconds']:8.3f}s {s['rows_per_s'] or 0:>12,.0f} righe/s {mem}")
+
+    if args.save:
+        path.write_text(json.dumps(results, indent=1))
+        print(f"Baseline salvato in {path}")
+        return 0
+    problems = compare(results, json.loads(path.read_text()), args.tolerance)
+    for msg in problems:
+        print("REGRESSIONE:", msg)
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
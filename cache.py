@@ -0,0 +1,80 @@
+import hashlib
+import os
+from pathlib import Path
+import pandas as pd
+
+# --- CACHE SU DISCO ---
+# Frame già standardizzati salvati in Parquet, con chiave = hash del contenuto del CSV.
+# Lo stesso file ricaricato (anche dopo un riavvio) si legge in millisecondi.
+
+CACHE_DIR = Path(os.environ.get('CECCHINO_CACHE_DIR', Path.home() / '.cache' / 'cecchino'))
+CACHE_MAX_MB = float(os.environ.get('CECCHINO_CACHE_MB', 500))
+
+try:
+    import pyarrow  # noqa: F401  (motore Parquet)
+    HAS_PARQUET = True
+except ImportError:
+    HAS_PARQUET = False
+
+
+def content_key(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def prune(version):
+    # Elimina i file di altre versioni della standardizzazione, poi i meno usati
+    # finché la cache non rientra nel limite di spazio
+    files = []
+    for p in CACHE_DIR.glob('*.parquet'):
+        if not p.stem.endswith(f'-v{version}'):
+            p.unlink(missing_ok=True)
+            continue
+        stat = p.stat()
+        files.append((stat.st_mtime, stat.st_size, p))
+
+    total = sum(size for _, size, _ in files)
+    limit = CACHE_MAX_MB * 1024 * 1024
+    for _, size, p in sorted(files):
+        if total <= limit: break
+        p.unlink(missing_ok=True)
+        total -= size
+
+
+def cached_frame(data, build, version):
+    # data: contenuto del file (bytes); build(data) -> DataFrame standardizzato
+    if not HAS_PARQUET:
+        return build(data)
+
+    path = CACHE_DIR / f"{content_key(data)}-v{version}.parquet"
+    if path.exists():
+        try:
+            df = pd.read_parquet(path)
+        except Exception:
+            # File illeggibile: si rigenera (se la cartella lo permette)
+            df = None
+            try:
+                path.unlink(missing_ok=True)
+            except OSError:
+                pass
+        if df is not None:
+            try:
+                os.utime(path)  # segna come usato di recente
+            except OSError:
+                pass
+            return df
+
+    df = build(data)
+    tmp = path.with_name(f"{path.stem}.{os.getpid()}.tmp")
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        df.to_parquet(tmp)
+        os.replace(tmp, path)
+        prune(version)
+    except Exception:
+        # Cartella non scrivibile o colonne non serializzabili (es. tipi misti):
+        # si lavora senza cache, il caricamento non deve mai fallire
+        try:
+            tmp.unlink(missing_ok=True)
+        except OSError:
+            pass
+    return df
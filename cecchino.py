@@ -0,0 +1,103 @@
+import argparse
+import sys
+from pathlib import Path
+
+# --- RUNNER DA RIGA DI COMANDO ---
+# Genera le giocate del giorno senza avviare Streamlit (es. da cron):
+#   python cecchino.py partite.csv --mode golden --format json --out giocate/
+#   python cecchino.py partite.csv --strategy "Standard AWAY (2)"
+#   python cecchino.py risultati_ieri.csv partite_oggi.csv --own-elo --standings fill
+# pandas/numpy vengono importati solo dopo aver letto gli argomenti; fa eccezione engine,
+# da cui arrivano le scelte di --margin (un solo elenco dei metodi).
+
+
+def parse_args(argv=None):
+    from engine import MARGINS
+    p = argparse.ArgumentParser(description="Segnali Cecchino (V64 livelli / V70 golden) da CSV prematch.")
+    p.add_argument('files', nargs='+', help="CSV prematch (separatore ';', virgola decimale, latin1)")
+    p.add_argument('--mode', choices=['tiers', 'golden'], default='tiers', help="tiers = V64, golden = V70")
+    p.add_argument('--strategy', metavar='NOME', default=None,
+                   help="Usa una strategia salvata (strategies.json o predefinita) al posto di --mode")
+    p.add_argument('--hfa', type=float, default=90, help="HFA base (default 90)")
+    p.add_argument('--no-dyn', action='store_true', help="Disattiva l'HFA dinamico da classifica")
+    p.add_argument('--margin', choices=list(MARGINS), default='proportional',
+                   help="Metodo di rimozione del margine dalle quote 1X2 (default proportional)")
+    p.add_argument('--format', choices=['csv', 'json', 'both'], default='csv')
+    p.add_argument('--out', default=None, help="Cartella di output (default: accanto al file di input)")
+    p.add_argument('--incremental', action='store_true',
+                   help="Ricalcola solo le partite nuove o cambiate e scrive le variazioni dall'ultima esecuzione")
+    p.add_argument('--own-elo', action='store_true',
+                   help="Elo interno per lega ricostruito dai risultati (serve datameci; stato su disco aggiornato con i risultati di ogni file)")
+    p.add_argument('--elo-k', type=float, default=20, help="Fattore K dell'Elo interno (default 20)")
+    p.add_argument('--no-mov', action='store_true', help="Elo interno senza moltiplicatore per scarto gol")
+    p.add_argument('--standings', choices=['file', 'fill', 'own'], default='file',
+                   help="Classifica per l'HFA dinamico: file = place1a/place2d del CSV, fill = interna dove mancano, "
+                        "own = sempre interna (stato su disco aggiornato con i risultati di ogni file)")
+    p.add_argument('--all-columns', action='store_true', help="Scrive tutte le colonne, non solo quelle operative")
+    return p.parse_args(argv)
+
+
+def write_picks(picks, dest, fmt):
+    # CSV nello stesso formato dei file di input (;  e virgola decimale), JSON a record
+    written = []
+    if fmt in ('csv', 'both'):
+        path = dest.with_suffix('.csv')
+        picks.to_csv(path, sep=';', decimal=',', index=False, encoding='utf-8-sig')
+        written.append(path)
+    if fmt in ('json', 'both'):
+        path = dest.with_suffix('.json')
+        picks.to_json(path, orient='records', force_ascii=False, indent=1, date_format='iso')
+        written.append(path)
+    return written
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    from signals import MODES, STRATEGY_COLS, load_strategy, strategy_picks
+    from incremental import SignalState
+    from elo import EloBook
+    from standings import standings_book
+    from strategies import find_strategy, slug
+
+    tag = args.mode
+    if args.strategy:
+        try:
+            strategy = find_strategy(args.strategy)
+        except ValueError as e:
+            print(f"errore: {e}", file=sys.stderr)
+            return 1
+        tag = slug(strategy['name'])
+        load = lambda src, hfa, dyn, state, **books: load_strategy(src, strategy, hfa, dyn, state, **books)
+        select, cols = (lambda df: strategy_picks(df, strategy)), STRATEGY_COLS
+    else:
+        load, select, cols = MODES[args.mode]
+    state = SignalState(tag) if args.incremental else None
+    book = EloBook(args.elo_k, not args.no_mov) if args.own_elo else None
+    table = standings_book(args.standings)
+    failed = 0
+    for name in args.files:
+        src = Path(name)
+        try:
+            df = load(src, args.hfa, not args.no_dyn, state, elo=book, standings=table, margin=args.margin)
+            picks = select(df) if not df.empty else df
+            if not args.all_columns:
+                picks = picks[[c for c in cols if c in picks.columns]]
+            out_dir = Path(args.out) if args.out else src.parent
+            out_dir.mkdir(parents=True, exist_ok=True)
+            written = write_picks(picks, out_dir / f"{src.stem}_{tag}", args.format)
+            print(f"{src}: {len(picks)} giocate su {len(df)} partite -> {', '.join(map(str, written))}")
+            if state is not None:
+                written = write_picks(state.diff, out_dir / f"{src.stem}_{tag}_diff", args.format)
+                print(f"  ricalcolate {state.recomputed}/{len(df)}, variazioni {len(state.diff)} -> {', '.join(map(str, written))}")
+            if book is not None:
+                print(f"  Elo interno: {book.applied} risultati nuovi applicati, {len(book.ratings)} squadre")
+            if table is not None:
+                print(f"  Classifica interna: {table.applied} risultati nuovi applicati, {len(table.tables)} leghe")
+        except Exception as e:
+            failed += 1
+            print(f"{src}: errore: {e}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
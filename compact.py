@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+from schema import GOALS, ODDS, PLACES
+
+# --- MEMORIA COMPATTA ---
+# Testi ripetuti (squadre, leghe, risultati, segnali) come categorie, quote in float32,
+# gol e classifica in interi piccoli. Il motore riporta le quote a float64 col decimale
+# originale (engine.f64), quindi segnali e PNL non cambiano. Elo e gli altri float restano
+# float64: non hanno 2-3 decimali fissi e 6 cifre significative li arrotonderebbero.
+
+CATEGORY_COLS = ('league', 'txtechipa1', 'txtechipa2', 'Real_Res', 'MatchID', 'datameci', 'Signal', 'Pick')
+FLOAT32_COLS = ODDS
+SMALL_INT_COLS = GOALS + PLACES
+# Altre colonne di testo: categoria solo se i valori distinti sono al massimo questa quota
+MAX_CAT_RATIO = 0.5
+
+
+def footprint_mb(df):
+    # Memoria reale del frame (stringhe incluse)
+    return df.memory_usage(deep=True).sum() / 2 ** 20
+
+
+def _small_int(s):
+    # Interi nullable a 16 bit se i valori lo permettono, altrimenti float32
+    v = s.to_numpy(dtype=float, na_value=np.nan)
+    ok = v[~np.isnan(v)]
+    if (ok == np.round(ok)).all() and (np.abs(ok) < 2 ** 15).all():
+        return s.astype('Int16')
+    return s.astype(np.float32)
+
+
+def _compact_col(name, s):
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return s
+    if pd.api.types.is_bool_dtype(s):
+        return s
+    if pd.api.types.is_numeric_dtype(s):
+        if name in SMALL_INT_COLS:
+            return _small_int(s)
+        if name in FLOAT32_COLS and s.dtype == np.float64:
+            return s.astype(np.float32)
+        return s
+    if s.dtype == object or pd.api.types.is_string_dtype(s):
+        if name in CATEGORY_COLS or s.nunique(dropna=True) <= MAX_CAT_RATIO * len(s):
+            return s.astype('category')
+    return s
+
+
+def compact_frame(df):
+    # Copia compatta di df; attrs['footprint_mb'] = (MB prima, MB dopo)
+    before = footprint_mb(df)
+    out = pd.DataFrame({c: _compact_col(c, df[c]) for c in df.columns}, index=df.index)
+    out.attrs['footprint_mb'] = (before, footprint_mb(out))
+    return out
+
+
+def memory_caption(df):
+    # Testo per le app (None se il frame non è passato da compact_frame)
+    mb = df.attrs.get('footprint_mb')
+    if not mb:
+        return None
+    before, after = mb
+    return f"🗜️ Memoria compatta: {before:.1f} MB → {after:.1f} MB ({before / max(after, 1e-9):.1f}x meno)"
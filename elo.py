@@ -0,0 +1,180 @@
+import os
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from aliases import norm_date, norm_team
+from cache import CACHE_DIR
+from engine import calc_metrics, f64
+from schema import REQUIRED, validate
+from stream import aggregate
+
+# --- ELO INTERNO ---
+# Rating ricostruiti dai risultati (scor1/scor2 in ordine di datameci) invece delle
+# colonne elohomeo/eloawayo del fornitore. Lo stato (rating attuali + rating pre-partita
+# di ogni partita già giocata) resta su disco: un nuovo file risultati applica solo le
+# partite mai viste, un aggiornamento O(1) ciascuna, senza rigiocare lo storico.
+# Le partite già viste riprendono i rating pre-partita salvati: il backtest non usa
+# mai rating calcolati con il risultato della partita stessa.
+# I rating sono per lega (omonimi in campionati diversi non si mescolano) e datameci è
+# obbligatoria: senza data la stessa sfida di un'altra stagione sembrerebbe già vista.
+
+ELO_DIR = CACHE_DIR / 'elo'
+# Da incrementare se cambia la formula: invalida gli stati salvati
+ELO_VERSION = 2
+
+START = 1500.0
+K_FACTOR = 20.0
+# Vantaggio casa usato solo per l'aggiornamento dei rating (l'HFA dei segnali resta quello dell'app)
+HOME_ADV = 65.0
+
+
+def mov_factor(margin):
+    # Moltiplicatore per scarto gol (World Football Elo): 1 gol 1x, 2 gol 1.5x, poi (11+N)/8
+    m = np.abs(np.asarray(margin, dtype=float))
+    return np.where(m <= 1, 1.0, np.where(m == 2, 1.5, (11 + m) / 8))
+
+
+def team_names(df):
+    # Nomi normalizzati (aliases.norm_team) calcolati una volta per squadra distinta
+    t1 = df['txtechipa1'].astype(str)
+    t2 = df['txtechipa2'].astype(str)
+    names = pd.unique(pd.concat([t1, t2]))
+    norm = dict(zip(names, map(norm_team, names)))
+    return t1.map(norm), t2.map(norm)
+
+
+def rating_ids(df):
+    # Squadra come chiave dei rating: lega|nome normalizzato (solo nome se manca league)
+    t1, t2 = team_names(df)
+    if 'league' not in df.columns:
+        return t1, t2
+    league = df['league'].astype(str) + '|'
+    return league + t1, league + t2
+
+
+def match_keys(df, teams=None):
+    # Casa|Ospite|data con nomi e date normalizzati (datameci obbligatoria, vedi REQUIRED['elo'])
+    t1, t2 = teams or team_names(df)
+    return t1 + '|' + t2 + '|' + norm_date(df['datameci'].astype(str))
+
+
+class EloBook:
+    # Rating interni per una combinazione di parametri (uno stato per K / scarto / vantaggio casa)
+
+    def __init__(self, k=K_FACTOR, mov=True, home_adv=HOME_ADV, path=None):
+        self.k, self.mov, self.home_adv = float(k), bool(mov), float(home_adv)
+        name = f"k{self.k:g}_h{self.home_adv:g}_{'mov' if self.mov else 'flat'}"
+        self.path = Path(path) if path else ELO_DIR / f"{name}.pkl"
+        self.ratings = {}
+        self.games = pd.DataFrame(columns=['Pre_H', 'Pre_A'], dtype=float)
+        self.applied = 0
+        self.load()
+
+    def load(self):
+        try:
+            state = pd.read_pickle(self.path)
+        except Exception:
+            return
+        if state.get('version') == ELO_VERSION:
+            self.ratings, self.games = state['ratings'], state['games']
+
+    def save(self):
+        # Cartella non scrivibile: lo stato resta solo in memoria, il calcolo prosegue
+        tmp = self.path.with_name(f"{self.path.stem}.{os.getpid()}.tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            pd.to_pickle({'version': ELO_VERSION, 'ratings': self.ratings, 'games': self.games}, tmp)
+            os.replace(tmp, self.path)
+        except OSError:
+            try:
+                tmp.unlink(missing_ok=True)
+            except OSError:
+                pass
+
+    def update(self, df):
+        # Applica i risultati nuovi di df (in ordine di data) e ritorna (elo_h, elo_a)
+        # pre-partita per ogni riga; partite senza risultato -> rating attuali
+        validate(df, REQUIRED['elo'])
+        t1, t2 = rating_ids(df)
+        keys = match_keys(df, (t1, t2)).to_numpy()
+        t1, t2 = t1.to_numpy(), t2.to_numpy()
+        g1 = f64(df['scor1']) if 'scor1' in df.columns else np.full(len(df), np.nan)
+        g2 = f64(df['scor2']) if 'scor2' in df.columns else np.full(len(df), np.nan)
+        played = ~np.isnan(g1) & ~np.isnan(g2)
+        new = played & (self.games.index.get_indexer(keys) < 0)
+        # Doppioni: vale la prima riga giocata (una riga senza risultato prima non la blocca)
+        new &= ~pd.Series(np.where(new, keys, None)).duplicated().to_numpy()
+
+        rows = np.flatnonzero(new)
+        if len(rows):
+            when = pd.to_datetime(df['datameci'].iloc[rows].astype(str), dayfirst=True, errors='coerce', format='mixed')
+            rows = rows[np.argsort(when.to_numpy(), kind='stable')]
+            margin = g1[rows] - g2[rows]
+            score = np.sign(margin) * 0.5 + 0.5
+            gain = self.k * (mov_factor(margin) if self.mov else np.ones(len(rows)))
+            pre_h, pre_a = np.empty(len(rows)), np.empty(len(rows))
+            r = self.ratings
+            # Aggiornamento sequenziale: ogni partita dipende dai rating lasciati dalla precedente
+            for i, (h, a) in enumerate(zip(t1[rows], t2[rows])):
+                rh, ra = r.get(h, START), r.get(a, START)
+                pre_h[i], pre_a[i] = rh, ra
+                delta = gain[i] * (score[i] - 1 / (1 + 10 ** ((ra - rh - self.home_adv) / 400)))
+                r[h], r[a] = rh + delta, ra - delta
+            added = pd.DataFrame({'Pre_H': pre_h, 'Pre_A': pre_a}, index=keys[rows])
+            self.games = pd.concat([self.games, added]) if len(self.games) else added
+            self.save()
+        self.applied = len(rows)
+
+        pos = self.games.index.get_indexer(keys)
+        seen = pos >= 0
+        cur_h = np.array([self.ratings.get(t, START) for t in t1], dtype=float)
+        cur_a = np.array([self.ratings.get(t, START) for t in t2], dtype=float)
+        elo_h = np.where(seen, self.games['Pre_H'].to_numpy()[pos], cur_h)
+        elo_a = np.where(seen, self.games['Pre_A'].to_numpy()[pos], cur_a)
+        return elo_h, elo_a
+
+
+def with_own_elo(df, book):
+    # Copia di df con elohomeo/eloawayo dal motore interno (originali in *_prov)
+    elo_h, elo_a = book.update(df)
+    out = df.copy()
+    for col, own in (('elohomeo', elo_h), ('eloawayo', elo_a)):
+        if col in out.columns:
+            out[f'{col}_prov'] = out[col]
+        out[col] = own
+    return out
+
+
+def _scores(metrics, res):
+    # Brier e log-loss 1X2 delle probabilità modello (X = 1 - P1 - P2, cioè fx senza margine)
+    p = np.column_stack([metrics['Prob_1'], 1 - metrics['Prob_1'] - metrics['Prob_2'], metrics['Prob_2']])
+    y = np.column_stack([res == '1', res == 'X', res == '2']).astype(float)
+    hit = np.clip((p * y).sum(axis=1), 1e-12, 1)
+    return ((p - y) ** 2).sum(axis=1).mean(), -np.log(hit).mean()
+
+
+def compare_elo(df, own, base_hfa, use_dyn, warmup=0.0, margin='proportional'):
+    # Stesso backtest con Elo del fornitore (df) e interno (own = with_own_elo(df, ...)).
+    # warmup: quota di partite iniziali (per data) esclusa, quando i rating interni partono tutti da 1500
+    played = df[df['Real_Res'] != '-']
+    order = np.arange(len(played))
+    if 'datameci' in played.columns:
+        when = pd.to_datetime(played['datameci'].astype(str), dayfirst=True, errors='coerce', format='mixed')
+        order = np.argsort(np.argsort(when.to_numpy(), kind='stable'), kind='stable')
+    keep = order >= int(len(played) * warmup)
+
+    metrics = {source: calc_metrics(frame, base_hfa, use_dyn, margin) for source, frame in (('Fornitore', df), ('Interno', own))}
+    # Solo partite con probabilità valide per entrambe le fonti (Elo del fornitore mancante -> esclusa)
+    for m in metrics.values():
+        keep &= np.isfinite(m['Prob_1'].to_numpy()) & np.isfinite(m['Prob_2'].to_numpy())
+    res = played['Real_Res'].astype(str).to_numpy()[keep]
+
+    rows = {}
+    for source, m in metrics.items():
+        m = m[keep].reset_index(drop=True)
+        brier, logloss = _scores(m, res)
+        strat = aggregate(m)['Strategies']
+        rows[source] = {'Partite': len(m), 'Brier 1X2': brier, 'Log-loss 1X2': logloss,
+                        **{f'{k} Bets': v['Bets'] for k, v in strat.iterrows()},
+                        **{f'{k} PNL': v['PNL'] for k, v in strat.iterrows()}}
+    return pd.DataFrame.from_dict(rows, orient='index')
@@ -0,0 +1,289 @@
+import numpy as np
+import pandas as pd
+
+# --- MOTORE VETTORIALE ---
+# Stessa matematica di get_probs / no_margin / calc_row, ma su colonne intere
+# invece che riga per riga con df.apply.
+
+# Livelli segnale Cecchino (V64/V65): (segnale, pick, EV min %, quota min, quota max)
+# L'ordine è la priorità: vince il primo livello soddisfatto.
+TIERS = [
+    ('💎 AWAY', '2', 4.0, 1.70, 3.50),
+    ('✅ VALUE 2', '2', 1.5, 1.50, 4.00),
+    ('💎 HOME', '1', 4.0, 1.50, 2.50),
+    ('✅ VALUE 1', '1', 1.5, 1.40, 3.00),
+]
+
+# Filtro "Golden" V70 (solo ospite)
+GOLDEN_EV = (11.0, 19.5)
+GOLDEN_ODDS = (2.06, 2.80)
+
+
+def restore_decimals(a):
+    # float32 -> float64 arrotondando a 6 cifre significative: 2.0599999 torna 2.06
+    # (solo per le quote della memoria compatta, vedi compact.FLOAT32_COLS)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mag = np.floor(np.log10(np.abs(a)))
+    scale = 10.0 ** np.where(np.isfinite(mag), 5 - mag, 0)
+    return np.round(a * scale) / scale
+
+
+def f64(s):
+    # Colonna numerica -> array float64 (interi nullable: NA -> NaN; float32 della
+    # memoria compatta -> stesso valore decimale del CSV delle quote)
+    if pd.api.types.is_extension_array_dtype(s):
+        return s.to_numpy(dtype=float, na_value=np.nan)
+    a = s.to_numpy(dtype=float)
+    return restore_decimals(a) if s.dtype == np.float32 else a
+
+
+def to_f(df, col, default):
+    # Versione colonna di to_f: virgola -> punto, testo non valido -> 0.0,
+    # celle vuote restano NaN, colonna mancante -> default
+    if col not in df.columns:
+        return np.full(len(df), float(default))
+    s = df[col]
+    if pd.api.types.is_numeric_dtype(s):
+        return f64(s)
+    num = pd.to_numeric(s.astype(str).str.replace(',', '.', regex=False), errors='coerce')
+    num = num.where(num.notna() | s.isna(), 0.0)
+    return num.to_numpy(dtype=float)
+
+
+def get_probs(elo_h, elo_a, hfa):
+    diff = elo_a - (elo_h + hfa)
+    exp = diff / 400
+    with np.errstate(over='ignore'):
+        pw = np.power(10.0, exp)
+    p_h = 1 / (1 + pw)
+    p_a = 1 - p_h
+    # Come l'originale: overflow di 10**exp -> (0, 0)
+    over = np.isinf(pw) & np.isfinite(exp)
+    return np.where(over, 0.0, p_h), np.where(over, 0.0, p_a)
+
+
+def no_margin(o1, ox, o2):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        i1 = 1 / o1; ix = 1 / ox; i2 = 1 / o2
+        s = i1 + ix + i2
+        f1, fx, f2 = i1 / s, ix / s, i2 / s
+    bad = (o1 <= 0) | (ox <= 0) | (o2 <= 0)
+    return np.where(bad, 0.0, f1), np.where(bad, 0.0, fx), np.where(bad, 0.0, f2)
+
+
+# --- RIMOZIONE MARGINE ---
+# no_margin divide il margine in proporzione alle probabilità implicite. Gli altri metodi
+# cercano per ogni partita il parametro che porta la somma a 1 (metodo di Newton), ma
+# risolvono tutte le partite insieme: ogni iterazione è un'operazione su array.
+#   shin       -> quota di scommettitori informati z (favorite penalizzate meno)
+#   power      -> p = (1/quota) ** k
+#   odds_ratio -> (1/quota) / (1 - 1/quota) = c * p / (1 - p), stesso c per i tre esiti
+MARGINS = {
+    'proportional': "Proporzionale",
+    'shin': "Shin",
+    'power': "Potenza",
+    'odds_ratio': "Odds ratio",
+}
+SOLVER_TOL = 1e-12
+SOLVER_ITERS = 50
+
+
+def _newton(x, step):
+    # step(x, idx) -> correzione di Newton per le partite idx. Ogni giro lavora solo sulle
+    # partite non ancora convergenti; quelle che non convergono restano ferme (poi no_margin)
+    idx = np.arange(len(x))
+    for _ in range(SOLVER_ITERS):
+        d = np.nan_to_num(step(x[idx], idx), nan=0.0, posinf=0.0, neginf=0.0)
+        x[idx] -= d
+        idx = idx[np.abs(d) > SOLVER_TOL]
+        if not len(idx):
+            break
+    return x
+
+
+def _power(pi):
+    lp = np.log(pi)
+    def step(k, idx):
+        p = np.exp(k * lp[:, idx])
+        return (p.sum(axis=0) - 1) / (p * lp[:, idx]).sum(axis=0)
+    return np.exp(_newton(np.ones(pi.shape[1]), step) * lp)
+
+
+def _odds_ratio(pi):
+    def step(c, idx):
+        q = pi[:, idx]
+        den = c + q - c * q
+        return ((q / den).sum(axis=0) - 1) / -(q * (1 - q) / den ** 2).sum(axis=0)
+    c = _newton(np.ones(pi.shape[1]), step)
+    return pi / (c + pi - c * pi)
+
+
+def _shin(pi):
+    # p_i(z) = (sqrt(z^2 + 4(1-z) pi_i^2/B) - z) / (2(1-z)), z = quota di scommettitori informati
+    share = pi ** 2 / pi.sum(axis=0)
+    def probs(z, s):
+        r = np.sqrt(z ** 2 + 4 * (1 - z) * s)
+        return r, (r - z) / (2 * (1 - z))
+    def step(z, idx):
+        s = share[:, idx]
+        r, p = probs(z, s)
+        dp = ((z - 2 * s) / r - 1) * (1 - z) + (r - z)
+        return (p.sum(axis=0) - 1) / (dp / (2 * (1 - z) ** 2)).sum(axis=0)
+    return probs(_newton(np.zeros(pi.shape[1]), step), share)[1]
+
+
+SOLVERS = {'shin': _shin, 'power': _power, 'odds_ratio': _odds_ratio}
+
+
+def demargin(o1, ox, o2, method='proportional'):
+    # Probabilità senza margine (f1, fx, f2) col metodo scelto. Quote non valide (<= 1,
+    # mancanti) o partite che non convergono -> risultato di no_margin
+    f = no_margin(o1, ox, o2)
+    if method == 'proportional':
+        return f
+    if method not in SOLVERS:
+        raise ValueError(f"Metodo margine sconosciuto: {method}. Disponibili: {', '.join(MARGINS)}")
+    shape = np.broadcast(o1, ox, o2).shape
+    o = np.stack([np.broadcast_to(np.asarray(x, dtype=float), shape).ravel() for x in (o1, ox, o2)])
+    p = np.stack([np.broadcast_to(x, shape).ravel() for x in f])
+    ok = (o > 1).all(axis=0) & np.isfinite(o).all(axis=0)
+    if ok.any():
+        with np.errstate(all='ignore'):
+            q = SOLVERS[method](1 / o[:, ok])
+            good = np.isfinite(q).all(axis=0) & (np.abs(q.sum(axis=0) - 1) < 1e-9) & (q >= 0).all(axis=0)
+        rows = np.flatnonzero(ok)[good]
+        p[:, rows] = q[:, good] / q[:, good].sum(axis=0)  # residuo numerico -> somma esattamente 1
+    return tuple(p[i].reshape(shape) for i in range(3))
+
+
+def dyn_hfa(df, base_hfa, dyn):
+    # HFA Dinamico: base + (pos. ospite - pos. casa) * 3, limitato a 0-200.
+    # Classifica in place1a/place2d (varianti già unite da schema.apply_schema); 0 è una posizione valida.
+    # base_hfa scalare -> vettore (partite,); vettore di H valori -> matrice (partite, H)
+    base = np.asarray(base_hfa, dtype=float)
+    hfa = np.tile(base, (len(df), 1)) if base.ndim else np.full(len(df), float(base))
+    if dyn and 'place1a' in df.columns and 'place2d' in df.columns:
+        r1 = f64(df['place1a'])
+        r2 = f64(df['place2d'])
+        ok = ~np.isnan(r1) & ~np.isnan(r2)
+        d = (r2[ok] - r1[ok]) * 3
+        hfa[ok] = np.clip(base + (d[:, None] if base.ndim else d), 0, 200)
+    return hfa
+
+
+def calc_ev(o1, ox, o2, elo_h, elo_a, hfa, margin='proportional'):
+    f1, fx, f2 = demargin(o1, ox, o2, margin)
+    ph, pa = get_probs(elo_h, elo_a, hfa)
+    rem = 1 - fx
+    fin1 = rem * ph
+    fin2 = rem * pa
+    ev1 = (o1 * fin1) - 1
+    ev2 = (o2 * fin2) - 1
+    return fin1, fin2, ev1, ev2
+
+
+def _inputs(df):
+    elo_h = to_f(df, 'elohomeo', 1500)
+    elo_a = to_f(df, 'eloawayo', 1500)
+    o1 = to_f(df, 'cotaa', 0)
+    ox = to_f(df, 'cotae', 0)
+    o2 = to_f(df, 'cotad', 0)
+    return o1, ox, o2, elo_h, elo_a
+
+
+def calc_tiers(df, base_hfa, dyn, margin='proportional'):
+    # Segnali V64/V65 per tutto il DataFrame
+    o1, ox, o2, elo_h, elo_a = _inputs(df)
+    hfa = dyn_hfa(df, base_hfa, dyn)
+    _, _, ev1, ev2 = calc_ev(o1, ox, o2, elo_h, elo_a, hfa, margin)
+
+    conds, signals, picks, odds = [], [], [], []
+    for sig, pick, ev_min, lo, hi in TIERS:
+        ev, o = (ev2, o2) if pick == '2' else (ev1, o1)
+        conds.append(((ev * 100) > ev_min) & (lo <= o) & (o <= hi))
+        signals.append(sig); picks.append(pick); odds.append(o)
+
+    return pd.DataFrame({
+        'EV_1': np.round(ev1 * 100, 2),
+        'EV_2': np.round(ev2 * 100, 2),
+        'HFA': np.trunc(hfa).astype(int),
+        'Signal': np.select(conds, signals, 'SKIP'),
+        'Pick': np.select(conds, picks, None),
+        'Odds_Play': np.select(conds, odds, 0.0),
+    }, index=df.index)
+
+
+def calc_golden(df, base_hfa, dyn, margin='proportional'):
+    # Filtro V70: solo ospite, range quote e range EV fissi
+    o1, ox, o2, elo_h, elo_a = _inputs(df)
+    hfa = dyn_hfa(df, base_hfa, dyn)
+    _, _, _, ev2 = calc_ev(o1, ox, o2, elo_h, elo_a, hfa, margin)
+    ev2_perc = ev2 * 100
+
+    gold = ((GOLDEN_EV[0] <= ev2_perc) & (ev2_perc <= GOLDEN_EV[1]) &
+            (GOLDEN_ODDS[0] <= o2) & (o2 <= GOLDEN_ODDS[1]))
+    return pd.DataFrame({
+        'Signal': np.where(gold, '💎 GOLDEN PICK', 'SKIP'),
+        'EV': np.round(ev2_perc, 2),
+        'Pick': np.where(gold, '2 (Ospite)', '-'),
+        'HFA': np.trunc(hfa).astype(int),
+    }, index=df.index)
+
+
+def _backtest_inputs(df):
+    o1 = f64(df['cotaa'])
+    ox = f64(df['cotae'])
+    o2 = f64(df['cotad'])
+    return o1, ox, o2, f64(df['elohomeo']), f64(df['eloawayo'])
+
+
+def calc_metrics(df, base_hfa, use_dyn, margin='proportional'):
+    # Backtest V67-V69: EV, PNL (stake 1u) e probabilità modello per ogni partita con risultato
+    df = df[df['Real_Res'] != '-']
+    o1, ox, o2, elo_h, elo_a = _backtest_inputs(df)
+    hfa = dyn_hfa(df, base_hfa, use_dyn)
+    fin1, fin2, ev1, ev2 = calc_ev(o1, ox, o2, elo_h, elo_a, hfa, margin)
+
+    res = df['Real_Res'].to_numpy()
+    return pd.DataFrame({
+        'Odds_1': o1,
+        'Odds_2': o2,
+        'EV_1': ev1 * 100,
+        'EV_2': ev2 * 100,
+        'PNL_1': np.where(res == '1', o1 - 1, -1.0),
+        'PNL_2': np.where(res == '2', o2 - 1, -1.0),
+        'Prob_1': fin1,
+        'Prob_2': fin2,
+        'HFA_Used': hfa,
+        'League': df['league'].to_numpy() if 'league' in df.columns else 'Unknown',
+    })
+
+
+def match_labels(df, rows):
+    # 'Casa vs Ospite' solo per le righe richieste (posizioni di calc_metrics sullo stesso df)
+    df = df[df['Real_Res'] != '-'].iloc[np.asarray(rows)]
+    t1 = df['txtechipa1'].astype(str) if 'txtechipa1' in df.columns else pd.Series('None', index=df.index)
+    t2 = df['txtechipa2'].astype(str) if 'txtechipa2' in df.columns else pd.Series('None', index=df.index)
+    return pd.Series((t1 + ' vs ' + t2).to_numpy(), index=rows)
+
+
+def calc_sweep(df, hfa_values, use_dyn, margin='proportional'):
+    # Come calc_metrics ma per un vettore di HFA base in un solo passaggio:
+    # EV_1/EV_2/HFA_Used sono matrici (partite x HFA), quote e PNL non dipendono dall'HFA
+    df = df[df['Real_Res'] != '-']
+    hfa_values = np.asarray(hfa_values, dtype=float)
+    o1, ox, o2, elo_h, elo_a = _backtest_inputs(df)
+    hfa = dyn_hfa(df, hfa_values, use_dyn)
+    _, _, ev1, ev2 = calc_ev(o1[:, None], ox[:, None], o2[:, None], elo_h[:, None], elo_a[:, None], hfa, margin)
+
+    res = df['Real_Res'].to_numpy()
+    return {
+        'HFA': hfa_values,
+        'Odds_1': o1,
+        'Odds_2': o2,
+        'EV_1': ev1 * 100,
+        'EV_2': ev2 * 100,
+        'PNL_1': np.where(res == '1', o1 - 1, -1.0),
+        'PNL_2': np.where(res == '2', o2 - 1, -1.0),
+        'HFA_Used': hfa,
+    }
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+# --- HEATMAP QUOTE x EV ---
+# Superficie 2D di scommesse / PNL / ROI per fasce di quota e fasce di EV.
+# Ogni partita va nella sua cella con un indice calcolato (floor), poi un istogramma
+# pesato (np.bincount con pesi = PNL) somma tutto in un passaggio: la risoluzione
+# (es. 0.05 di quota x 0.5% di EV) non cambia il costo, conta solo il numero di partite.
+
+# Piccola tolleranza: 2.05 deve finire nella fascia [2.05, 2.10) anche se (2.05-1)/0.05 = 20.999...
+_EPS = 1e-9
+
+
+def n_bins(lo, hi, step):
+    return max(1, int(round((hi - lo) / step)))
+
+
+def bin_index(x, lo, hi, step):
+    # Fascia di ogni valore (-1 se fuori range o NaN)
+    n = n_bins(lo, hi, step)
+    with np.errstate(invalid='ignore'):
+        pos = np.floor((np.asarray(x, dtype=float) - lo) / step + _EPS)
+    ok = (pos >= 0) & (pos < n)
+    return np.where(ok, pos, -1).astype(np.int64)
+
+
+def surface(odds, ev, pnl, odds_range, odds_step, ev_range, ev_step):
+    # Matrici (fasce EV x fasce quota) di scommesse e PNL
+    no, ne = n_bins(*odds_range, odds_step), n_bins(*ev_range, ev_step)
+    io = bin_index(odds, *odds_range, odds_step)
+    ie = bin_index(ev, *ev_range, ev_step)
+    pnl = np.asarray(pnl, dtype=float)
+    ok = (io >= 0) & (ie >= 0) & ~np.isnan(pnl)
+    flat = ie[ok] * no + io[ok]
+    bets = np.bincount(flat, minlength=ne * no).reshape(ne, no)
+    total = np.bincount(flat, weights=pnl[ok], minlength=ne * no).reshape(ne, no)
+    return bets, total
+
+
+def surface_frame(metrics, side, odds_range, odds_step, ev_range, ev_step):
+    # Formato lungo per il grafico: una riga per cella con almeno una scommessa
+    bets, pnl = surface(metrics[f'Odds_{side}'].to_numpy(), metrics[f'EV_{side}'].to_numpy(),
+                        metrics[f'PNL_{side}'].to_numpy(), odds_range, odds_step, ev_range, ev_step)
+    ie, io = np.nonzero(bets)
+    odds_lo = np.round(odds_range[0] + io * odds_step, 6)
+    ev_lo = np.round(ev_range[0] + ie * ev_step, 6)
+    cells = pd.DataFrame({
+        'Quota': odds_lo, 'Quota_Max': np.round(odds_lo + odds_step, 6),
+        'EV': ev_lo, 'EV_Max': np.round(ev_lo + ev_step, 6),
+        'Bets': bets[ie, io], 'PNL': pnl[ie, io],
+    })
+    cells['ROI'] = cells['PNL'] / cells['Bets'] * 100
+    return cells
+
+
+def cell_rows(metrics, side, odds_lo, odds_step, ev_lo, ev_step):
+    # Posizioni (iloc) delle partite di una cella [odds_lo, +step) x [ev_lo, +step)
+    io = bin_index(metrics[f'Odds_{side}'].to_numpy(), odds_lo, odds_lo + odds_step, odds_step)
+    ie = bin_index(metrics[f'EV_{side}'].to_numpy(), ev_lo, ev_lo + ev_step, ev_step)
+    return np.flatnonzero((io == 0) & (ie == 0))
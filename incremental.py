@@ -0,0 +1,118 @@
+import hashlib
+import os
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from cache import CACHE_DIR
+from schema import ELO, ODDS, PLACES
+
+# --- ELABORAZIONE INCREMENTALE ---
+# Ogni partita ha un'impronta (hash) degli input che decidono il segnale: quote, Elo,
+# classifica e impostazioni HFA. Tra un export e l'altro si ricalcolano solo le
+# partite nuove o con impronta diversa; per le altre si riusa il segnale salvato.
+# Il confronto con lo stato precedente produce anche l'elenco delle variazioni.
+
+STATE_DIR = CACHE_DIR / 'incremental'
+# Da incrementare se cambia la logica dei segnali: invalida gli stati salvati
+STATE_VERSION = 2
+# Partite non più viste da tanti giorni escono dallo stato
+KEEP_DAYS = 14
+
+FP_COLS = ODDS + ELO + PLACES
+DIFF_COLS = ['datameci', 'league', 'txtechipa1', 'txtechipa2']
+
+
+def fixture_keys(df):
+    # Identità della partita: MatchID (+ data se presente). None se manca il MatchID
+    if 'MatchID' not in df.columns:
+        return None
+    keys = df['MatchID'].astype(str)
+    if 'datameci' in df.columns:
+        keys = keys + '|' + df['datameci'].astype(str)
+    return keys
+
+
+def fingerprints(df, settings):
+    # Hash per riga delle colonne di input, combinato con le impostazioni
+    cols = [c for c in FP_COLS if c in df.columns]
+    salt = f"{STATE_VERSION}|{settings}|{cols}"
+    salt = np.uint64(int(hashlib.sha256(salt.encode()).hexdigest()[:16], 16))
+    if not cols:
+        return np.full(len(df), salt, dtype=np.uint64)
+    return pd.util.hash_pandas_object(df[cols], index=False).to_numpy() ^ salt
+
+
+class SignalState:
+    # Segnali dell'ultima esecuzione (uno stato per nome, es. 'tiers' / 'golden')
+
+    def __init__(self, name, path=None):
+        self.path = Path(path) if path else STATE_DIR / f"{name}.pkl"
+        self.diff = pd.DataFrame()
+        self.recomputed = 0
+
+    def load(self):
+        try:
+            return pd.read_pickle(self.path)
+        except Exception:
+            return pd.DataFrame(columns=['FP', 'Seen'])
+
+    def save(self, state):
+        # Cartella non scrivibile: niente stato per la prossima volta, ma i segnali
+        # appena calcolati vengono restituiti lo stesso
+        tmp = self.path.with_name(f"{self.path.stem}.{os.getpid()}.tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            state.to_pickle(tmp)
+            os.replace(tmp, self.path)
+        except OSError:
+            try:
+                tmp.unlink(missing_ok=True)
+            except OSError:
+                pass
+
+    def update(self, df, calc, settings):
+        # calc(df) -> colonne segnale (con 'Signal'). Ritorna le colonne per tutto df,
+        # ricalcolando solo le righe nuove o cambiate; aggiorna self.diff e self.recomputed.
+        keys = fixture_keys(df)
+        if keys is None:
+            self.diff, self.recomputed = pd.DataFrame(), len(df)
+            return calc(df)
+
+        fp = fingerprints(df, settings)
+        prev = self.load()
+        unique = ~keys.duplicated(keep=False).to_numpy()
+        pos = prev.index.get_indexer(keys.to_numpy())
+        known = pos >= 0
+        hit = unique & known
+        hit[hit] = prev['FP'].to_numpy()[pos[hit]] == fp[hit]
+
+        parts = []
+        if hit.any():
+            cached = prev.iloc[pos[hit]].drop(columns=['FP', 'Seen'])
+            parts.append(cached.set_axis(df.index[hit]))
+        if not hit.all():
+            parts.append(calc(df[~hit]))
+        out = pd.concat(parts).loc[df.index] if len(parts) > 1 else parts[0]
+        self.recomputed = int((~hit).sum())
+
+        # Variazioni rispetto all'ultima esecuzione (solo partite presenti nel file)
+        old_sig = np.full(len(df), 'SKIP', dtype=object)
+        if known.any():
+            old_sig[known] = prev['Signal'].to_numpy()[pos[known]]
+        new_sig = out['Signal'].to_numpy()
+        was = old_sig != 'SKIP'
+        now = new_sig != 'SKIP'
+        change = np.select([now & ~was, was & ~now, was & now & (old_sig != new_sig)],
+                           ['🆕 Nuovo', '❌ Sparito', '🔁 Cambiato'], '')
+        sel = change != ''
+        self.diff = df.loc[sel, [c for c in DIFF_COLS if c in df.columns]].assign(
+            Prima=np.where(was, old_sig, '-')[sel], Ora=new_sig[sel], Variazione=change[sel])
+
+        # Nuovo stato: righe attuali + righe recenti degli altri file
+        cur = out[unique].set_axis(keys[unique].to_numpy())
+        cur.insert(0, 'FP', fp[unique])
+        cur.insert(1, 'Seen', pd.Timestamp.now())
+        old = prev[~prev.index.isin(cur.index)]
+        old = old[pd.to_datetime(old['Seen']) >= pd.Timestamp.now() - pd.Timedelta(days=KEEP_DAYS)]
+        self.save(pd.concat([old, cur]) if len(old) else cur)
+        return out
@@ -0,0 +1,66 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from engine import calc_sweep
+from optimizer import grid_search, hfa_curve
+from walkforward import match_dates
+
+# --- OTTIMIZZAZIONE PER CAMPIONATO ---
+# Ogni lega viene ottimizzata per conto suo (HFA, range EV, range quote, lato) sulla
+# prima parte delle sue partite e verificata sull'ultima parte (fuori campione).
+# Le leghe sono indipendenti: vengono distribuite su più processi.
+
+WORKERS = os.cpu_count() or 1
+
+COLS = ['League', 'Matches', 'HFA', 'Side', 'EV_Min', 'EV_Max', 'Odds_Min', 'Odds_Max',
+        'Train_Bets', 'Train_PNL', 'Train_ROI', 'Test_Bets', 'Test_PNL', 'Test_ROI']
+
+
+def split_train_test(df, test_frac):
+    # Ultime partite (per datameci se c'è, altrimenti ordine di file) -> test
+    if 'datameci' in df.columns:
+        df = df.iloc[np.argsort(match_dates(df).to_numpy(), kind='stable')]
+    cut = int(round(len(df) * (1 - test_frac)))
+    return df.iloc[:cut], df.iloc[cut:]
+
+
+def optimize_league(league, df, hfa_values, use_dyn, ev_grid, odds_grid, min_bets, sort_by, test_frac, margin='proportional'):
+    # Una riga di COLS (None se la lega non ha nessuna configurazione valida)
+    train, test = split_train_test(df[df['Real_Res'] != '-'], test_frac)
+    best = grid_search(train, hfa_values, use_dyn, ev_grid, odds_grid, min_bets=min_bets, sort_by=sort_by, top_n=1, margin=margin)
+    if best.empty:
+        return None
+    top = best.iloc[0]
+    row = {'League': league, 'Matches': len(train) + len(test), 'HFA': top['HFA'], 'Side': top['Side'],
+           'EV_Min': top['EV_Min'], 'EV_Max': top['EV_Max'], 'Odds_Min': top['Odds_Min'], 'Odds_Max': top['Odds_Max'],
+           'Train_Bets': top['Bets'], 'Train_PNL': top['PNL'], 'Train_ROI': top['ROI'],
+           'Test_Bets': 0, 'Test_PNL': 0.0, 'Test_ROI': 0.0}
+    if len(test):
+        sweep = calc_sweep(test, [top['HFA']], use_dyn, margin)
+        oos = hfa_curve(sweep, top['Side'], top['EV_Min'], top['EV_Max'], top['Odds_Min'], top['Odds_Max']).iloc[0]
+        row.update({'Test_Bets': int(oos['Bets']), 'Test_PNL': oos['PNL'], 'Test_ROI': oos['ROI']})
+    return row
+
+
+def _run(job):
+    return optimize_league(*job)
+
+
+def optimize_leagues(df, hfa_values, use_dyn, ev_grid, odds_grid, min_bets=10, sort_by='PNL',
+                     test_frac=0.3, min_matches=30, workers=None, margin='proportional'):
+    # df: output di load_data. Ritorna una riga per lega con la configurazione migliore
+    # (training) e il suo risultato fuori campione (test), ordinate per profitto di test.
+    jobs = [(league, g, hfa_values, use_dyn, ev_grid, odds_grid, min_bets, sort_by, test_frac, margin)
+            for league, g in df.groupby('league', sort=False, observed=True) if len(g) >= min_matches]
+    workers = min(workers or WORKERS, len(jobs))
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as ex:
+            rows = list(ex.map(_run, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+    else:
+        rows = [_run(j) for j in jobs]
+
+    rows = [r for r in rows if r is not None]
+    if not rows:
+        return pd.DataFrame(columns=COLS)
+    return pd.DataFrame(rows, columns=COLS).sort_values('Test_PNL', ascending=False).reset_index(drop=True)
@@ -0,0 +1,106 @@
+import io
+import os
+from pathlib import Path
+import pandas as pd
+from cache import cached_frame
+from perf import track
+from schema import NUMERIC, apply_schema, canonical, to_number, validate
+
+# --- LETTURA CSV VELOCE ---
+# Motore C di pandas con virgola decimale nativa e tipi dichiarati per le colonne note,
+# al posto di engine='python' + str.replace(',', '.') su ogni colonna.
+
+CSV_OPTS = dict(sep=';', encoding='latin1', on_bad_lines='skip', decimal=',')
+
+# Unica cartella da cui le app leggono file indicati per percorso (non caricati dal browser)
+DATA_DIR = Path(os.environ.get('CECCHINO_DATA_DIR', Path.home() / '.local' / 'share' / 'cecchino' / 'data'))
+
+
+def _rewind(file):
+    if hasattr(file, 'seek'): file.seek(0)
+
+
+def to_numeric_cols(df, cols):
+    # Conversione classica (virgola -> punto) solo per le colonne rimaste testo
+    for c in cols:
+        if c in df.columns:
+            df[c] = to_number(df[c])
+    return df
+
+
+def numeric_columns(file):
+    # Legge solo l'intestazione per sapere quali colonne sono numeriche
+    header = pd.read_csv(file, sep=';', encoding='latin1', nrows=0).columns
+    _rewind(file)
+    return [c for c in header if canonical(c) in NUMERIC]
+
+
+def read_matches(file):
+    num = numeric_columns(file)
+    try:
+        return pd.read_csv(file, dtype={c: 'float64' for c in num}, **CSV_OPTS)
+    except ValueError:
+        # Testo sporco in una colonna numerica: rilegge senza tipi e converte a mano
+        _rewind(file)
+        return to_numeric_cols(pd.read_csv(file, low_memory=False, **CSV_OPTS), num)
+
+
+# --- STANDARDIZZAZIONE ---
+# Da incrementare a ogni modifica di standardize(): invalida la cache su disco
+STD_VERSION = 2
+
+
+def standardize(df):
+    # Nomi colonna canonici (registro in schema.py), poi Real_Res e MatchID
+    df = apply_schema(df)
+
+    # Determina Risultato Reale (1, X, 2)
+    df['Real_Res'] = '-'
+    if 'scor1' in df.columns and 'scor2' in df.columns:
+        mask = df['scor1'].notna() & df['scor2'].notna()
+        df.loc[mask & (df['scor1'] > df['scor2']), 'Real_Res'] = '1'
+        df.loc[mask & (df['scor1'] == df['scor2']), 'Real_Res'] = 'X'
+        df.loc[mask & (df['scor1'] < df['scor2']), 'Real_Res'] = '2'
+
+    # ID univoco del match (es. inter-juventus) per incrociare file diversi
+    if 'txtechipa1' in df.columns and 'txtechipa2' in df.columns:
+        df['MatchID'] = df['txtechipa1'].str.lower().str.replace(' ', '') + "-" + df['txtechipa2'].str.lower().str.replace(' ', '')
+    return df
+
+
+def server_file(name):
+    # Percorso scritto dall'utente -> (file dentro DATA_DIR, (mtime_ns, dimensione)).
+    # Il timbro va nella chiave delle cache: un file aggiornato sul posto viene riletto
+    root = DATA_DIR.resolve()
+    path = (root / name).resolve()
+    if not path.is_relative_to(root):
+        raise ValueError(f"Percorso fuori dalla cartella dati {root}: {name}")
+    if not path.is_file():
+        raise ValueError(f"File non trovato in {root}: {name}")
+    stat = path.stat()
+    return path, (stat.st_mtime_ns, stat.st_size)
+
+
+def file_bytes(file):
+    # Contenuto grezzo da UploadedFile, file aperto o percorso
+    if hasattr(file, 'getvalue'): return file.getvalue()
+    if hasattr(file, 'read'): return file.read()
+    return Path(file).read_bytes()
+
+
+def _build(data):
+    with track('Lettura CSV') as s:
+        df = read_matches(io.BytesIO(data))
+        s['rows'] = len(df)
+    with track('Standardizzazione', len(df)):
+        return standardize(df)
+
+
+def load_standard(file, required=()):
+    # read_matches + standardize, passando dalla cache su disco.
+    # required: colonne canoniche indispensabili (schema.REQUIRED) -> SchemaError se mancano
+    data = file_bytes(file)
+    with track('Caricamento (cache su disco)') as s:
+        df = cached_frame(data, _build, STD_VERSION)
+        s['rows'] = len(df)
+    return validate(df, required)
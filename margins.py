@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+from engine import MARGINS, calc_metrics, calc_tiers, demargin, f64
+from stream import aggregate
+
+# --- CONFRONTO METODI DI MARGINE ---
+# Stesso storico con ogni metodo di engine.MARGINS: quanto cambia la probabilità del
+# pareggio (fx, da cui dipende tutto l'EV), quanti segnali V64 cambiano rispetto al
+# metodo proporzionale e che PNL fanno i segnali e le strategie standard.
+
+COMPARE_COLS = ['Metodo', 'P(X) media', 'Segnali V64', 'Cambiati', 'PNL V64', 'ROI V64',
+                'AWAY (2) Bets', 'AWAY (2) PNL', 'HOME (1) Bets', 'HOME (1) PNL']
+
+
+def compare_margins(df, base_hfa, use_dyn, methods=tuple(MARGINS)):
+    played = df[df['Real_Res'] != '-']
+    o1, ox, o2 = (f64(played[c]) for c in ('cotaa', 'cotae', 'cotad'))
+    base = None
+    rows = []
+    for m in methods:
+        tiers = calc_tiers(played, base_hfa, use_dyn, m)
+        metrics = calc_metrics(played, base_hfa, use_dyn, m)
+        sig = tiers['Signal'].to_numpy()
+        pick = tiers['Pick'].to_numpy()
+        if base is None:
+            base = sig
+        # PNL dei segnali V64 sulle partite giocate (stesse righe di calc_metrics)
+        pnl = np.select([pick == '1', pick == '2'], [metrics['PNL_1'], metrics['PNL_2']], 0.0)
+        bets = int((sig != 'SKIP').sum())
+        strat = aggregate(metrics)['Strategies']
+        rows.append({
+            'Metodo': MARGINS[m],
+            'P(X) media': np.nanmean(demargin(o1, ox, o2, m)[1]),
+            'Segnali V64': bets,
+            'Cambiati': int((sig != base).sum()),
+            'PNL V64': pnl.sum(),
+            'ROI V64': pnl.sum() / max(bets, 1) * 100,
+            'AWAY (2) Bets': int(strat.loc['AWAY (2)', 'Bets']), 'AWAY (2) PNL': strat.loc['AWAY (2)', 'PNL'],
+            'HOME (1) Bets': int(strat.loc['HOME (1)', 'Bets']), 'HOME (1) PNL': strat.loc['HOME (1)', 'PNL'],
+        })
+    return pd.DataFrame(rows, columns=COMPARE_COLS)
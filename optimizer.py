@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+from engine import calc_sweep
+from pnl_index import SIDES, cum_tables, rect_sum
+
+# --- OTTIMIZZATORE A GRIGLIA ---
+# Prova tutte le combinazioni (EV min/max, quote min/max, lato, HFA base) sull'output
+# di calc_sweep. Le somme per ogni rettangolo EV x quote si leggono da tabelle
+# cumulative 2D, quindi ogni combinazione costa O(1) invece di un filtro sul DataFrame.
+
+RANK_KEYS = {'PNL': ['PNL', 'ROI', 'Bets'], 'ROI': ['ROI', 'PNL', 'Bets'], 'Bets': ['Bets', 'PNL', 'ROI']}
+
+
+def _top(block, key, top_n):
+    # Tiene solo le migliori top_n righe del blocco per la chiave principale
+    if len(block['PNL']) <= top_n:
+        return block
+    keep = np.argpartition(-block[key], top_n - 1)[:top_n]
+    return {k: v[keep] for k, v in block.items()}
+
+
+def grid_search(df, hfa_values, use_dyn, ev_grid, odds_grid,
+                sides=('1', '2'), min_bets=20, sort_by='PNL', top_n=100, chunk=2_000_000, margin='proportional'):
+    # df: output di load_data (con Real_Res). Ritorna le migliori top_n combinazioni.
+    ev_grid = np.asarray(ev_grid, dtype=float)
+    odds_grid = np.asarray(odds_grid, dtype=float)
+    ei, ej = np.triu_indices(len(ev_grid), 1)
+    oi, oj = np.triu_indices(len(odds_grid), 1)
+    # Range chiuso [grid[i], grid[j]] -> posizioni [2i+1, 2j+2)
+    ea, eb = 2 * ei + 1, 2 * ej + 2
+    oa, ob = 2 * oi + 1, 2 * oj + 2
+    rows_per_chunk = max(1, chunk // max(1, len(oa)))
+
+    # EV per tutti gli HFA in un solo passaggio
+    sweep = calc_sweep(df, hfa_values, use_dyn, margin)
+    blocks = []
+    for h, hfa in enumerate(sweep['HFA']):
+        for side in sides:
+            ev_c, odds_c, pnl_c = SIDES[side]
+            s_pnl, s_cnt = cum_tables(sweep[ev_c][:, h], sweep[odds_c], sweep[pnl_c], ev_grid, odds_grid)
+            for start in range(0, len(ea), rows_per_chunk):
+                sl = slice(start, start + rows_per_chunk)
+                a, b = ea[sl, None], eb[sl, None]
+                bets = rect_sum(s_cnt, a, b, oa[None, :], ob[None, :])
+                r, c = np.nonzero(bets >= min_bets)
+                if not len(r): continue
+                pnl = rect_sum(s_pnl, a[r, 0], b[r, 0], oa[c], ob[c])
+                n = bets[r, c]
+                block = {
+                    'HFA': np.full(len(r), hfa),
+                    'Side': np.full(len(r), side),
+                    'EV_Min': ev_grid[ei[sl][r]], 'EV_Max': ev_grid[ej[sl][r]],
+                    'Odds_Min': odds_grid[oi[c]], 'Odds_Max': odds_grid[oj[c]],
+                    'Bets': n, 'PNL': pnl, 'ROI': pnl / n * 100,
+                }
+                blocks.append(_top(block, sort_by, top_n))
+
+    cols = ['HFA', 'Side', 'EV_Min', 'EV_Max', 'Odds_Min', 'Odds_Max', 'Bets', 'PNL', 'ROI']
+    if not blocks:
+        return pd.DataFrame(columns=cols)
+    out = pd.DataFrame({k: np.concatenate([b[k] for b in blocks]) for k in cols})
+    return out.sort_values(RANK_KEYS[sort_by], ascending=False).head(top_n).reset_index(drop=True)
+
+
+def hfa_curve(sweep, side, ev_min, ev_max, odds_min, odds_max):
+    # Profitto vs HFA base per una strategia: una colonna della matrice EV per ogni HFA
+    ev_c, odds_c, pnl_c = SIDES[side]
+    odds = sweep[odds_c]
+    ev = sweep[ev_c]
+    sel = (ev >= ev_min) & (ev <= ev_max) & ((odds >= odds_min) & (odds <= odds_max))[:, None]
+    bets = sel.sum(axis=0)
+    pnl = np.nan_to_num(sweep[pnl_c]) @ sel
+    roi = np.divide(pnl * 100, bets, out=np.zeros(len(bets)), where=bets > 0)
+    return pd.DataFrame({'Bets': bets, 'PNL': pnl, 'ROI': roi}, index=pd.Index(sweep['HFA'], name='HFA'))
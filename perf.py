@@ -0,0 +1,111 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+# --- DIAGNOSTICA PRESTAZIONI ---
+# Ogni fase (lettura, standardizzazione, calcolo, filtri, tabelle...) registra tempo,
+# righe e variazione di memoria nel log dell'esecuzione corrente. Le funzioni di
+# libreria usano track(): senza un log attivo non fanno nulla.
+# CECCHINO_PERF_LOG=percorso.jsonl -> ogni esecuzione viene anche aggiunta al file.
+
+PERF_LOG = os.environ.get('CECCHINO_PERF_LOG')
+
+_current = ContextVar('cecchino_perf_log', default=None)
+
+try:
+    import psutil
+    _proc = psutil.Process()
+
+    def rss_mb():
+        return _proc.memory_info().rss / 2 ** 20
+except ImportError:
+    _PAGE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+    def rss_mb():
+        # Memoria residente da /proc (Linux); None dove non disponibile
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * _PAGE / 2 ** 20
+        except (OSError, ValueError, IndexError):
+            return None
+
+
+class StageLog:
+    # Log delle fasi di un'esecuzione dell'app (una riga per fase)
+
+    def __init__(self, app):
+        self.app = app
+        self.started = time.time()
+        self.t0 = time.perf_counter()
+        self.stages = []
+        self.depth = 0
+        _current.set(self)
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        # with log.stage('Lettura') as s: ...; s['rows'] = len(df)
+        mem0 = rss_mb()
+        t0 = time.perf_counter()
+        info = {'stage': name, 'level': self.depth, 'rows': rows, 'start': t0 - self.t0}
+        self.depth += 1
+        try:
+            yield info
+        finally:
+            self.depth -= 1
+            mem1 = rss_mb()
+            info['seconds'] = time.perf_counter() - t0
+            info['mem_delta_mb'] = mem1 - mem0 if mem0 is not None and mem1 is not None else None
+            info['rss_mb'] = mem1
+            self.stages.append(info)
+
+    def records(self):
+        # Fasi in ordine di inizio (quelle annidate dopo la fase che le contiene)
+        meta = {'app': self.app, 'run_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started))}
+        return [dict(meta, **s) for s in sorted(self.stages, key=lambda s: s['start'])]
+
+    def to_json(self):
+        return '\n'.join(json.dumps(r, ensure_ascii=False) for r in self.records())
+
+    def append_to(self, path):
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(self.to_json() + '\n')
+
+
+@contextmanager
+def track(name, rows=None):
+    # Fase registrata nel log attivo (se c'è)
+    log = _current.get()
+    if log is None:
+        yield {}
+        return
+    with log.stage(name, rows) as info:
+        yield info
+
+
+def show_panel(log):
+    # Sezione espandibile con le fasi dell'esecuzione ed export del log (JSON Lines)
+    import pandas as pd
+    import streamlit as st
+
+    if PERF_LOG:
+        try:
+            log.append_to(Path(PERF_LOG))
+        except OSError:
+            pass
+    rows = log.records()
+    with st.expander("🩺 Diagnostica prestazioni"):
+        if not rows:
+            st.caption("Nessuna fase registrata in questa esecuzione.")
+            return
+        table = pd.DataFrame(rows)[['stage', 'level', 'rows', 'seconds', 'mem_delta_mb', 'rss_mb']]
+        table['stage'] = ['  ' * lv + s for s, lv in zip(table['stage'], table['level'])]
+        st.dataframe(
+            table.drop(columns='level').rename(columns={
+                'stage': 'Fase', 'rows': 'Righe', 'seconds': 'Secondi', 'mem_delta_mb': 'Δ Memoria (MB)', 'rss_mb': 'Memoria (MB)'
+            }).style.format({'Secondi': '{:.3f}', 'Δ Memoria (MB)': '{:+.1f}', 'Memoria (MB)': '{:.0f}', 'Righe': '{:.0f}'}, na_rep='-'),
+            use_container_width=True
+        )
+        st.download_button("Scarica log (JSON Lines)", log.to_json(), file_name=f"perf_{log.app}.jsonl", mime='application/json')
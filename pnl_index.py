@@ -0,0 +1,112 @@
+import numpy as np
+
+# --- INDICE A SOMME CUMULATIVE ---
+# Tabelle cumulative 2D di PNL e numero scommesse su una griglia EV x quote:
+# la somma su qualsiasi rettangolo (range EV x range quote) costa O(1).
+
+SIDES = {'1': ('EV_1', 'Odds_1', 'PNL_1'), '2': ('EV_2', 'Odds_2', 'PNL_2')}
+
+
+def make_grid(lo, hi, step):
+    # Griglia con valori "puliti" (stessi float degli slider)
+    return np.round(np.arange(lo, hi + step / 2, step), 4)
+
+
+def grid_pos(values, grid):
+    # Posizione sulla griglia raddoppiata: 2k+1 se il valore coincide con grid[k],
+    # 2k se cade tra grid[k-1] e grid[k]. Così i filtri >= e <= restano esatti.
+    return np.searchsorted(grid, values, 'left') + np.searchsorted(grid, values, 'right')
+
+
+def cum_tables(ev, odds, pnl, ev_grid, odds_grid):
+    # Tabelle cumulative 2D (PNL e numero scommesse) con bordo di zeri
+    ok = ~(np.isnan(ev) | np.isnan(odds) | np.isnan(pnl))
+    shape = (2 * len(ev_grid) + 1, 2 * len(odds_grid) + 1)
+    flat = grid_pos(ev[ok], ev_grid) * shape[1] + grid_pos(odds[ok], odds_grid)
+    size = shape[0] * shape[1]
+
+    s_pnl = np.zeros((shape[0] + 1, shape[1] + 1))
+    s_cnt = np.zeros((shape[0] + 1, shape[1] + 1), dtype=np.int64)
+    s_pnl[1:, 1:] = np.bincount(flat, weights=pnl[ok], minlength=size).reshape(shape).cumsum(0).cumsum(1)
+    s_cnt[1:, 1:] = np.bincount(flat, minlength=size).reshape(shape).cumsum(0).cumsum(1)
+    return s_pnl, s_cnt
+
+
+def rect_sum(s, a, b, c, d):
+    # Somma sulle posizioni [a, b) x [c, d); gli indici possono essere array broadcastabili
+    return s[b, d] - s[a, d] - s[b, c] + s[a, c]
+
+
+def _snap(grid, x):
+    # Indice di x sulla griglia (tolleranza per i float degli slider), None se fuori griglia
+    k = int(np.clip(np.searchsorted(grid, x), 1, len(grid) - 1))
+    k = k - 1 if abs(grid[k - 1] - x) <= abs(grid[k] - x) else k
+    return k if abs(grid[k] - x) <= 1e-9 else None
+
+
+def _bounds(grid, lo, hi):
+    # Range chiuso [lo, hi] -> posizioni [a, b) sulla griglia raddoppiata
+    a = 0 if lo == -np.inf else _snap(grid, lo)
+    b = 2 * len(grid) + 1 if hi == np.inf else _snap(grid, hi)
+    if a is None or b is None:
+        return None
+    if lo != -np.inf: a = 2 * a + 1
+    if hi != np.inf: b = 2 * b + 2
+    return a, max(a, b)
+
+
+class PnlIndex:
+    # Indice costruito una volta sull'output di calc_metrics; le query degli slider
+    # non scansionano più le righe. Valori fuori griglia -> scansione classica.
+
+    def __init__(self, metrics, ev_grid, odds_grid):
+        self.ev_grid = np.asarray(ev_grid, dtype=float)
+        self.odds_grid = np.asarray(odds_grid, dtype=float)
+        self.sides = {}
+        for side, (ev_c, odds_c, pnl_c) in SIDES.items():
+            ev = metrics[ev_c].to_numpy(dtype=float)
+            odds = metrics[odds_c].to_numpy(dtype=float)
+            pnl = metrics[pnl_c].to_numpy(dtype=float)
+            order = np.argsort(ev, kind='stable')
+            self.sides[side] = {
+                'ev': ev[order], 'odds': odds[order], 'pnl': pnl[order], 'rows': order,
+                'tables': cum_tables(ev, odds, pnl, self.ev_grid, self.odds_grid),
+            }
+
+    def _slice(self, side, ev_min, ev_max, odds_min, odds_max):
+        # Righe (ordinate per EV) nel range: il range EV è un intervallo contiguo
+        d = self.sides[side]
+        i = np.searchsorted(d['ev'], ev_min, 'left')
+        j = np.searchsorted(d['ev'], ev_max, 'right')
+        odds = d['odds'][i:j]
+        return d, i + np.flatnonzero((odds >= odds_min) & (odds <= odds_max))
+
+    def _clean(self, ev_min, ev_max, odds_min, odds_max):
+        # Porta sulla griglia i float "sporchi" degli slider (es. 2.0599999999999996)
+        out = []
+        for grid, x in ((self.ev_grid, ev_min), (self.ev_grid, ev_max),
+                        (self.odds_grid, odds_min), (self.odds_grid, odds_max)):
+            k = None if np.isinf(x) else _snap(grid, x)
+            out.append(x if k is None else grid[k])
+        return out
+
+    def query(self, side, ev_min, ev_max, odds_min, odds_max):
+        # Ritorna (PNL, numero scommesse, ROI %)
+        ev_min, ev_max, odds_min, odds_max = self._clean(ev_min, ev_max, odds_min, odds_max)
+        eb = _bounds(self.ev_grid, ev_min, ev_max)
+        ob = _bounds(self.odds_grid, odds_min, odds_max)
+        if eb is None or ob is None:
+            d, sel = self._slice(side, ev_min, ev_max, odds_min, odds_max)
+            pnl, bets = float(d['pnl'][sel].sum()), len(sel)
+        else:
+            s_pnl, s_cnt = self.sides[side]['tables']
+            pnl = float(rect_sum(s_pnl, eb[0], eb[1], ob[0], ob[1]))
+            bets = int(rect_sum(s_cnt, eb[0], eb[1], ob[0], ob[1]))
+        roi = (pnl / bets) * 100 if bets > 0 else 0
+        return pnl, bets, roi
+
+    def rows(self, side, ev_min, ev_max, odds_min, odds_max):
+        # Posizioni (iloc) delle partite selezionate, nell'ordine originale
+        ev_min, ev_max, odds_min, odds_max = self._clean(ev_min, ev_max, odds_min, odds_max)
+        d, sel = self._slice(side, ev_min, ev_max, odds_min, odds_max)
+        return np.sort(d['rows'][sel])
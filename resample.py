@@ -0,0 +1,67 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# --- BOOTSTRAP ROI ---
+# Il ROI su poche decine di scommesse è una stima rumorosa: ricampiona il PNL
+# delle scommesse scelte (con reinserimento) e misura la dispersione.
+# Ogni blocco di ricampionamenti è un'unica operazione su matrice (ricampioni x scommesse);
+# i blocchi girano in parallelo su thread (numpy rilascia il GIL).
+
+WORKERS = os.cpu_count() or 1
+# Flussi casuali fissi: stesso seed -> stesso risultato con qualsiasi numero di core
+STREAMS = 8
+
+
+def _draw(pnl, n_boot, seed, chunk):
+    # ROI % e max drawdown di n_boot sequenze ricampionate
+    rng = np.random.default_rng(seed)
+    n = len(pnl)
+    roi, dd = np.empty(n_boot), np.empty(n_boot)
+    rows = max(1, chunk // n)
+    for s in range(0, n_boot, rows):
+        idx = rng.integers(0, n, size=(min(rows, n_boot - s), n))
+        paths = pnl[idx].cumsum(axis=1)
+        peak = np.maximum.accumulate(np.maximum(paths, 0), axis=1)
+        roi[s:s + len(idx)] = paths[:, -1] / n * 100
+        dd[s:s + len(idx)] = (peak - paths).max(axis=1)
+    return roi, dd
+
+
+def max_drawdown(pnl):
+    # Massimo calo dal picco della curva cumulata (partendo da 0)
+    equity = np.cumsum(pnl)
+    return float((np.maximum.accumulate(np.maximum(equity, 0)) - equity).max()) if len(equity) else 0.0
+
+
+def bootstrap(pnl, n_boot=20_000, ci=95, seed=0, workers=None, chunk=4_000_000):
+    # pnl: profitto per scommessa in unità di stake (es. PNL_1/PNL_2).
+    # Ritorna None senza scommesse, altrimenti un dict con ROI, intervallo, P(ROI>0) e drawdown.
+    pnl = np.asarray(pnl, dtype=float)
+    pnl = pnl[~np.isnan(pnl)]
+    if not len(pnl):
+        return None
+
+    sizes = np.diff(np.linspace(0, n_boot, STREAMS + 1).astype(int))
+    seeds = np.random.SeedSequence(seed).spawn(STREAMS)
+    jobs = [(pnl, int(k), sd, chunk) for k, sd in zip(sizes, seeds) if k]
+    workers = min(workers or WORKERS, len(jobs))
+    if workers > 1:
+        with ThreadPoolExecutor(workers) as ex:
+            parts = list(ex.map(lambda j: _draw(*j), jobs))
+    else:
+        parts = [_draw(*j) for j in jobs]
+
+    roi = np.concatenate([p[0] for p in parts])
+    dd = np.concatenate([p[1] for p in parts])
+    tail = (100 - ci) / 2
+    return {
+        'ROI': pnl.mean() * 100,
+        'CI_Low': np.percentile(roi, tail),
+        'CI_High': np.percentile(roi, 100 - tail),
+        'P_Positive': (roi > 0).mean(),
+        'DD': dd,
+        'DD_Median': np.median(dd),
+        'DD_95': np.percentile(dd, 95),
+        'DD_Actual': max_drawdown(pnl),
+    }
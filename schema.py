@@ -0,0 +1,91 @@
+import pandas as pd
+
+# --- SCHEMA DELLE COLONNE ---
+# Unico registro dei nomi colonna. Al caricamento ogni file viene ricondotto ai nomi
+# canonici una volta sola: alias dei vari fornitori, varianti della classifica unite
+# in una colonna, colonne numeriche convertite. Il calcolo legge sempre le stesse
+# colonne, senza cercare varianti riga per riga.
+
+
+class SchemaError(ValueError):
+    pass
+
+
+ODDS = ('cotaa', 'cotae', 'cotad')
+ELO = ('elohomeo', 'eloawayo')
+GOALS = ('scor1', 'scor2')
+PLACES = ('place1a', 'place2d')
+TEAMS = ('txtechipa1', 'txtechipa2')
+DATE = ('datameci',)
+NUMERIC = ODDS + ELO + GOALS + PLACES
+
+# canonico -> alias accettati (senza maiuscole/spazi ai lati), in ordine di priorità
+ALIASES = {
+    'cotaa': ('1',), 'cotae': ('x',), 'cotad': ('2',),
+    'elohomeo': ('eloc',), 'eloawayo': ('eloo',),
+    'txtechipa1': ('home', 'casa'), 'txtechipa2': ('away', 'ospite'),
+    'scor1': ('gfinc',), 'scor2': ('gfino',),
+    'place1a': ('place 1a',), 'place2d': ('place 2d',),
+}
+
+# Colonne indispensabili per tipo di utilizzo
+REQUIRED = {
+    'signals': ODDS,
+    'backtest': ODDS + ELO + GOALS,
+    # Elo e classifica interni: la data distingue la stessa sfida in giornate/stagioni diverse
+    'elo': TEAMS + DATE,
+}
+
+_LOOKUP = {a: canon for canon, names in ALIASES.items() for a in (canon,) + names}
+
+
+def canonical(name):
+    # Nome canonico di una colonna del file (None se non è nel registro)
+    return _LOOKUP.get(str(name).strip().lower())
+
+
+def resolve(columns):
+    # {canonico: colonne del file che lo rappresentano, in ordine di priorità}
+    found = {}
+    for c in columns:
+        canon = canonical(c)
+        if canon:
+            found.setdefault(canon, []).append(c)
+    order = lambda canon: lambda c: ((canon,) + ALIASES[canon]).index(str(c).strip().lower())
+    return {canon: sorted(cols, key=order(canon)) for canon, cols in found.items()}
+
+
+def to_number(s):
+    # Testo con virgola decimale -> float; celle non valide -> NaN. Interi -> float64
+    if pd.api.types.is_float_dtype(s):
+        return s
+    if pd.api.types.is_numeric_dtype(s):
+        return s.astype(float)
+    return pd.to_numeric(s.astype(str).str.replace(',', '.', regex=False), errors='coerce')
+
+
+def apply_schema(df):
+    # Nomi canonici; più varianti dello stesso campo -> vince la prima non vuota
+    df.columns = df.columns.str.strip()
+    rename, drop = {}, []
+    for canon, cols in resolve(df.columns).items():
+        num = canon in NUMERIC
+        val = to_number(df[cols[0]]) if num else df[cols[0]]
+        for c in cols[1:]:
+            val = val.fillna(to_number(df[c]) if num else df[c])
+        df[cols[0]] = val
+        rename[cols[0]] = canon
+        drop += cols[1:]
+    return df.drop(columns=drop).rename(columns=rename)
+
+
+def validate(df, required):
+    # Errore chiaro subito al caricamento invece di un KeyError a metà calcolo
+    missing = [c for c in required if c not in df.columns]
+    if missing:
+        names = [f"{c} (o {' / '.join(repr(a) for a in ALIASES[c])})" if c in ALIASES else c for c in missing]
+        raise SchemaError("Colonne mancanti: " + ', '.join(names))
+    bad = [c for c in required if c in NUMERIC and not pd.api.types.is_numeric_dtype(df[c])]
+    if bad:
+        raise SchemaError("Colonne non numeriche: " + ', '.join(bad))
+    return df
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+from aliases import norm_date
+
+# --- VERIFICA RISULTATI (JOIN COLONNARE) ---
+# Le giocate vengono incrociate con i risultati con un'unica merge su MatchID,
+# esito e profitto sono calcolati su colonne intere.
+
+# Come trattare più risultati con lo stesso MatchID (es. stessa sfida in due giornate).
+# Con 'last'/'first' tutte le giocate con quel MatchID ricevono lo stesso risultato.
+DUP_POLICIES = {
+    'date': "Usa anche la data (datameci), poi l'ultimo",
+    'last': "Tieni l'ultimo risultato",
+    'first': "Tieni il primo risultato",
+    'drop': "Scarta i MatchID ambigui",
+}
+
+
+def _keys(picks, results, dup):
+    # Con la policy 'date' la chiave include la data normalizzata (_day), se entrambi i
+    # file la hanno e almeno un giorno coincide; altrimenti solo MatchID
+    if dup == 'date' and 'datameci' in picks.columns and 'datameci' in results.columns:
+        p_day = norm_date(picks['datameci'].astype(str))
+        r_day = norm_date(results['datameci'].astype(str))
+        if p_day.isin(r_day).any():
+            return ['MatchID', '_day'], picks.assign(_day=p_day), results.assign(_day=r_day)
+    return ['MatchID'], picks, results
+
+
+def dedupe_results(results, keys, dup):
+    # Una sola riga per chiave; ritorna anche quante chiavi erano duplicate
+    res = results[keys + ['scor1', 'scor2']].copy()
+    res['scor1'] = pd.to_numeric(res['scor1'], errors='coerce')
+    res['scor2'] = pd.to_numeric(res['scor2'], errors='coerce')
+    res = res.dropna(subset=['scor1', 'scor2'])
+    dup_mask = res.duplicated(keys, keep=False)
+    n_dup = res.loc[dup_mask, keys].drop_duplicates().shape[0]
+    if dup == 'drop':
+        return res[~dup_mask], n_dup
+    return res.drop_duplicates(keys, keep='first' if dup == 'first' else 'last'), n_dup
+
+
+def settle(picks, results, stake=10, dup='date'):
+    # picks: righe con Signal/Pick/Odds_Play/MatchID; results: file con scor1/scor2.
+    # Ritorna (storico delle giocate verificate, numero di MatchID duplicati)
+    keys, picks, results = _keys(picks, results, dup)
+    res, n_dup = dedupe_results(results, keys, dup)
+    res = res.rename(columns={'scor1': '_s1', 'scor2': '_s2'})
+
+    cols = keys + ['txtechipa1', 'txtechipa2', 'Signal', 'Pick', 'Odds_Play']
+    merged = picks[cols].merge(res, on=keys, how='inner')
+
+    s1 = merged['_s1'].to_numpy()
+    s2 = merged['_s2'].to_numpy()
+    real_res = np.select([s1 > s2, s2 > s1], ['1', '2'], 'X')
+    win = merged['Pick'].to_numpy() == real_res
+    pnl = np.where(win, merged['Odds_Play'].to_numpy(dtype=float) * stake - stake, -stake)
+
+    history = pd.DataFrame({
+        'Match': merged['txtechipa1'].astype(str) + ' vs ' + merged['txtechipa2'].astype(str),
+        'Segnale': merged['Signal'],
+        'Pick': merged['Pick'],
+        'Quota': merged['Odds_Play'],
+        'Risultato': (merged['_s1'].astype(int).astype(str) + '-' + merged['_s2'].astype(int).astype(str)
+                      + ' (' + real_res + ')'),
+        'Esito': np.where(win, '✅ WIN', '❌ LOSS'),
+        'Profitto': pnl,
+    })
+    return history, n_dup
@@ -0,0 +1,100 @@
+import pandas as pd
+from compact import compact_frame
+from elo import with_own_elo
+from engine import calc_golden, calc_tiers
+from standings import with_standings
+from loader import load_standard
+from perf import track
+from schema import REQUIRED
+from strategies import strategy_signals
+
+# --- SEGNALI DEL GIORNO ---
+# Logica di V64 (livelli Cecchino) e V70 (filtro Golden) senza Streamlit:
+# la usano le app e il runner da riga di comando (cecchino.py).
+
+# Ordine di visualizzazione V64: prima i Diamanti, poi il Valore
+SIGNAL_ORDER = {'💎 AWAY': 1, '💎 HOME': 2, '✅ VALUE 2': 3, '✅ VALUE 1': 4}
+
+TIER_COLS = ['Signal', 'datameci', 'league', 'txtechipa1', 'txtechipa2', 'HFA', 'cotaa', 'cotad', 'EV_1', 'EV_2']
+STRATEGY_COLS = ['Signal', 'Pick', 'Odds_Play', 'datameci', 'league', 'txtechipa1', 'txtechipa2', 'HFA', 'cotaa', 'cotad', 'EV_1', 'EV_2']
+GOLDEN_COLS = ['datameci', 'league', 'txtechipa1', 'txtechipa2', 'cotad', 'EV', 'HFA']
+
+
+def tier_signals(df, hfa, dyn, margin='proportional'):
+    return calc_tiers(df, hfa, dyn, margin)[['EV_1', 'EV_2', 'HFA', 'Signal']]
+
+
+def _with_signals(df, calc, hfa, dyn, state, name, compact=False, elo=None, standings=None, margin='proportional'):
+    # Aggiunge le colonne segnale; con uno stato (SignalState) ricalcola solo le partite cambiate.
+    # compact=True -> frame finale in memoria compatta (segnali inclusi)
+    # elo (elo.EloBook) -> Elo interno al posto di quello del fornitore
+    # standings (standings.StandingsBook) -> classifica interna per l'HFA dinamico
+    if df.empty:
+        return df
+    if elo is not None:
+        with track('Elo interno', len(df)):
+            df = with_own_elo(df, elo)
+    if standings is not None:
+        with track('Classifica interna', len(df)):
+            df = with_standings(df, standings)
+    with track('Calcolo segnali', len(df)):
+        if state is None:
+            sig = calc(df, hfa, dyn, margin)
+        else:
+            sig = state.update(df, lambda d: calc(d, hfa, dyn, margin), f"{name}|{hfa}|{dyn}|{margin}")
+        df = pd.concat([df, sig], axis=1)
+    if compact:
+        with track('Memoria compatta', len(df)):
+            df = compact_frame(df)
+    return df
+
+
+def load_tiers(file, hfa, dyn, state=None, compact=False, elo=None, standings=None, margin='proportional'):
+    # Tutte le partite del file con EV_1/EV_2/HFA/Signal di V64
+    df = load_standard(file, REQUIRED['signals'])
+    df = df.dropna(subset=['cotaa'])  # Rimuove righe vuote
+    return _with_signals(df, tier_signals, hfa, dyn, state, 'tiers', compact, elo, standings, margin)
+
+
+def tier_picks(df):
+    # Solo le occasioni, ordinate per livello
+    picks = df[df['Signal'] != 'SKIP'].copy()
+    # astype(str): su una colonna categoria map() darebbe una categoria, non numeri ordinabili
+    picks['SortOrder'] = picks['Signal'].astype(str).map(SIGNAL_ORDER)
+    return picks.sort_values('SortOrder', kind='stable')
+
+
+def load_golden(file, hfa, dyn, state=None, compact=False, elo=None, standings=None, margin='proportional'):
+    # Tutte le partite del file con Signal/EV/Pick/HFA di V70
+    df = load_standard(file, REQUIRED['signals'])
+    df = df.dropna(subset=['cotaa'])
+    return _with_signals(df, calc_golden, hfa, dyn, state, 'golden', compact, elo, standings, margin)
+
+
+def golden_picks(df):
+    return df[df['Signal'] == '💎 GOLDEN PICK'].copy()
+
+
+def load_strategy(file, strategy, hfa, dyn, state=None, compact=False, elo=None, standings=None, margin='proportional'):
+    # Tutte le partite del file con i segnali di una strategia dichiarativa (strategies.py)
+    df = load_standard(file, REQUIRED['signals'])
+    df = df.dropna(subset=['cotaa'])
+    calc = lambda d, h, y, m: strategy_signals(d, strategy, h, y, m)
+    return _with_signals(df, calc, hfa, dyn, state, f"strategy|{strategy}", compact, elo, standings, margin)
+
+
+def strategy_picks(df, strategy):
+    # Solo le occasioni, in ordine di priorità dei livelli della strategia
+    order = {}
+    for i, t in enumerate(strategy['tiers']):
+        order.setdefault(t['signal'], i)
+    picks = df[df['Signal'] != 'SKIP'].copy()
+    picks['SortOrder'] = picks['Signal'].astype(str).map(order)
+    return picks.sort_values('SortOrder', kind='stable')
+
+
+# modalità -> (caricamento, filtro, colonne operative)
+MODES = {
+    'tiers': (load_tiers, tier_picks, TIER_COLS),
+    'golden': (load_golden, golden_picks, GOLDEN_COLS),
+}
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+
+# --- GESTIONE BANKROLL ---
+# Rigioca le giocate in ordine cronologico con più schemi di puntata insieme.
+# Ogni schema è una somma cumulata (stake fisso) o un prodotto cumulato (stake in %
+# del bankroll attuale), quindi nessun ciclo per scommessa; il rischio di rovina
+# viene da percorsi ricampionati calcolati come matrice (simulazioni x scommesse).
+
+# nome -> (tipo, parametro). flat: quota del bankroll iniziale; pct: quota del
+# bankroll attuale; kelly: frazione di Kelly calcolata da fin1/fin2.
+SCHEMES = {
+    'Flat 1%': ('flat', 0.01),
+    'Fisso 2%': ('pct', 0.02),
+    'Kelly 1/4': ('kelly', 0.25),
+}
+
+
+def picks_table(metrics, rows_home, rows_away, dates=None):
+    # Giocate (posizioni di calc_metrics) -> Quota, Prob, Ret (rendimento per 1u), in ordine di data
+    parts = []
+    for side, rows in (('1', rows_home), ('2', rows_away)):
+        sel = metrics.iloc[rows]
+        parts.append(pd.DataFrame({
+            'Pos': np.asarray(rows), 'Side': side,
+            'Odds': sel[f'Odds_{side}'].to_numpy(), 'Prob': sel[f'Prob_{side}'].to_numpy(),
+            'Ret': sel[f'PNL_{side}'].to_numpy(),
+        }))
+    picks = pd.concat(parts, ignore_index=True)
+    if dates is not None:
+        picks['Date'] = np.asarray(dates)[picks['Pos']]
+        return picks.sort_values(['Date', 'Pos'], kind='stable').reset_index(drop=True)
+    return picks.sort_values('Pos', kind='stable').reset_index(drop=True)
+
+
+def kelly(odds, prob):
+    # Frazione di Kelly piena, 0 se la giocata non ha valore per il modello
+    with np.errstate(divide='ignore', invalid='ignore'):
+        f = (prob * odds - 1) / (odds - 1)
+    return np.clip(np.nan_to_num(f), 0, 1)
+
+
+def bankroll_paths(ret, odds, prob, kind, param, bankroll=100.0):
+    # Bankroll dopo ogni scommessa (ultimo asse = scommesse). A zero ci si ferma.
+    if kind == 'flat':
+        path = bankroll + param * bankroll * np.cumsum(ret, axis=-1)
+        bust = np.maximum.accumulate(path <= 0, axis=-1)
+        return np.where(bust, 0.0, path)
+    frac = param * kelly(odds, prob) if kind == 'kelly' else np.full(np.shape(ret), param)
+    return bankroll * np.cumprod(np.maximum(1 + frac * ret, 0), axis=-1)
+
+
+def _drawdown(path, bankroll):
+    # Massimo calo % dal picco (il bankroll iniziale conta come primo picco)
+    peak = np.maximum.accumulate(np.maximum(path, bankroll), axis=-1)
+    return ((peak - path) / peak).max(axis=-1) * 100
+
+
+def simulate(picks, schemes=SCHEMES, bankroll=100.0, ruin=0.5, n_sims=2000, seed=0):
+    # Ritorna (riepilogo per schema, percorsi del bankroll). Rovina = bankroll sotto ruin * iniziale;
+    # la probabilità è stimata su n_sims sequenze ricampionate delle stesse giocate.
+    if picks.empty:
+        return pd.DataFrame(), pd.DataFrame()
+    ret = picks['Ret'].to_numpy(dtype=float)
+    odds = picks['Odds'].to_numpy(dtype=float)
+    prob = picks['Prob'].to_numpy(dtype=float)
+    idx = np.random.default_rng(seed).integers(0, len(ret), size=(n_sims, len(ret)))
+
+    paths, rows = {}, []
+    for name, (kind, param) in schemes.items():
+        path = bankroll_paths(ret, odds, prob, kind, param, bankroll)
+        sims = bankroll_paths(ret[idx], odds[idx], prob[idx], kind, param, bankroll)
+        paths[name] = path
+        rows.append({
+            'Schema': name,
+            'Finale': path[-1],
+            'Profitto %': (path[-1] / bankroll - 1) * 100,
+            'Max DD %': _drawdown(path, bankroll),
+            'Minimo': path.min(),
+            'Rischio Rovina %': (sims.min(axis=1) < ruin * bankroll).mean() * 100,
+        })
+    return pd.DataFrame(rows).set_index('Schema'), pd.DataFrame(paths)
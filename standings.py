@@ -0,0 +1,182 @@
+import os
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from cache import CACHE_DIR
+from elo import match_keys, team_names
+from engine import f64
+from schema import REQUIRED, validate
+
+# --- CLASSIFICHE INTERNE ---
+# Classifica di ogni lega ricostruita dai risultati (3 punti vittoria, 1 pareggio;
+# a pari punti differenza reti, gol fatti, nome), così l'HFA dinamico funziona anche
+# quando il CSV non ha place1a/place2d. Le posizioni sono quelle *prima* della giornata
+# della partita (le partite dello stesso giorno non si vedono tra loro).
+# Lo stato su disco tiene le classifiche correnti e le posizioni pre-partita già
+# calcolate: un nuovo file risultati applica solo le partite mai viste.
+# Una pausa di più di SEASON_GAP giorni in una lega apre una nuova stagione (classifica azzerata).
+# I file risultati vanno passati in ordine cronologico: un risultato vecchio mai visto
+# viene applicato alla classifica corrente. datameci è obbligatoria (REQUIRED['elo']):
+# senza data la stessa sfida di un'altra stagione sembrerebbe già vista.
+
+STANDINGS_DIR = CACHE_DIR / 'standings'
+# Da incrementare se cambia il calcolo: invalida gli stati salvati
+STANDINGS_VERSION = 1
+
+WIN_POINTS, DRAW_POINTS = 3, 1
+SEASON_GAP = 45
+NO_LEAGUE = 'Unknown'
+
+# Modalità per le app e il runner -> etichetta
+MODES = {
+    'file': "Dal file",
+    'fill': "Interna dove manca",
+    'own': "Interna sempre",
+}
+
+
+def standings_book(mode):
+    # None per 'file' (si usano solo le colonne del CSV)
+    return None if mode == 'file' else StandingsBook(override=mode == 'own')
+
+
+def rank(teams):
+    # {squadra: [punti, diff. reti, gol fatti, giocate]} -> {squadra: posizione (1 = prima)}
+    if not teams:
+        return {}
+    names = list(teams)
+    stats = np.array([teams[t] for t in names], dtype=float)
+    order = np.lexsort((np.array(names), -stats[:, 2], -stats[:, 1], -stats[:, 0]))
+    return {names[i]: p + 1 for p, i in enumerate(order)}
+
+
+def _days(df):
+    # Giorno della partita come numero (NaN se la data non è leggibile)
+    when = pd.to_datetime(df['datameci'].astype(str), dayfirst=True, errors='coerce', format='mixed')
+    return (when.dt.normalize() - pd.Timestamp('1970-01-01')).dt.days.to_numpy(dtype=float, na_value=np.nan)
+
+
+class StandingsBook:
+    # Classifiche per lega + posizioni pre-partita. override=True: sostituisce anche
+    # le posizioni presenti nel file, altrimenti riempie solo quelle mancanti
+
+    def __init__(self, override=False, path=None):
+        self.override = bool(override)
+        self.path = Path(path) if path else STANDINGS_DIR / 'standings.pkl'
+        self.tables = {}
+        self.games = pd.DataFrame(columns=['Place_H', 'Place_A'], dtype=float)
+        self.applied = 0
+        self.load()
+
+    def load(self):
+        try:
+            state = pd.read_pickle(self.path)
+        except Exception:
+            return
+        if state.get('version') == STANDINGS_VERSION:
+            self.tables, self.games = state['tables'], state['games']
+
+    def save(self):
+        # Cartella non scrivibile: lo stato resta solo in memoria, il calcolo prosegue
+        tmp = self.path.with_name(f"{self.path.stem}.{os.getpid()}.tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            pd.to_pickle({'version': STANDINGS_VERSION, 'tables': self.tables, 'games': self.games}, tmp)
+            os.replace(tmp, self.path)
+        except OSError:
+            try:
+                tmp.unlink(missing_ok=True)
+            except OSError:
+                pass
+
+    def _table(self, league, day):
+        # Classifica corrente della lega; azzerata se la partita apre una nuova stagione
+        table = self.tables.setdefault(league, {'teams': {}, 'last': np.nan})
+        if day - table['last'] > SEASON_GAP:
+            table['teams'] = {}
+        return table
+
+    def update(self, df):
+        # Applica i risultati nuovi (per lega, giornata per giornata) e ritorna
+        # (place_h, place_a) pre-partita per ogni riga; NaN = squadra senza partite in stagione
+        validate(df, REQUIRED['elo'])
+        t1, t2 = team_names(df)
+        keys = match_keys(df, (t1, t2)).to_numpy()
+        t1, t2 = t1.to_numpy(), t2.to_numpy()
+        league = df['league'].astype(str).to_numpy() if 'league' in df.columns else np.full(len(df), NO_LEAGUE)
+        day = _days(df)
+        g1 = f64(df['scor1']) if 'scor1' in df.columns else np.full(len(df), np.nan)
+        g2 = f64(df['scor2']) if 'scor2' in df.columns else np.full(len(df), np.nan)
+        new = ~np.isnan(g1) & ~np.isnan(g2) & ~np.isnan(day) & (self.games.index.get_indexer(keys) < 0)
+        # Doppioni: vale la prima riga giocata (una riga senza risultato prima non la blocca)
+        new &= ~pd.Series(np.where(new, keys, None)).duplicated().to_numpy()
+
+        rows = np.flatnonzero(new)
+        if len(rows):
+            rows = rows[np.lexsort((day[rows], league[rows]))]
+            place_h, place_a = np.full(len(rows), np.nan), np.full(len(rows), np.nan)
+            # Confini dei blocchi (stessa lega, stesso giorno) nelle righe ordinate
+            cut = np.flatnonzero((league[rows][1:] != league[rows][:-1]) | (day[rows][1:] != day[rows][:-1])) + 1
+            for a, b in zip(np.r_[0, cut], np.r_[cut, len(rows)]):
+                block = rows[a:b]
+                table = self._table(league[block[0]], day[block[0]])
+                teams = table['teams']
+                # Stessa giornata dell'ultimo aggiornamento (file a blocchi): posizioni di inizio giornata
+                same_day = day[block[0]] == table['last'] and 'pos' in table
+                pos = table['pos'] if same_day else rank(teams)
+                table['pos'] = pos
+                place_h[a:b] = [pos.get(t, np.nan) for t in t1[block]]
+                place_a[a:b] = [pos.get(t, np.nan) for t in t2[block]]
+                for h, w, x, y in zip(t1[block], t2[block], g1[block], g2[block]):
+                    sh, sa = teams.setdefault(h, [0, 0, 0, 0]), teams.setdefault(w, [0, 0, 0, 0])
+                    pts_h = WIN_POINTS if x > y else DRAW_POINTS if x == y else 0
+                    pts_a = WIN_POINTS if y > x else DRAW_POINTS if x == y else 0
+                    sh[0] += pts_h; sh[1] += x - y; sh[2] += x; sh[3] += 1
+                    sa[0] += pts_a; sa[1] += y - x; sa[2] += y; sa[3] += 1
+                table['last'] = day[block[0]]
+            added = pd.DataFrame({'Place_H': place_h, 'Place_A': place_a}, index=keys[rows])
+            self.games = pd.concat([self.games, added]) if len(self.games) else added
+            self.save()
+        self.applied = len(rows)
+
+        # Partite già viste -> posizioni salvate; le altre -> classifica corrente della lega
+        pos = self.games.index.get_indexer(keys)
+        seen = pos >= 0
+        place_h = np.where(seen, self.games['Place_H'].to_numpy()[pos], np.nan)
+        place_a = np.where(seen, self.games['Place_A'].to_numpy()[pos], np.nan)
+        for lg in np.unique(league[~seen]):
+            table = self.tables.get(lg)
+            if table is None:
+                continue
+            sel = ~seen & (league == lg)
+            current = rank(table['teams'])
+            # Dopo una pausa lunga la classifica vecchia non vale più (nuova stagione)
+            sel &= ~(day - table['last'] > SEASON_GAP)
+            place_h[sel] = [current.get(t, np.nan) for t in t1[sel]]
+            place_a[sel] = [current.get(t, np.nan) for t in t2[sel]]
+        return place_h, place_a
+
+
+def with_standings(df, book):
+    # Copia di df con place1a/place2d dalla classifica interna: solo dove il file non ha
+    # entrambe le posizioni, oppure sempre con book.override (originali in *_prov)
+    place_h, place_a = book.update(df)
+    out = df.copy()
+    has = np.zeros(len(df), dtype=bool)
+    if not book.override and 'place1a' in df.columns and 'place2d' in df.columns:
+        has = ~np.isnan(f64(df['place1a'])) & ~np.isnan(f64(df['place2d']))
+    for col, own in (('place1a', place_h), ('place2d', place_a)):
+        if col in out.columns:
+            prov = f64(out[col])
+            if book.override:
+                out[f'{col}_prov'] = out[col]
+            own = np.where(has, prov, own)
+        out[col] = own
+    return out
+
+
+def coverage(df):
+    # Quota di partite con entrambe le posizioni (quelle su cui agisce l'HFA dinamico)
+    if 'place1a' not in df.columns or 'place2d' not in df.columns or not len(df):
+        return 0.0
+    return float((~np.isnan(f64(df['place1a'])) & ~np.isnan(f64(df['place2d']))).mean())
@@ -0,0 +1,201 @@
+import json
+import os
+import re
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from engine import GOLDEN_EV, GOLDEN_ODDS, TIERS, _inputs, calc_ev, calc_sweep, dyn_hfa
+
+# --- STRATEGIE DICHIARATIVE ---
+# Una strategia è un dizionario (salvabile in JSON) invece di una nuova app_vNN.py:
+#   {"name": "...", "hfa": 90, "dyn": true,
+#    "tiers": [{"signal": "💎 AWAY", "side": "2", "ev_min": 4, "ev_max": null,
+#               "odds_min": 1.70, "odds_max": 3.50, "strict": true}, ...]}
+# L'ordine dei livelli è la priorità (vince il primo soddisfatto). hfa/dyn mancanti ->
+# impostazioni dell'app. strict: EV > ev_min (default) oppure EV >= ev_min.
+# Tutte le strategie vengono compilate in vettori di regole e valutate insieme sulla
+# stessa tabella EV (una colonna per ogni HFA usato).
+
+STRATEGY_FILE = Path(os.environ.get('CECCHINO_STRATEGY_FILE', Path.home() / '.local' / 'share' / 'cecchino' / 'strategies.json'))
+
+BUILTIN = [
+    {'name': 'Cecchino V64 (livelli)',
+     'tiers': [{'signal': sig, 'side': pick, 'ev_min': ev_min, 'odds_min': lo, 'odds_max': hi}
+               for sig, pick, ev_min, lo, hi in TIERS]},
+    {'name': 'Golden V70',
+     'tiers': [{'signal': '💎 GOLDEN PICK', 'side': '2', 'ev_min': GOLDEN_EV[0], 'ev_max': GOLDEN_EV[1],
+                'odds_min': GOLDEN_ODDS[0], 'odds_max': GOLDEN_ODDS[1], 'strict': False}]},
+    {'name': 'Standard AWAY (2)', 'tiers': [{'side': '2', 'ev_min': 4.0, 'odds_min': 1.70, 'odds_max': 3.50}]},
+    {'name': 'Standard HOME (1)', 'tiers': [{'side': '1', 'ev_min': 4.0, 'odds_min': 1.50, 'odds_max': 2.50}]},
+]
+
+def slug(name):
+    # Nome strategia -> pezzo di nome file
+    return re.sub(r'\W+', '_', name.lower()).strip('_') or 'strategia'
+
+
+def find_strategy(name, path=STRATEGY_FILE):
+    for s in load_strategies(path):
+        if s['name'].lower() == name.lower():
+            return s
+    raise ValueError(f"Strategia '{name}' non trovata. Disponibili: " + ', '.join(s['name'] for s in load_strategies(path)))
+
+
+SUMMARY_COLS = ['Strategia', 'HFA', 'Dinamico', 'Livelli', 'Bets', 'Bets_1', 'Bets_2', 'Vinte %', 'PNL', 'ROI']
+
+
+def _num(v, default):
+    return default if v is None else float(v)
+
+
+def parse_strategy(defn):
+    # dict o testo JSON -> strategia normalizzata; ValueError con un messaggio leggibile
+    if isinstance(defn, str):
+        try:
+            defn = json.loads(defn)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"JSON non valido: {e}")
+    if not isinstance(defn, dict) or not defn.get('name'):
+        raise ValueError("La strategia deve avere un 'name'.")
+    tiers = defn.get('tiers') or []
+    if not tiers:
+        raise ValueError(f"{defn['name']}: serve almeno un livello in 'tiers'.")
+    out = []
+    for i, t in enumerate(tiers):
+        side = str(t.get('side', ''))
+        if side not in ('1', '2'):
+            raise ValueError(f"{defn['name']}: livello {i + 1} senza 'side' valido ('1' o '2').")
+        out.append({
+            'signal': t.get('signal') or f"{defn['name']} ({side})",
+            'side': side,
+            'ev_min': _num(t.get('ev_min'), -np.inf), 'ev_max': _num(t.get('ev_max'), np.inf),
+            'odds_min': _num(t.get('odds_min'), 0.0), 'odds_max': _num(t.get('odds_max'), np.inf),
+            'strict': bool(t.get('strict', True)),
+        })
+    return {'name': str(defn['name']), 'hfa': defn.get('hfa'), 'dyn': defn.get('dyn'), 'tiers': out}
+
+
+def load_strategies(path=STRATEGY_FILE):
+    # Strategie predefinite + salvate (una salvata con lo stesso nome sostituisce la predefinita)
+    found = {s['name']: parse_strategy(s) for s in BUILTIN}
+    try:
+        saved = json.loads(Path(path).read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        saved = []
+    for s in saved:
+        try:
+            s = parse_strategy(s)
+        except ValueError:
+            continue
+        found[s['name']] = s
+    return list(found.values())
+
+
+def save_strategy(defn, path=STRATEGY_FILE):
+    # Aggiunge (o sostituisce per nome) una strategia nel file JSON
+    strategy = parse_strategy(defn)
+    path = Path(path)
+    try:
+        saved = json.loads(path.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        saved = []
+    raw = json.loads(defn) if isinstance(defn, str) else defn
+    saved = [s for s in saved if s.get('name') != strategy['name']] + [raw]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.stem}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(saved, ensure_ascii=False, indent=1), encoding='utf-8')
+    os.replace(tmp, path)
+    return strategy
+
+
+def compile_rules(strategies, base_hfa, use_dyn):
+    # Tutti i livelli di tutte le strategie come vettori (una riga per regola, in ordine di priorità)
+    rows = []
+    for k, s in enumerate(strategies):
+        hfa = float(base_hfa if s['hfa'] is None else s['hfa'])
+        dyn = bool(use_dyn if s['dyn'] is None else s['dyn'])
+        for t in s['tiers']:
+            rows.append(dict(t, strategy=k, hfa=hfa, dyn=dyn))
+    return pd.DataFrame(rows)
+
+
+def first_hits(ev1, ev2, o1, o2, rules, hcol):
+    # ev1/ev2: matrici (partite x HFA) in %, hcol: colonna HFA di ogni regola.
+    # Ritorna (partite x regole): True solo per il primo livello soddisfatto di ogni strategia
+    side2 = (rules['side'] == '2').to_numpy()
+    ev = np.where(side2, ev2[:, hcol], ev1[:, hcol])
+    o = np.where(side2, o2[:, None], o1[:, None])
+    lo, hi = rules['ev_min'].to_numpy(), rules['ev_max'].to_numpy()
+    above = np.where(rules['strict'].to_numpy(), ev > lo, ev >= lo)
+    hit = above & (ev <= hi) & (rules['odds_min'].to_numpy() <= o) & (o <= rules['odds_max'].to_numpy())
+
+    # Regole soddisfatte dall'inizio del blocco della strategia: la prima vale 1
+    k = rules['strategy'].to_numpy()
+    new = np.r_[True, k[1:] != k[:-1]]
+    start = np.maximum.accumulate(np.where(new, np.arange(len(k)), 0))
+    cs = np.cumsum(hit, axis=1)
+    before = np.where(start > 0, cs[:, np.maximum(start - 1, 0)], 0)
+    return hit & (cs - before == 1)
+
+
+def evaluate(df, strategies, base_hfa, use_dyn, chunk=200_000, margin='proportional'):
+    # Backtest di tutte le strategie in un passaggio: una tabella EV per impostazione
+    # dinamica (colonne = HFA distinti), poi solo maschere. Ritorna (riepilogo, per livello).
+    rules = compile_rules(strategies, base_hfa, use_dyn)
+    bets, pnl, wins = np.zeros(len(rules)), np.zeros(len(rules)), np.zeros(len(rules))
+    for dyn, grp in rules.groupby('dyn'):
+        hfa_values = np.unique(grp['hfa'].to_numpy())
+        sweep = calc_sweep(df, hfa_values, dyn, margin)
+        hcol = np.searchsorted(hfa_values, grp['hfa'].to_numpy())
+        side2 = (grp['side'] == '2').to_numpy()
+        pos = grp.index.to_numpy()
+        for a in range(0, len(sweep['Odds_1']), chunk):
+            s = slice(a, a + chunk)
+            first = first_hits(sweep['EV_1'][s], sweep['EV_2'][s], sweep['Odds_1'][s], sweep['Odds_2'][s], grp, hcol)
+            ret = np.where(side2, sweep['PNL_2'][s][:, None], sweep['PNL_1'][s][:, None])
+            bets[pos] += first.sum(axis=0)
+            pnl[pos] += np.where(first, ret, 0.0).sum(axis=0)
+            wins[pos] += (first & (ret > 0)).sum(axis=0)
+
+    per_tier = rules[['strategy', 'signal', 'side', 'hfa', 'dyn']].assign(Bets=bets.astype(int), PNL=pnl, Wins=wins)
+    g = per_tier.groupby('strategy')
+    sides = per_tier.pivot_table(index='strategy', columns='side', values='Bets', aggfunc='sum', fill_value=0)
+    sides = sides.reindex(index=g.size().index, columns=['1', '2'], fill_value=0)
+    summary = pd.DataFrame({
+        'Strategia': [s['name'] for s in strategies],
+        'HFA': g['hfa'].first().to_numpy(),
+        'Dinamico': g['dyn'].first().to_numpy(),
+        'Livelli': g.size().to_numpy(),
+        'Bets': g['Bets'].sum().to_numpy(),
+        'Bets_1': sides['1'].to_numpy(),
+        'Bets_2': sides['2'].to_numpy(),
+        'Vinte %': g['Wins'].sum().to_numpy() / np.maximum(g['Bets'].sum().to_numpy(), 1) * 100,
+        'PNL': g['PNL'].sum().to_numpy(),
+    })
+    for t in (summary, per_tier):
+        t['ROI'] = t['PNL'] / np.maximum(t['Bets'], 1) * 100
+
+    per_tier.insert(0, 'Strategia', summary['Strategia'].to_numpy()[per_tier['strategy']])
+    per_tier = per_tier.drop(columns=['strategy', 'Wins']).rename(columns={'signal': 'Segnale', 'side': 'Lato', 'hfa': 'HFA', 'dyn': 'Dinamico'})
+    return summary[SUMMARY_COLS].sort_values('PNL', ascending=False).reset_index(drop=True), per_tier
+
+
+def strategy_signals(df, strategy, base_hfa, use_dyn, margin='proportional'):
+    # Partite future: colonne come calc_tiers (EV_1, EV_2, HFA, Signal, Pick, Odds_Play) per una strategia
+    rules = compile_rules([parse_strategy(strategy)], base_hfa, use_dyn)
+    o1, ox, o2, elo_h, elo_a = _inputs(df)
+    hfa = dyn_hfa(df, rules['hfa'].iloc[0], bool(rules['dyn'].iloc[0]))
+    _, _, ev1, ev2 = calc_ev(o1, ox, o2, elo_h, elo_a, hfa, margin)
+    ev1, ev2 = ev1 * 100, ev2 * 100
+
+    first = first_hits(ev1[:, None], ev2[:, None], o1, o2, rules, np.zeros(len(rules), dtype=int))
+    side2 = (rules['side'] == '2').to_numpy()
+    conds = list(first.T)
+    return pd.DataFrame({
+        'EV_1': np.round(ev1, 2),
+        'EV_2': np.round(ev2, 2),
+        'HFA': np.trunc(hfa).astype(int),
+        'Signal': np.select(conds, rules['signal'].tolist(), 'SKIP'),
+        'Pick': np.select(conds, rules['side'].tolist(), None),
+        'Odds_Play': np.select(conds, [o2 if s2 else o1 for s2 in side2], 0.0),
+    }, index=df.index)
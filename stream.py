@@ -0,0 +1,75 @@
+import pandas as pd
+from engine import calc_metrics
+from loader import CSV_OPTS, numeric_columns, standardize, to_numeric_cols
+from schema import REQUIRED, validate
+
+# --- BACKTEST IN STREAMING ---
+# Il CSV viene letto a blocchi: ogni blocco è standardizzato, calcolato e ridotto
+# agli aggregati del V67 (strategie, campionati, fasce di quota). In memoria resta
+# un solo blocco alla volta, qualunque sia la dimensione del file.
+
+# Strategie Cecchino standard: nome -> (lato, EV min %, quota min, quota max)
+STD_STRATEGIES = {
+    'AWAY (2)': ('2', 4.0, 1.70, 3.50),
+    'HOME (1)': ('1', 4.0, 1.50, 2.50),
+}
+
+# Fasce di quota della Heatmap (solo puntate con EV > HEATMAP_EV)
+ODDS_BINS = [1.0, 1.5, 2.0, 2.5, 3.0, 4.0, 10.0]
+ODDS_LABELS = ['1.0-1.5', '1.5-2.0', '2.0-2.5', '2.5-3.0', '3.0-4.0', '4.0+']
+HEATMAP_EV = 2.0
+
+
+def aggregate(sim):
+    # Aggregati di un blocco di calc_metrics (un chunk oppure tutto il file)
+    strat = {}
+    for name, (side, ev_min, lo, hi) in STD_STRATEGIES.items():
+        mask = (sim[f'EV_{side}'] > ev_min) & (sim[f'Odds_{side}'].between(lo, hi))
+        strat[name] = {'Bets': int(mask.sum()), 'PNL': sim.loc[mask, f'PNL_{side}'].sum()}
+
+    agg = {
+        'Matches': len(sim),
+        'Strategies': pd.DataFrame.from_dict(strat, orient='index'),
+        'Leagues': sim.groupby('League')[['PNL_1', 'PNL_2']].sum(),
+    }
+    for side in ('1', '2'):
+        sel = sim[sim[f'EV_{side}'] > HEATMAP_EV]
+        bins = pd.cut(sel[f'Odds_{side}'], bins=ODDS_BINS, labels=ODDS_LABELS)
+        agg[f'Bins_{side}'] = sel.groupby(bins, observed=False)[f'PNL_{side}'].sum()
+    return agg
+
+
+def merge(a, b):
+    # Somma due insiemi di aggregati
+    return {
+        'Matches': a['Matches'] + b['Matches'],
+        'Strategies': a['Strategies'] + b['Strategies'],
+        'Leagues': a['Leagues'].add(b['Leagues'], fill_value=0),
+        'Bins_1': a['Bins_1'] + b['Bins_1'],
+        'Bins_2': a['Bins_2'] + b['Bins_2'],
+    }
+
+
+def iter_chunks(file, chunksize=200_000):
+    # Blocchi già convertiti e standardizzati, come load_data ma senza caricare tutto
+    num = numeric_columns(file)
+    for chunk in pd.read_csv(file, chunksize=chunksize, low_memory=False, **CSV_OPTS):
+        chunk = validate(standardize(to_numeric_cols(chunk, num)), REQUIRED['backtest'])
+        yield chunk.dropna(subset=['cotaa', 'cotad', 'Real_Res'])
+
+
+def stream_backtest(file, base_hfa, use_dyn, chunksize=200_000, margin='proportional', elo=None, standings=None):
+    # elo (elo.EloBook) / standings (standings.StandingsBook): come in signals, applicati
+    # blocco per blocco; lo stato su disco porta rating e classifiche da un blocco al successivo
+    # (import locali: elo importa aggregate da questo modulo)
+    from elo import with_own_elo
+    from standings import with_standings
+    total = None
+    for chunk in iter_chunks(file, chunksize):
+        if standings is not None:
+            chunk = with_standings(chunk, standings)
+        if elo is not None:
+            chunk = with_own_elo(chunk, elo)
+        agg = aggregate(calc_metrics(chunk, base_hfa, use_dyn, margin))
+        total = agg if total is None else merge(total, agg)
+    return total
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+# --- TABELLE PAGINATE ---
+# Ricerca, ordinamento e paginazione lato server: al browser arriva solo la pagina
+# visibile e lo Styler (colori dei segnali, formati) lavora solo su quelle righe,
+# non sull'intero DataFrame.
+
+PAGE_SIZES = (25, 50, 100, 250)
+FILE_ORDER = '(ordine file)'
+
+
+def _is_text(s):
+    return isinstance(s.dtype, pd.CategoricalDtype) or s.dtype == object or pd.api.types.is_string_dtype(s)
+
+
+def text_mask(df, query):
+    # Righe con `query` (maiuscole ignorate) in almeno una colonna di testo.
+    # Per le categorie si cerca solo tra i valori distinti, poi si espande con i codici.
+    q = query.strip().lower()
+    if not q:
+        return np.ones(len(df), dtype=bool)
+    mask = np.zeros(len(df), dtype=bool)
+    for c in df.columns:
+        s = df[c]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            hit = s.cat.categories.astype(str).str.lower().str.contains(q, regex=False).to_numpy(dtype=bool)
+            mask |= np.append(hit, False)[s.cat.codes.to_numpy()]  # codice -1 (vuoto) -> False
+        elif _is_text(s):
+            mask |= s.str.lower().str.contains(q, regex=False, na=False).to_numpy(dtype=bool)
+    return mask
+
+
+def select_rows(df, query='', sort_by=None, ascending=True):
+    # Posizioni (iloc) delle righe filtrate, nell'ordine richiesto (celle vuote in fondo)
+    pos = np.flatnonzero(text_mask(df, query))
+    if sort_by is not None and sort_by in df.columns:
+        key = df[sort_by].iloc[pos].reset_index(drop=True)
+        pos = pos[key.sort_values(ascending=ascending, kind='stable', na_position='last').index.to_numpy()]
+    return pos
+
+
+def show_table(df, key, style=None, page_size=50, height=None):
+    # Tabella Streamlit paginata. style(pagina) -> Styler/DataFrame da mostrare,
+    # applicato solo alle righe della pagina corrente.
+    import streamlit as st
+
+    if df.empty:
+        st.dataframe(style(df) if style else df, use_container_width=True)
+        return
+
+    c1, c2, c3, c4 = st.columns([3, 2, 1, 1])
+    has_text = any(_is_text(df[c]) for c in df.columns)
+    query = c1.text_input("Cerca", key=f"{key}_q", placeholder="squadra, lega, segnale...") if has_text else ''
+    sort_by = c2.selectbox("Ordina per", [FILE_ORDER] + list(df.columns), key=f"{key}_sort", format_func=str)
+    desc = c3.checkbox("Decrescente", False, key=f"{key}_desc")
+    size = c4.selectbox("Righe", PAGE_SIZES, index=PAGE_SIZES.index(page_size), key=f"{key}_size")
+
+    pos = select_rows(df, query, None if sort_by == FILE_ORDER else sort_by, not desc)
+    n_pages = max(1, -(-len(pos) // size))
+    page_key = f"{key}_page"
+    if st.session_state.get(page_key, 1) > n_pages:
+        st.session_state[page_key] = 1  # il filtro ha ridotto le pagine
+    page = st.number_input(f"Pagina (di {n_pages})", 1, n_pages, key=page_key) if n_pages > 1 else 1
+
+    start = (page - 1) * size
+    rows = df.iloc[pos[start:start + size]]
+    st.dataframe(style(rows) if style else rows, use_container_width=True, **({'height': height} if height else {}))
+    shown = f"Righe {start + 1}–{start + len(rows)} di {len(pos)}" if len(pos) else "Nessuna riga trovata"
+    st.caption(shown + (f" (filtrate da {len(df)})" if len(pos) != len(df) else ''))
@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+from engine import calc_sweep
+from optimizer import RANK_KEYS
+from pnl_index import SIDES, grid_pos, rect_sum
+
+# --- WALK-FORWARD ---
+# Le partite sono ordinate per datameci e divise in blocchi di test_days giorni.
+# Per ogni blocco si sceglie il filtro migliore sui blocchi precedenti (training)
+# e lo si gioca sul blocco stesso (fuori campione). EV calcolati una volta sola
+# (calc_sweep); le tabelle cumulative sono cumulate anche sui blocchi, quindi il
+# training di qualsiasi finestra è una differenza tra due tabelle.
+
+
+def match_dates(df):
+    # datameci -> datetime (formati misti, giorno prima del mese)
+    return pd.to_datetime(df['datameci'], dayfirst=True, errors='coerce', format='mixed')
+
+
+def block_tables(ev, odds, pnl, block, n_blocks, ev_grid, odds_grid):
+    # Come cum_tables ma per blocco: s[b] = tabelle di tutte le partite nei blocchi < b
+    ok = ~(np.isnan(ev) | np.isnan(odds) | np.isnan(pnl))
+    shape = (2 * len(ev_grid) + 1, 2 * len(odds_grid) + 1)
+    size = shape[0] * shape[1]
+    flat = block[ok] * size + grid_pos(ev[ok], ev_grid) * shape[1] + grid_pos(odds[ok], odds_grid)
+
+    s_pnl = np.zeros((n_blocks + 1, shape[0] + 1, shape[1] + 1))
+    s_cnt = np.zeros((n_blocks + 1, shape[0] + 1, shape[1] + 1), dtype=np.int64)
+    full = (n_blocks,) + shape
+    s_pnl[1:, 1:, 1:] = np.bincount(flat, weights=pnl[ok], minlength=n_blocks * size).reshape(full).cumsum(0).cumsum(1).cumsum(2)
+    s_cnt[1:, 1:, 1:] = np.bincount(flat, minlength=n_blocks * size).reshape(full).cumsum(0).cumsum(1).cumsum(2)
+    return s_pnl, s_cnt
+
+
+def _rect(tables, ea, eb, oa, ob):
+    # rect_sum su una pila di tabelle (finestre, EV, quote) -> (finestre, combinazioni)
+    s = np.moveaxis(tables, 0, -1)
+    out = rect_sum(s, ea[:, None], eb[:, None], oa[None, :], ob[None, :])
+    return out.reshape(len(ea) * len(oa), -1).T
+
+
+def walk_forward(df, hfa_values, use_dyn, ev_grid, odds_grid, train_days=60, test_days=7,
+                 anchored=False, sides=('1', '2'), min_bets=20, sort_by='PNL', chunk=2_000_000, margin='proportional'):
+    # df: output di load_data con datameci. Ritorna (finestre, scommesse fuori campione).
+    # train_days è arrotondato a un multiplo di test_days; anchored=True -> training dall'inizio.
+    ev_grid = np.asarray(ev_grid, dtype=float)
+    odds_grid = np.asarray(odds_grid, dtype=float)
+    ei, ej = np.triu_indices(len(ev_grid), 1)
+    oi, oj = np.triu_indices(len(odds_grid), 1)
+    ea, eb = 2 * ei + 1, 2 * ej + 2
+    oa, ob = 2 * oi + 1, 2 * oj + 2
+
+    # Stesse righe di calc_sweep, in ordine di data
+    sweep = calc_sweep(df, hfa_values, use_dyn, margin)
+    dates = match_dates(df[df['Real_Res'] != '-']).to_numpy()
+    valid = ~pd.isna(dates)
+    order = np.flatnonzero(valid)[np.argsort(dates[valid], kind='stable')]
+    dates = dates[order]
+    day = (dates - dates[0]).astype('timedelta64[D]').astype(int) if len(dates) else np.zeros(0, dtype=int)
+    block = day // test_days
+    n_blocks = int(block[-1]) + 1 if len(block) else 0
+    n_train = max(1, int(round(train_days / test_days)))
+
+    tests = np.arange(n_train, n_blocks)
+    starts = np.zeros_like(tests) if anchored else tests - n_train
+    if not len(tests):
+        return pd.DataFrame(), pd.DataFrame()
+
+    # Miglior combinazione per finestra, su tutti gli HFA e i lati
+    best_score = np.full(len(tests), -np.inf)
+    best = {k: np.zeros(len(tests), dtype=int) for k in ('h', 's', 'combo', 'bets')}
+    best['pnl'] = np.zeros(len(tests))
+    key = RANK_KEYS[sort_by][0]
+    w_chunk = max(1, chunk // (len(ea) * len(oa)))
+    for h in range(len(sweep['HFA'])):
+        for s, side in enumerate(sides):
+            ev_c, odds_c, pnl_c = SIDES[side]
+            s_pnl, s_cnt = block_tables(sweep[ev_c][order, h], sweep[odds_c][order], sweep[pnl_c][order],
+                                        block, n_blocks, ev_grid, odds_grid)
+            for w0 in range(0, len(tests), w_chunk):
+                w = slice(w0, w0 + w_chunk)
+                bets = _rect(s_cnt[tests[w]] - s_cnt[starts[w]], ea, eb, oa, ob)
+                pnl = _rect(s_pnl[tests[w]] - s_pnl[starts[w]], ea, eb, oa, ob)
+                score = {'PNL': pnl, 'Bets': bets.astype(float),
+                         'ROI': np.divide(pnl, bets, out=np.zeros_like(pnl), where=bets > 0)}[key]
+                score = np.where(bets >= min_bets, score, -np.inf)
+                c = score.argmax(axis=1)
+                top = score[np.arange(len(c)), c]
+                better = top > best_score[w]
+                rows = np.flatnonzero(better) + w0
+                best_score[rows] = top[better]
+                best['h'][rows], best['s'][rows], best['combo'][rows] = h, s, c[better]
+                best['bets'][rows] = bets[better, c[better]]
+                best['pnl'][rows] = pnl[better, c[better]]
+
+    # Gioca la configurazione scelta sul blocco successivo
+    win_rows, bet_parts = [], []
+    bounds = np.searchsorted(block, np.arange(n_blocks + 1))
+    for k, t in enumerate(tests):
+        found = np.isfinite(best_score[k])
+        test_rows = order[bounds[t]:bounds[t + 1]]
+        row = {
+            'Train_Start': dates[bounds[starts[k]]],
+            'Test_Start': dates[bounds[t]] if len(test_rows) else pd.NaT,
+            'Test_Matches': len(test_rows),
+        }
+        if found:
+            h, side = best['h'][k], sides[best['s'][k]]
+            r, c = divmod(best['combo'][k], len(oa))
+            lo_e, hi_e, lo_o, hi_o = ev_grid[ei[r]], ev_grid[ej[r]], odds_grid[oi[c]], odds_grid[oj[c]]
+            ev_c, odds_c, pnl_c = SIDES[side]
+            ev, odds, pnl = sweep[ev_c][test_rows, h], sweep[odds_c][test_rows], sweep[pnl_c][test_rows]
+            sel = (ev >= lo_e) & (ev <= hi_e) & (odds >= lo_o) & (odds <= hi_o) & ~np.isnan(pnl)
+            row.update({
+                'HFA': sweep['HFA'][h], 'Side': side, 'EV_Min': lo_e, 'EV_Max': hi_e,
+                'Odds_Min': lo_o, 'Odds_Max': hi_o,
+                'Train_Bets': best['bets'][k], 'Train_PNL': best['pnl'][k],
+                'Test_Bets': int(sel.sum()), 'Test_PNL': pnl[sel].sum(),
+            })
+            bet_parts.append(pd.DataFrame({
+                'Date': dates[bounds[t]:bounds[t + 1]][sel], 'Window': k, 'Side': side,
+                'Odds': odds[sel], 'EV': ev[sel], 'PNL': pnl[sel],
+            }))
+        win_rows.append(row)
+
+    windows = pd.DataFrame(win_rows)
+    bets = pd.concat(bet_parts, ignore_index=True) if bet_parts else pd.DataFrame(columns=['Date', 'Window', 'Side', 'Odds', 'EV', 'PNL'])
+    bets['Equity'] = bets['PNL'].cumsum()
+    return windows, bets